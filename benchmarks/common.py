@@ -0,0 +1,180 @@
+"""
+Traffic generators and probes shared by the benchmarks.
+
+All generators of a run start at cycle 0 and advance one cycle per
+``yield``, thus the cycles logged by different probes are comparable.
+"""
+import random
+from migen import *  # noqa
+from migen.sim import passive
+
+
+def backpressure(name, seed=0):
+    """Endless 0/1 ready pattern: none, half or random (seeded, 1/2)."""
+    if name == "none":
+        while True:
+            yield 1
+    elif name == "half":
+        while True:
+            yield 1
+            yield 0
+    elif name == "random":
+        prng = random.Random(seed)
+        while True:
+            yield prng.randrange(2)
+    else:
+        raise ValueError("unknown backpressure pattern {}".format(name))
+
+
+PATTERNS = ["none", "half", "random"]
+
+
+@passive
+def ready_pattern(ready, name):
+    # name of a pattern or an iterable of 0/1, e.g. a sim.Stall
+    pattern = backpressure(name) if isinstance(name, str) else name
+    for value in pattern:
+        yield ready.eq(value)
+        yield
+
+
+@passive
+def probe(valid, ready, log):
+    # log the cycles w/ a handshake
+    cycle = 0
+    while True:
+        if (yield valid) and (yield ready):
+            log.append(cycle)
+        cycle += 1
+        yield
+
+
+def probe_channel(ch, log):
+    return probe(ch.valid, ch.ready, log)
+
+
+def probe_endpoint(ep, log):
+    return probe(ep.stb, ep.ack, log)
+
+
+class Stalled(Exception):
+    pass
+
+
+def wait_for(log, n, max_cycles=None):
+    # run until n events are logged, a core that stops moving raises
+    max_cycles = 64 * n + 256 if max_cycles is None else max_cycles
+    for _ in range(max_cycles):
+        if len(log) >= n:
+            return
+        yield
+    raise Stalled("{} of {} beats in {} cycles".format(
+        len(log), n, max_cycles))
+
+
+def addr_master(ch, nbursts, len_, size, step):
+    # back-to-back address requests
+    for k in range(nbursts):
+        yield ch.id.eq(k)
+        yield ch.addr.eq(k * step)
+        yield ch.len.eq(len_)
+        yield ch.size.eq(size)
+        yield ch.burst.eq(1)  # incr
+        yield ch.valid.eq(1)
+        yield
+        while not (yield ch.ready):
+            yield
+        yield ch.valid.eq(0)
+
+
+def w_master(w, nbursts, len_):
+    # back-to-back write beats
+    yield w.strb.eq(2**len(w.strb) - 1)
+    for k in range(nbursts):
+        for j in range(len_ + 1):
+            yield w.id.eq(k)
+            yield w.data.eq(j)
+            yield w.last.eq(j == len_)
+            yield w.valid.eq(1)
+            yield
+            while not (yield w.ready):
+                yield
+            yield w.valid.eq(0)
+
+
+def b_slave(bus):
+    # answer every W burst once its last beat is through
+    done = [0]
+
+    @passive
+    def w():
+        while True:
+            if ((yield bus.w.valid) and (yield bus.w.ready) and
+                    (yield bus.w.last)):
+                done[0] += 1
+            yield
+
+    @passive
+    def b():
+        while True:
+            if not done[0]:
+                yield
+                continue
+            done[0] -= 1
+            yield bus.b.valid.eq(1)
+            yield
+            while not (yield bus.b.ready):
+                yield
+            yield bus.b.valid.eq(0)
+
+    return [w(), b()]
+
+
+def r_slave(bus):
+    # accept AR requests, answer them in order at full rate
+    pending = []
+
+    @passive
+    def ar():
+        yield bus.ar.ready.eq(1)
+        while True:
+            if (yield bus.ar.valid):
+                pending.append(((yield bus.ar.id), (yield bus.ar.len)))
+            yield
+
+    @passive
+    def r():
+        while True:
+            if not pending:
+                yield
+                continue
+            id_, len_ = pending.pop(0)
+            for j in range(len_ + 1):
+                yield bus.r.id.eq(id_)
+                yield bus.r.last.eq(j == len_)
+                yield bus.r.data.eq(j)
+                yield bus.r.valid.eq(1)
+                yield
+                while not (yield bus.r.ready):
+                    yield
+                yield bus.r.valid.eq(0)
+
+    return [ar(), r()]
+
+
+def metrics(requests, beats):
+    """
+    Throughput figures from the cycles of the requests and data beats.
+
+    The window spans from the first request to the last beat, bubbles are
+    the cycles between the first and the last beat w/o a beat.
+    """
+    start = requests[0]
+    cycles = beats[-1] - start + 1
+    return dict(
+        beats=len(beats),
+        cycles=cycles,
+        beats_per_cycle=round(len(beats) / cycles, 4),
+        bubbles=beats[-1] - beats[0] + 1 - len(beats),
+        first_beat_latency=beats[0] - start,
+    )
@@ -0,0 +1,183 @@
+"""
+Throughput benchmarks of the interconnect cores.
+
+Every benchmark takes the transfer kind, data width, burst length and
+backpressure pattern, drives the core with saturating traffic and returns
+the ``common.metrics`` of the data beats.
+"""
+from functools import partial
+from migen import *  # noqa
+from misoc.interconnect import csr_bus
+from migen_axi.interconnect import (
+    axi, axi_dma, dmac_bus, stream2axi, sram, burst_size, Burst, AXI2CSR)
+from migen_axi.interconnect.wrshim import AxiWrshim
+from .common import (
+    addr_master, w_master, b_slave, r_slave, ready_pattern, probe_channel,
+    probe_endpoint, wait_for, metrics)
+
+
+def stream_source(ep, n, **fields):
+    # back-to-back stream beats carrying their index as data
+    for name, value in fields.items():
+        yield getattr(ep, name).eq(value)
+    for k in range(n):
+        yield ep.data.eq(k)
+        yield ep.stb.eq(1)
+        yield
+        while not (yield ep.ack):
+            yield
+        yield ep.stb.eq(0)
+
+
+def _slave_read(dut, bus, burst_len, backpressure, nbeats, step):
+    nbursts = nbeats // burst_len
+    ar, r = [], []
+    run_simulation(dut, [
+        addr_master(bus.ar, nbursts, burst_len - 1,
+                    burst_size(bus.data_width // 8), step),
+        ready_pattern(bus.r.ready, backpressure),
+        probe_channel(bus.ar, ar), probe_channel(bus.r, r),
+        wait_for(r, nbursts * burst_len)])
+    return metrics(ar, r)
+
+
+def _slave_write(dut, bus, burst_len, backpressure, nbeats, step):
+    nbursts = nbeats // burst_len
+    aw, w = [], []
+    run_simulation(dut, [
+        addr_master(bus.aw, nbursts, burst_len - 1,
+                    burst_size(bus.data_width // 8), step),
+        w_master(bus.w, nbursts, burst_len - 1),
+        ready_pattern(bus.b.ready, backpressure),
+        probe_channel(bus.aw, aw), probe_channel(bus.w, w),
+        wait_for(w, nbursts * burst_len)])
+    return metrics(aw, w)
+
+
+def _slave_mixed(dut, bus, burst_len, backpressure, nbeats, step):
+    # half the beats each way, a cycle may carry a read and a write beat
+    nbursts = nbeats // 2 // burst_len
+    size = burst_size(bus.data_width // 8)
+    ar, r, aw, w = [], [], [], []
+    run_simulation(dut, [
+        addr_master(bus.ar, nbursts, burst_len - 1, size, step),
+        addr_master(bus.aw, nbursts, burst_len - 1, size, step),
+        w_master(bus.w, nbursts, burst_len - 1),
+        ready_pattern(bus.r.ready, backpressure),
+        ready_pattern(bus.b.ready, backpressure),
+        probe_channel(bus.ar, ar), probe_channel(bus.r, r),
+        probe_channel(bus.aw, aw), probe_channel(bus.w, w),
+        wait_for(r, nbursts * burst_len), wait_for(w, nbursts * burst_len)])
+    beats = sorted(r + w)
+    result = metrics(sorted(ar + aw), beats)
+    result.update(bubbles=beats[-1] - beats[0] + 1 - len(set(beats)))
+    return result
+
+
+def bench_sram(kind, data_width, burst_len, backpressure, nbeats, **kwargs):
+    bus = axi.Interface(data_width=data_width)
+    dut = sram.SRAM(4096, bus=bus, **kwargs)
+    run = dict(read=_slave_read, write=_slave_write, mixed=_slave_mixed)[kind]
+    return run(dut, bus, burst_len, backpressure, nbeats,
+               burst_len * data_width // 8)
+
+
+def bench_banked_sram(kind, data_width, burst_len, backpressure, nbeats):
+    # a single master, the beats of its bursts interleaved across banks
+    dut = sram.BankedSRAM(4096, nbanks=4, nmasters=1, data_width=data_width)
+    run = dict(read=_slave_read, write=_slave_write, mixed=_slave_mixed)[kind]
+    return run(dut, dut.buses[0], burst_len, backpressure, nbeats,
+               burst_len * data_width // 8)
+
+
+def bench_axi2csr(kind, data_width, burst_len, backpressure, nbeats):
+    dut = AXI2CSR(bus_csr=csr_bus.Interface(data_width=data_width))
+    dut.submodules.sram = csr_bus.SRAM(
+        0x100, 0, bus=csr_bus.Interface(data_width=data_width))
+    dut.submodules += csr_bus.Interconnect(dut.csr, [dut.sram.bus])
+    run = dict(read=_slave_read, write=_slave_write)[kind]
+    return run(dut, dut.bus, burst_len, backpressure, nbeats, 4)
+
+
+def bench_axi_dma_reader(kind, data_width, burst_len, backpressure, nbeats):
+    bus = axi.Interface(data_width=data_width)
+    dut = axi_dma.Reader(bus, fifo_depth=burst_len)
+    sink, source = [], []
+    run_simulation(dut, r_slave(bus) + [
+        stream_source(dut.sink, 1, addr=0, n=nbeats),
+        ready_pattern(dut.source.ack, backpressure),
+        probe_endpoint(dut.sink, sink), probe_endpoint(dut.source, source),
+        wait_for(source, nbeats)])
+    return metrics(sink, source)
+
+
+def bench_axi_dma_writer(kind, data_width, burst_len, backpressure, nbeats):
+    bus = axi.Interface(data_width=data_width)
+    dut = axi_dma.Writer(bus, fifo_depth=burst_len)
+    sink, w = [], []
+    run_simulation(dut, b_slave(bus) + [
+        stream_source(dut.sink, nbeats, addr=0),
+        ready_pattern(bus.aw.ready, "none"),
+        ready_pattern(bus.w.ready, backpressure),
+        probe_endpoint(dut.sink, sink), probe_channel(bus.w, w),
+        wait_for(w, nbeats)])
+    return metrics(sink, w)
+
+
+def bench_stream2axi_writer(kind, data_width, burst_len, backpressure,
+                            nbeats):
+    bus = axi.Interface(data_width=data_width)
+    bus_dmac = dmac_bus.Interface()
+    dut = stream2axi.Writer(bus, bus_dmac)
+    nbursts = nbeats // burst_len
+    ar, r = [], []
+
+    def dmac():
+        # DMA-330 serving burst requests
+        for k in range(nbursts):
+            yield from bus_dmac.read_dr()
+            yield from bus.write_ar(
+                k, 0, burst_len - 1, burst_size(data_width // 8),
+                Burst.fixed)
+            yield from bus_dmac.write_da(dmac_bus.Type.burst)
+
+    run_simulation(dut, [
+        stream_source(dut.sink, nbeats + burst_len), dmac(),
+        ready_pattern(bus.r.ready, backpressure),
+        probe_channel(bus.ar, ar), probe_channel(bus.r, r),
+        wait_for(r, nbursts * burst_len)])
+    return metrics(ar, r)
+
+
+def bench_axi_wrshim(kind, data_width, burst_len, backpressure, nbeats):
+    dut = AxiWrshim()
+    i, o = dut.m_axi_i, dut.m_axi_o
+    nbursts = nbeats // burst_len
+    aw, w = [], []
+    run_simulation(dut, b_slave(o) + [
+        addr_master(i.aw, nbursts, burst_len - 1, 2, burst_len * 4),
+        w_master(i.w, nbursts, burst_len - 1),
+        ready_pattern(o.aw.ready, "none"),
+        ready_pattern(o.w.ready, backpressure),
+        ready_pattern(i.b.ready, "none"),
+        probe_channel(o.aw, aw), probe_channel(o.w, w),
+        wait_for(w, nbursts * burst_len)])
+    return metrics(aw, w)
+
+
+# name, benchmark, kinds, data widths, burst lengths
+BENCHMARKS = [
+    ("SRAM", bench_sram, ["read", "write", "mixed"], [32, 64], [1, 4, 16]),
+    ("SRAM dual_port", partial(bench_sram, dual_port=True),
+     ["read", "write", "mixed"], [32, 64], [1, 4, 16]),
+    ("SRAM pipeline_read", partial(bench_sram, pipeline_read=True),
+     ["read", "write", "mixed"], [32, 64], [1, 4, 16]),
+    ("BankedSRAM", bench_banked_sram, ["read", "write", "mixed"], [32, 64],
+     [1, 4, 16]),
+    ("AXI2CSR", bench_axi2csr, ["read", "write"], [8, 16, 32], [1]),
+    ("axi_dma.Reader", bench_axi_dma_reader, ["read"], [32, 64], [8, 16]),
+    ("axi_dma.Writer", bench_axi_dma_writer, ["write"], [32, 64], [4, 16]),
+    ("stream2axi.Writer", bench_stream2axi_writer, ["read"], [32, 64],
+     [16]),
+    ("AxiWrshim", bench_axi_wrshim, ["write"], [32], [1, 4, 16]),
+]
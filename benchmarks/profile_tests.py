@@ -0,0 +1,83 @@
+"""
+Profile the simulations of the test suite.
+
+Usage::
+
+    python -m benchmarks.profile_tests [--top 20] [--output FILE] \\
+        [PYTEST ARGS]
+
+Every ``run_simulation`` of the tests runs through
+``sim.profile_simulation``. The simulations taking the longest, counting
+elaboration, are listed w/ their test, design, signals, cycles, cycles
+per second and the generator most time is spent in.
+"""
+import argparse
+import json
+import sys
+import migen
+import migen.sim
+import pytest
+from migen_axi.sim import profile_simulation
+
+
+class _Collector:
+    def __init__(self):
+        self.test = None
+        self.profiles = []
+
+    def run_simulation(self, *args, **kwargs):
+        self.profiles.append((self.test, profile_simulation(*args, **kwargs)))
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        self.test = item.nodeid
+        yield
+        self.test = None
+
+
+def seconds(profile):
+    return profile.elaborate_seconds + profile.run_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--top", type=int, default=20,
+                        help="simulations to list")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write all profiles to")
+    args, pytest_args = parser.parse_known_args()
+
+    collector = _Collector()
+    # the tests bind run_simulation when they are collected
+    migen.run_simulation = migen.sim.run_simulation = \
+        collector.run_simulation
+    status = pytest.main(pytest_args, plugins=[collector])
+
+    profiles = sorted(collector.profiles, key=lambda p: -seconds(p[1]))
+    print("{:56} {:16} {:>7} {:>8} {:>9} {:>7} {:>7}  {}".format(
+        "test", "design", "signals", "cycles", "cycles/s", "elab s",
+        "sim s", "slowest generator"), file=sys.stderr)
+    for test, profile in profiles[:args.top]:
+        slowest = max(profile.generators, key=lambda g: g.seconds,
+                      default=None)
+        print("{:56} {:16} {:7} {:8} {:9.0f} {:7.3f} {:7.3f}  {}".format(
+            str(test)[-56:], profile.name[:16], profile.signals,
+            max(profile.cycles.values(), default=0),
+            profile.cycles_per_second, profile.elaborate_seconds,
+            profile.run_seconds, slowest.name if slowest else ""),
+            file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([dict(
+                test=test, design=profile.name, signals=profile.signals,
+                cycles=profile.cycles,
+                elaborate_seconds=profile.elaborate_seconds,
+                run_seconds=profile.run_seconds,
+                generators=[g._asdict() for g in profile.generators])
+                for test, profile in profiles], f, indent=1)
+            f.write("\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+AR latency per master of ``InterconnectShared`` under saturation.
+
+A latency-critical control master (``qos`` 15) issues a read every few
+cycles while bulk masters (``qos`` 0) keep AR valid all the time. The
+cycles each request waits for ready are reported per master, for the
+round-robin arbiter and for ``QosArbiter`` with the given weights.
+
+Usage::
+
+    python benchmarks/qos_latency.py --bulk 3 --weights 2,1,1,1
+"""
+import argparse
+import statistics
+from migen import *  # noqa
+from migen.sim import passive
+from migen_axi.interconnect import axi, InterconnectShared
+from migen_axi.sim import requester
+
+
+@passive
+def accept(ch):
+    yield ch.ready.eq(1)
+    while True:
+        yield
+
+
+def run(nbulk, weights, requests, gap):
+    masters = [axi.Interface() for _ in range(nbulk + 1)]
+    slave = axi.Interface(id_width=12 + log2_int(len(masters), False))
+    dut = InterconnectShared(masters, slave, weights=weights)
+    latency = [[] for _ in masters]
+    generators = [
+        accept(slave.ar),
+        requester(masters[0].ar, requests, gap, 15, latency[0]),
+    ] + [
+        passive(requester)(master.ar, 2**31, 0, 0, lat)
+        for master, lat in zip(masters[1:], latency[1:])]
+    run_simulation(dut, generators)
+    return latency
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def report(name, latency):
+    print(name)
+    print("  {:>8} {:>6} {:>6} {:>6} {:>6} {:>6} {:>6}".format(
+        "master", "count", "min", "mean", "p50", "p99", "max"))
+    for i, lat in enumerate(latency):
+        print("  {:>8} {:>6} {:>6} {:>6.2f} {:>6} {:>6} {:>6}".format(
+            "ctrl" if i == 0 else "bulk{}".format(i), len(lat), min(lat),
+            statistics.mean(lat), percentile(lat, 50), percentile(lat, 99),
+            max(lat)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--bulk", type=int, default=3,
+                        help="number of bulk masters")
+    parser.add_argument("--weights", default=None,
+                        help="comma separated weights, control master first")
+    parser.add_argument("--requests", type=int, default=256,
+                        help="requests issued by the control master")
+    parser.add_argument("--gap", type=int, default=3,
+                        help="idle cycles between control requests")
+    args = parser.parse_args()
+    weights = ([int(w) for w in args.weights.split(",")]
+               if args.weights else [2] + [1] * args.bulk)
+
+    report("round-robin", run(args.bulk, None, args.requests, args.gap))
+    report("qos, weights {}".format(weights),
+           run(args.bulk, weights, args.requests, args.gap))
+
+
+if __name__ == "__main__":
+    main()
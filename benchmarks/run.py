@@ -0,0 +1,65 @@
+"""
+Run the interconnect core benchmarks and write the results as JSON.
+
+Usage::
+
+    python -m benchmarks.run --output bench_output.json [--only SRAM]
+
+Each result holds the core, transfer kind, data width, burst length and
+backpressure pattern along with beats, cycles, beats per cycle, bubbles
+and first beat latency. Diff the output of two releases to spot cycles
+lost per burst.
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from .common import PATTERNS, Stalled
+from .cores import BENCHMARKS
+
+
+def run(only=None, nbeats=256):
+    results = []
+    for name, bench, kinds, data_widths, burst_lens in BENCHMARKS:
+        if only and only not in name:
+            continue
+        for kind, data_width, burst_len, backpressure in itertools.product(
+                kinds, data_widths, burst_lens, PATTERNS):
+            params = dict(
+                core=name, kind=kind, data_width=data_width,
+                burst_len=burst_len, backpressure=backpressure)
+            t = time.perf_counter()
+            try:
+                result = bench(kind, data_width, burst_len, backpressure,
+                               nbeats)
+            except (ValueError, Stalled) as e:
+                # configuration not supported by the core, or it hung
+                result = dict(error="{}: {}".format(type(e).__name__, e))
+            params.update(result, seconds=round(time.perf_counter() - t, 3))
+            results.append(params)
+            print("{core:18} {kind:5} {data_width:3} {burst_len:2} "
+                  "{backpressure:6} ".format(**params) + " ".join(
+                      "{}={}".format(k, v) for k, v in result.items()),
+                  file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", default="bench_output.json",
+                        help="JSON file to write the results to")
+    parser.add_argument("--only", default=None,
+                        help="run the cores whose name contains ONLY")
+    parser.add_argument("--beats", type=int, default=256,
+                        help="data beats per run")
+    args = parser.parse_args()
+    results = run(args.only, args.beats)
+    with open(args.output, "w") as f:
+        json.dump(dict(nbeats=args.beats, results=results), f, indent=1,
+                  sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Sweep seeded stall injection over the cores and report the throughput lost.
+
+Usage::
+
+    python -m benchmarks.stall_sweep --seeds 16 --probability 0.25 \\
+        --max-stall 8 --output stall_sweep.json [--only SRAM]
+
+Every configuration of the benchmarks runs w/o backpressure and once per
+seed w/ a ``sim.Stall`` on the channel the benchmark throttles. Reported
+are the minimum, mean and maximum of the beats per cycle relative to the
+unstalled run, next to the share of cycles the stall pattern is ready:
+a core falling below it loses cycles beyond the stalls injected. Seeds
+that hang the core are listed for reproduction.
+"""
+import argparse
+import itertools
+import json
+import sys
+from statistics import mean
+from migen_axi.sim import Stall
+from .common import Stalled
+from .cores import BENCHMARKS
+
+
+def ready_share(stall, ncycles=1 << 16):
+    return sum(itertools.islice(stall, ncycles)) / ncycles
+
+
+def sweep(only=None, nbeats=256, seeds=16, probability=0.25, max_stall=8):
+    results = []
+    share = round(ready_share(Stall(0, probability, max_stall)), 4)
+    for name, bench, kinds, data_widths, burst_lens in BENCHMARKS:
+        if only and only not in name:
+            continue
+        for kind, data_width, burst_len in itertools.product(
+                kinds, data_widths, burst_lens):
+            result = dict(
+                core=name, kind=kind, data_width=data_width,
+                burst_len=burst_len, ready_share=share)
+            try:
+                baseline = bench(kind, data_width, burst_len, "none", nbeats)
+            except (ValueError, Stalled) as e:
+                result.update(error="{}: {}".format(type(e).__name__, e))
+                results.append(result)
+                continue
+            ratios = []
+            stalled = []
+            for seed in range(seeds):
+                stall = Stall(seed, probability, max_stall)
+                try:
+                    metrics = bench(kind, data_width, burst_len, stall,
+                                    nbeats)
+                except Stalled:
+                    stalled.append(seed)
+                    continue
+                ratios.append(
+                    metrics["beats_per_cycle"] / baseline["beats_per_cycle"])
+            result.update(
+                beats_per_cycle=baseline["beats_per_cycle"],
+                stalled_seeds=stalled)
+            if ratios:
+                result.update(
+                    min=round(min(ratios), 4), mean=round(mean(ratios), 4),
+                    max=round(max(ratios), 4))
+            results.append(result)
+            summary = " ".join("{}={}".format(k, result.get(k)) for k in [
+                "beats_per_cycle", "ready_share", "min", "mean", "max",
+                "stalled_seeds"])
+            print("{core:18} {kind:5} {data_width:3} {burst_len:2} ".format(
+                **result) + summary, file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", default="stall_sweep.json",
+                        help="JSON file to write the results to")
+    parser.add_argument("--only", default=None,
+                        help="run the cores whose name contains ONLY")
+    parser.add_argument("--beats", type=int, default=256,
+                        help="data beats per run")
+    parser.add_argument("--seeds", type=int, default=16,
+                        help="seeds per configuration")
+    parser.add_argument("--probability", type=float, default=0.25,
+                        help="probability of a stall starting in a cycle")
+    parser.add_argument("--max-stall", type=int, default=8,
+                        help="longest stall in cycles")
+    args = parser.parse_args()
+    results = sweep(args.only, args.beats, args.seeds, args.probability,
+                    args.max_stall)
+    with open(args.output, "w") as f:
+        json.dump(dict(
+            nbeats=args.beats, seeds=args.seeds,
+            probability=args.probability, max_stall=args.max_stall,
+            results=results), f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from migen import *  # noqa
 from misoc.cores import identifier
 from misoc.integration.wb_slaves import WishboneSlaveManager as SlaveManager
 from misoc.interconnect import csr_bus
-from ..interconnect import axi, axi2csr
+from ..interconnect import axi, axi2csr, perf, traffic
 from ..cores import ps7
 
 
@@ -98,6 +98,19 @@ class SoCCore(Module):
     def add_csr_group(self, group_name, members):
         self._csr_groups.append((group_name, members))
 
+    # This function taps an AXI interface w/ performance counters, readout
+    # is through the CSR named after the monitor
+    def add_axi_perf_monitor(self, name, interface):
+        setattr(self.submodules, name, perf.AxiPerfMonitor(interface))
+        self.csr_devices.append(name)
+
+    # This function drives an AXI slave port, e.g. PS7.s_axi_hp0, w/ a
+    # TrafficGenerator controlled through the CSR named after it
+    def add_traffic_generator(self, name, interface, **kwargs):
+        setattr(self.submodules, name,
+                traffic.TrafficGenerator(interface, **kwargs))
+        self.csr_devices.append(name)
+
     def register_mem(self, name, origin, length, interface):
         self.add_axi_slave(origin, length, interface)
         self.add_memory_region(name, origin, length)
@@ -1,5 +1,7 @@
 from .axi import *  # noqa
 from .axi2csr import *  # noqa
 from .axi_dma import *  # noqa
+from .perf import *  # noqa
+from .traffic import *  # noqa
 from . import dmac_bus  # noqa
 from . import stream2axi  # noqa
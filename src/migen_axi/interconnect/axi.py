@@ -7,13 +7,18 @@ import ramda as R
 from migen import *  # noqa
 from migen.genlib import roundrobin
 from migen.genlib import coding
+from migen.genlib.fifo import AsyncFIFO
 from migen.genlib.record import set_layout_parameters
 from misoc.interconnect import stream
 
 __all__ = ["Burst", "Alock", "Response",
            "burst_size", "rec_layout",
            "connect_sink_hdshk", "connect_source_hdshk",
-           "Interface", "InterconnectPointToPoint", "Incr"]
+           "Interface", "InterconnectPointToPoint", "QosArbiter",
+           "InterconnectShared",
+           "Crossbar", "RegisterSlice", "Upsizer",
+           "Downsizer", "AsyncBridge", "BurstSplitter", "IdRemapper",
+           "Incr"]
 
 Burst = IntEnum("Burst", "fixed incr wrap reserved", start=0)
 
@@ -161,7 +166,7 @@ class Interface(Record):
         yield self.aw.lock.eq(lock)
         yield self.aw.cache.eq(cache)
         yield self.aw.prot.eq(prot)
-        yield self.aw.prot.eq(qos)
+        yield self.aw.qos.eq(qos)
         yield from write_ack(self.aw)
 
     def read_aw(self):
@@ -197,7 +202,7 @@ class Interface(Record):
         yield self.ar.lock.eq(lock)
         yield self.ar.cache.eq(cache)
         yield self.ar.prot.eq(prot)
-        yield self.ar.prot.eq(qos)
+        yield self.ar.qos.eq(qos)
         yield from write_ack(self.ar)
 
     def read_ar(self):
@@ -219,6 +224,256 @@ class InterconnectPointToPoint(Module):
         self.comb += master.connect(slave)
 
 
+def _m2s_names(ch, omit=frozenset()):
+    return [name for name, _, direction in ch.layout
+            if direction == DIR_M_TO_S and name not in omit]
+
+
+def _s2m_names(ch, omit=frozenset()):
+    return [name for name, _, direction in ch.layout
+            if direction == DIR_S_TO_M and name not in omit]
+
+
+class QosArbiter(Module):
+    """
+    Weighted QoS arbiter, a drop-in for ``RoundRobin(n, SP_CE)``.
+
+    Arbitration runs in rounds, each requester is granted up to its weight
+    per round. Among the requesters with weight left the highest ``qos``
+    wins, ties are resolved round-robin. A new round starts once no
+    requester has weight left, so low QoS requesters are not starved. The
+    grant moves while ``ce`` is asserted, a grant is used up when ``ce``
+    is asserted while the granted requester requests. A grant kept for a
+    requester w/ weight left moves on in the cycle it stops requesting and
+    is held from then on while ``ce`` is deasserted.
+
+    Parameters
+    ----------
+    n : int
+        Number of requesters.
+    weights : list of int, optional
+        Grants per round of each requester, 1 by default.
+
+    Attributes
+    ----------
+    request : Signal(n), in
+    qos : list of Signal(4), in
+    ce : Signal, in
+    grant : Signal(max=n), out
+    """
+    def __init__(self, n, weights=None):
+        weights = [1] * n if weights is None else list(weights)
+        if len(weights) != n or min(weights) < 1:
+            raise ValueError("weights shall be n positive integers")
+        self.request = Signal(n)
+        self.qos = [Signal(4) for _ in range(n)]
+        self.ce = Signal()
+        self.grant = Signal(max=max(2, n))
+
+        ###
+
+        if n == 1:
+            self.comb += self.grant.eq(0)
+            return
+
+        credit = [Signal(max=w + 1, reset=w) for w in weights]
+        # the grant chosen for the next cycle, the last one moved on to
+        next_grant = Signal.like(self.grant)
+        last = Signal.like(self.grant)
+        used = Signal()
+        served = Signal(n)
+        pending = Signal(n)
+        reload = Signal()
+        eligible = Signal(n)
+        withdrawn = Signal()
+        fallback = Signal(n)
+
+        def select(eligible, current, grant):
+            # eligible requesters w/ the highest QoS, round-robin after
+            # current, current last
+            top = Signal(n)
+            self.comb += [
+                top[i].eq(reduce(operator.and_, [
+                    ~eligible[j] | (self.qos[j] <= self.qos[i])
+                    for j in range(n) if j != i], eligible[i]))
+                for i in range(n)]
+            cases = {}
+            for i in range(n):
+                switch = []
+                for j in reversed(range(i + 1, i + n + 1)):
+                    t = j % n
+                    switch = [If(top[t], grant.eq(t)).Else(*switch)]
+                cases[i] = switch
+            return Case(current, cases)
+
+        # a grant kept for a requester that withdraws moves on in the same
+        # cycle, to the requesters w/ weight left if any
+        with_credit = Signal(n)
+        self.comb += [
+            with_credit.eq(self.request & Cat(*[c != 0 for c in credit])),
+            withdrawn.eq(~Array(self.request)[next_grant]),
+            fallback.eq(Mux(with_credit != 0, with_credit, self.request)),
+            self.grant.eq(next_grant),
+            If(withdrawn, select(fallback, last, self.grant)),
+        ]
+
+        self.comb += [
+            used.eq(self.ce & Array(self.request)[self.grant]),
+            served.eq(Cat(*[used & (self.grant == i) for i in range(n)])),
+            pending.eq(self.request & Cat(*[
+                c > served[i] for i, c in enumerate(credit)])),
+            reload.eq(pending == 0),
+            # the grant is kept if no other requester is eligible
+            eligible.eq(Mux(reload, self.request, pending) & ~served),
+        ]
+        self.sync += If(
+            self.ce,
+            next_grant.eq(self.grant),
+            select(eligible, self.grant, next_grant),
+            If(used & withdrawn, last.eq(self.grant)),
+            If(
+                reload & (self.request != 0),
+                [c.eq(w) for c, w in zip(credit, weights)],
+            ).Elif(
+                used,
+                Case(self.grant, {
+                    i: c.eq(c - 1) for i, c in enumerate(credit)}),
+            ),
+        ).Elif(
+            # hold the grant moved on to while its request is stalled
+            withdrawn,
+            next_grant.eq(self.grant),
+            last.eq(self.grant),
+        )
+
+
+def _arbiter(channels, weights):
+    # round-robin or QoS arbiter over channels, SP_CE semantics
+    if weights is None:
+        return roundrobin.RoundRobin(len(channels), roundrobin.SP_CE)
+    arbiter = QosArbiter(len(channels), weights)
+    arbiter.comb += [
+        qos.eq(ch.qos) for qos, ch in zip(arbiter.qos, channels)]
+    return arbiter
+
+
+class InterconnectShared(Module):
+    """
+    Share one AXI slave among several AXI masters.
+
+    AR and AW are arbitrated round-robin, or by ``QosArbiter`` when
+    ``weights`` are given. The grant moves on with every handshake so
+    back-to-back masters are served one address per cycle.
+    The master index is carried in the upper ``log2(len(masters))`` bits of
+    the slave ID, R and B responses are routed back by ID without any
+    bookkeeping, and the slave may have any number of transactions
+    outstanding. The slave ID shall hold the widest master ID and the
+    master index, put an ``IdRemapper`` in front of a narrower slave.
+    W bursts are forwarded in AW order.
+
+    Parameters
+    ----------
+    masters : list of Interface
+    slave : Interface
+    npending : int, optional
+        Number of write bursts accepted on AW ahead of their W data.
+    weights : list of int, optional
+        Per master weights, arbitrate by ``qos`` w/ a ``QosArbiter``.
+
+    Attributes
+    ----------
+    w_transaction : misoc.interconnect.stream.SyncFIFO
+        Master index of the accepted write bursts, in AW order.
+    """
+    def __init__(self, masters, slave, npending=8, weights=None):
+        n = len(masters)
+        sel_bits = log2_int(n, need_pow2=False)
+        id_bits = max(master.id_width for master in masters)
+        if slave.id_width < id_bits + sel_bits:
+            raise ValueError(
+                "slave id_width shall be ge the master id_width + "
+                "log2(len(masters)), {} < {} + {}".format(
+                    slave.id_width, id_bits, sel_bits))
+        id_bits = slave.id_width - sel_bits
+        self.w_transaction = stream.SyncFIFO(
+            set_layout_parameters(_transaction_layout, n=max(1, sel_bits)),
+            npending)
+
+        ###
+
+        self.submodules += self.w_transaction
+        self.submodules.ar_rr = _arbiter([m.ar for m in masters], weights)
+        self.submodules.aw_rr = _arbiter([m.aw for m in masters], weights)
+
+        w_transaction = self.w_transaction
+        for name, rr, accept in [
+                ("ar", self.ar_rr, C(1)),
+                ("aw", self.aw_rr, w_transaction.sink.ack)]:
+            target = getattr(slave, name)
+            sources = [getattr(master, name) for master in masters]
+            self.comb += _mux_m2s(sources, target, rr.grant, id_bits)
+            granted_valid = Array(ch.valid for ch in sources)[rr.grant]
+            self.comb += [
+                target.valid.eq(granted_valid & accept),
+                rr.request.eq(Cat(*[ch.valid for ch in sources])),
+                rr.ce.eq(~granted_valid | (target.valid & target.ready)),
+            ]
+            self.comb += [
+                ch.ready.eq(target.ready & accept & (rr.grant == i))
+                for i, ch in enumerate(sources)]
+
+        # W follows the AW order
+        self.comb += [
+            w_transaction.sink.stb.eq(slave.aw.valid & slave.aw.ready),
+            w_transaction.sink.sel.eq(self.aw_rr.grant),
+        ]
+        w_sel = w_transaction.source.sel
+        sources = [master.w for master in masters]
+        self.comb += _mux_m2s(sources, slave.w, w_sel, id_bits)
+        self.comb += [
+            slave.w.valid.eq(
+                w_transaction.source.stb &
+                Array(ch.valid for ch in sources)[w_sel]),
+            w_transaction.source.ack.eq(
+                slave.w.valid & slave.w.ready & slave.w.last),
+        ]
+        self.comb += [
+            ch.ready.eq(
+                slave.w.ready & w_transaction.source.stb & (w_sel == i))
+            for i, ch in enumerate(sources)]
+
+        # R and B are routed back by ID
+        for name in ["r", "b"]:
+            self.comb += _demux_s2m(
+                getattr(slave, name),
+                [getattr(master, name) for master in masters], id_bits)
+
+
+def _mux_m2s(sources, target, sel, id_bits):
+    # forward the selected master channel, tag the ID with the master index
+    id_ = Signal(id_bits)
+    return [
+        getattr(target, name).eq(Array(getattr(ch, name) for ch in sources)[
+            sel]) for name in _m2s_names(target, {"id", "valid"})] + [
+        id_.eq(Array(ch.id for ch in sources)[sel]),
+        target.id.eq(Cat(id_, sel)),
+    ]
+
+
+def _demux_s2m(source, targets, id_bits):
+    # route a response channel back to the master tagged in the ID
+    sel = source.id[id_bits:] if len(source.id) > id_bits else C(0)
+    stmts = [source.ready.eq(Array(ch.ready for ch in targets)[sel])]
+    for i, ch in enumerate(targets):
+        stmts += [getattr(ch, name).eq(getattr(source, name))
+                  for name in _s2m_names(ch, {"id", "valid"})]
+        stmts += [
+            ch.id.eq(source.id[:id_bits]),
+            ch.valid.eq(source.valid & (sel == i)),
+        ]
+    return stmts
+
+
 class Incr(Module):
     ""
     def __init__(self, a_chan, data_width=32):
@@ -320,91 +575,1092 @@ class AddressDecoder(Module):
 _transaction_layout = [("sel", "n")]
 
 
+def _route(sources, sinks, source_order, sink_order):
+    # forward beats from sources[i] to sinks[j] while the transaction
+    # order recorded on both sides agrees, advance both at the last beat
+    route = [[Signal() for _ in sinks] for _ in sources]
+    done = [[Signal() for _ in sinks] for _ in sources]
+    stmts = []
+    for i, (src, src_order) in enumerate(zip(sources, source_order)):
+        last = src.last if hasattr(src, "last") else 1
+        for j, (dst, dst_order) in enumerate(zip(sinks, sink_order)):
+            stmts += [
+                route[i][j].eq(
+                    src_order.source.stb & src_order.source.sel[j] &
+                    dst_order.source.stb & dst_order.source.sel[i]),
+                done[i][j].eq(route[i][j] & src.valid & dst.ready & last),
+                If(route[i][j], *[
+                    getattr(dst, name).eq(getattr(src, name))
+                    for name, *_ in src.layout if name != "ready"]),
+            ]
+        stmts += [
+            src.ready.eq(reduce(operator.or_, [
+                route[i][j] & dst.ready for j, dst in enumerate(sinks)])),
+            src_order.source.ack.eq(reduce(operator.or_, done[i])),
+        ]
+    stmts += [
+        dst_order.source.ack.eq(reduce(operator.or_, [
+            done[i][j] for i in range(len(sources))]))
+        for j, dst_order in enumerate(sink_order)]
+    return stmts
+
+
 class TransactionArbiter(Module):
-    # slaves is a list of pairs:
-    # 0) function that takes the address signal and returns a FHDL expression
-    #    that evaluates to 1 when the slave is selected and 0 otherwise.
-    # 1) axi.a[rw] reference.
-    def __init__(self, masters, slaves, npending=8, register=False):
-        r_transactionFIFO = partial(
+    """
+    Shared bus interconnect with multiple outstanding transactions.
+
+    Requests of all masters are arbitrated round-robin, or by
+    ``QosArbiter`` when ``weights`` are given, onto a single target,
+    decoded and forwarded to the slaves. The order in which
+    transactions are accepted is recorded per master and per slave, R, W
+    and B beats are routed while both records agree. As all transactions
+    pass a single target the records can not contradict each other, the
+    routing is free of deadlocks and runs at one beat per cycle per
+    channel. Slaves shall respond in request order.
+
+    Parameters
+    ----------
+    masters : list of Interface
+    slaves : list of (function, Interface)
+        The function takes the address signal and returns a FHDL expression
+        that evaluates to 1 when the slave is selected and 0 otherwise.
+    npending : int, optional
+        Number of outstanding transactions per master and per slave.
+    register : bool, optional
+        Register the address decoders.
+    weights : list of int, optional
+        Per master weights, arbitrate by ``qos`` w/ a ``QosArbiter``.
+
+    Attributes
+    ----------
+    r_transaction, w_order, b_transaction : list of stream.SyncFIFO
+        Per master, one-hot slave of the outstanding reads/writes.
+    r_order, w_transaction, b_order : list of stream.SyncFIFO
+        Per slave, one-hot master of the outstanding reads/writes.
+    """
+    def __init__(self, masters, slaves, npending=8, register=False,
+                 weights=None):
+        masterFIFO = partial(
             stream.SyncFIFO,
             set_layout_parameters(_transaction_layout, n=len(slaves)),
             npending)
-        w_transactionFIFO = partial(
+        slaveFIFO = partial(
             stream.SyncFIFO,
             set_layout_parameters(_transaction_layout, n=len(masters)),
             npending)
-        self.r_transaction = [r_transactionFIFO() for _ in masters]
-        self.w_transaction = [w_transactionFIFO() for _ in slaves]
+        self.r_transaction = [masterFIFO() for _ in masters]
+        self.w_order = [masterFIFO() for _ in masters]
+        self.b_transaction = [masterFIFO() for _ in masters]
+        self.r_order = [slaveFIFO() for _ in slaves]
+        self.w_transaction = [slaveFIFO() for _ in slaves]
+        self.b_order = [slaveFIFO() for _ in slaves]
 
         ###
 
         self.submodules += self.r_transaction
+        self.submodules += self.w_order
+        self.submodules += self.b_transaction
+        self.submodules += self.r_order
         self.submodules += self.w_transaction
-        target = Interface()
-        self.submodules.ar_rr = roundrobin.RoundRobin(len(masters))
-        self.submodules.aw_rr = roundrobin.RoundRobin(len(masters))
+        self.submodules += self.b_order
+        target = Interface.like(masters[0])
+        self.submodules.ar_rr = _arbiter([m.ar for m in masters], weights)
+        self.submodules.aw_rr = _arbiter([m.aw for m in masters], weights)
         self.submodules.ar_dec = AddressDecoder(
             target.ar, [(fn, slave.ar) for (fn, slave) in slaves], register)
         self.submodules.aw_dec = AddressDecoder(
             target.aw, [(fn, slave.aw) for (fn, slave) in slaves], register)
+        self.submodules.ar_decoder = coding.Decoder(len(masters))
+        self.submodules.aw_decoder = coding.Decoder(len(masters))
+        self.comb += [
+            self.ar_decoder.i.eq(self.ar_rr.grant),
+            self.aw_decoder.i.eq(self.aw_rr.grant),
+        ]
+
+        for name, rr, dec, decoder, master_fifos, slave_fifos in [
+                ("ar", self.ar_rr, self.ar_dec, self.ar_decoder,
+                 [self.r_transaction], [self.r_order]),
+                ("aw", self.aw_rr, self.aw_dec, self.aw_decoder,
+                 [self.w_order, self.b_transaction],
+                 [self.w_transaction, self.b_order])]:
+            a = getattr(target, name)
+            channels = [getattr(master, name) for master in masters]
+            # mux master->slave signals
+            for field in _m2s_names(a, {"valid"}):
+                choices = Array(getattr(ch, field) for ch in channels)
+                self.comb += getattr(a, field).eq(choices[rr.grant])
+            # transaction FIFOs writable?
+            accept = Signal()
+            self.comb += accept.eq(
+                reduce(operator.and_, [
+                    Array(fifo.sink.ack for fifo in fifos)[rr.grant]
+                    for fifos in master_fifos]) &
+                reduce(operator.or_, [
+                    reduce(operator.and_, [
+                        fifos[j].sink.ack for fifos in slave_fifos]) &
+                    dec.slave_sel_r[j] for j in range(len(slaves))]))
+            granted_valid = Array(ch.valid for ch in channels)[rr.grant]
+            self.comb += a.valid.eq(granted_valid & accept)
+            # connect slave->master signal
+            self.comb += [
+                ch.ready.eq(a.ready & accept & (rr.grant == i))
+                for i, ch in enumerate(channels)]
+            # connect transaction sinks
+            acked = Signal()
+            self.comb += acked.eq(a.valid & a.ready)
+            # connect bus requests to the arbiter
+            self.comb += [
+                rr.request.eq(Cat(*[ch.valid for ch in channels])),
+                rr.ce.eq(~granted_valid | acked),
+            ]
+            for fifos in master_fifos:
+                self.comb += [
+                    fifo.sink.stb.eq(acked & (rr.grant == i))
+                    for i, fifo in enumerate(fifos)]
+                self.comb += [
+                    fifo.sink.sel.eq(dec.slave_sel_r) for fifo in fifos]
+            for fifos in slave_fifos:
+                self.comb += [
+                    fifo.sink.stb.eq(acked & dec.slave_sel_r[j])
+                    for j, fifo in enumerate(fifos)]
+                self.comb += [
+                    fifo.sink.sel.eq(decoder.o) for fifo in fifos]
+
+        # route data and responses
+        self.comb += _route(
+            [slave.r for _, slave in slaves], [master.r for master in masters],
+            self.r_order, self.r_transaction)
+        self.comb += _route(
+            [master.w for master in masters], [slave.w for _, slave in slaves],
+            self.w_order, self.w_transaction)
+        self.comb += _route(
+            [slave.b for _, slave in slaves], [master.b for master in masters],
+            self.b_order, self.b_transaction)
+
+
+class _CrossbarMaster(Module):
+    # decode the requests of one master onto its slave lanes, hold requests
+    # to another slave until the pending ones completed
+    def __init__(self, master, slaves, npending):
+        ns = len(slaves)
+        targets = dict()
+
+        ###
+
+        for a, resp in [("ar", "r"), ("aw", "b")]:
+            m_a, m_resp = getattr(master, a), getattr(master, resp)
+            gate = Record(m_a.layout)
+            dec = AddressDecoder(
+                gate, [(fn, getattr(slave, a)) for fn, slave in slaves])
+            self.submodules += dec
+            pending = Signal(max=npending + 1)
+            # one-hot slave of the pending transactions
+            target = targets[a] = Signal(ns)
+            allowed = Signal()
+            self.comb += [
+                allowed.eq(
+                    (pending == 0) |
+                    ((dec.slave_sel_r == target) & (pending != npending))),
+                m_a.connect(gate, omit={"valid", "ready"}),
+                gate.valid.eq(m_a.valid & allowed),
+                m_a.ready.eq(gate.ready & allowed),
+            ]
+            # response mux
+            for j, (_, slave) in enumerate(slaves):
+                ch = getattr(slave, resp)
+                self.comb += [
+                    If(target[j], *[
+                        getattr(m_resp, name).eq(getattr(ch, name))
+                        for name in _s2m_names(m_resp)]),
+                    ch.ready.eq(m_resp.ready & target[j]),
+                ]
+            issued = Signal()
+            done = Signal()
+            self.comb += [
+                issued.eq(gate.valid & gate.ready),
+                done.eq(m_resp.valid & m_resp.ready &
+                        (m_resp.last if resp == "r" else 1)),
+            ]
+            self.sync += [
+                pending.eq(pending + issued - done),
+                If(issued, target.eq(dec.slave_sel_r)),
+            ]
+
+        # W follows the slave of the pending writes
+        target = targets["aw"]
+        for j, (_, slave) in enumerate(slaves):
+            self.comb += [
+                master.w.connect(slave.w, omit={"valid", "ready"}),
+                slave.w.valid.eq(master.w.valid & target[j]),
+            ]
+        self.comb += master.w.ready.eq(reduce(operator.or_, [
+            slave.w.ready & target[j]
+            for j, (_, slave) in enumerate(slaves)]))
+
+
+class Crossbar(Module):
+    """
+    AXI crossbar, non-conflicting master/slave pairs transfer concurrently.
+
+    Every slave has its own ``InterconnectShared`` arbiter, every master an
+    ``AddressDecoder`` and a response mux. All transactions a master has
+    outstanding per direction target the same slave, a request to another
+    slave is held until the pending ones completed. This keeps the AXI
+    ordering rules without reorder buffers and rules out W deadlocks.
+    As for ``InterconnectShared``, the slave IDs shall hold the widest
+    master ID and the master index.
+
+    Parameters
+    ----------
+    masters : list of Interface
+    slaves : list of (function, Interface)
+        The function takes the address signal and returns a FHDL expression
+        that evaluates to 1 when the slave is selected and 0 otherwise.
+    npending : int, optional
+        Number of reads and writes each master may have outstanding.
+    weights : list of int, optional
+        Per master weights, the slave arbiters arbitrate by ``qos``.
+    """
+    def __init__(self, masters, slaves, npending=8, weights=None):
+        id_width = max(master.id_width for master in masters) + log2_int(
+            len(masters), need_pow2=False)
+        for _, slave in slaves:
+            if slave.id_width < id_width:
+                raise ValueError(
+                    "slave id_width shall be ge {} to carry the master IDs "
+                    "and index, got {}".format(id_width, slave.id_width))
+        lanes = [[Interface.like(master) for _ in slaves]
+                 for master in masters]
+
+        ###
+
+        for j, (_, slave) in enumerate(slaves):
+            self.submodules += InterconnectShared(
+                [lane[j] for lane in lanes], slave, npending, weights)
+        for master, lane in zip(masters, lanes):
+            self.submodules += _CrossbarMaster(
+                master, [(fn, s) for (fn, _), s in zip(slaves, lane)],
+                npending)
+
+
+def _payload(ch):
+    return Cat(*[getattr(ch, name) for name, *_ in ch.layout
+                 if name not in ("valid", "ready")])
+
+
+class _SkidBuffer(Module):
+    # two entry pipeline register, valid, payload and ready are registered
+    def __init__(self, up, down):
+        up_payload, down_payload = _payload(up), _payload(down)
+
+        ###
+
+        main = Signal(len(up_payload), reset_less=True)
+        main_valid = Signal()
+        skid = Signal(len(up_payload), reset_less=True)
+        skid_valid = Signal()
+        self.comb += [
+            up.ready.eq(~skid_valid),
+            down.valid.eq(main_valid),
+            down_payload.eq(main),
+        ]
+        self.sync += [
+            If(
+                down.ready | ~main_valid,
+                If(
+                    skid_valid,
+                    main.eq(skid),
+                    main_valid.eq(1),
+                    skid_valid.eq(0),
+                ).Else(
+                    main.eq(up_payload),
+                    main_valid.eq(up.valid),
+                )
+            ).Elif(
+                up.valid & up.ready,
+                skid.eq(up_payload),
+                skid_valid.eq(1),
+            )
+        ]
+
+
+class RegisterSlice(Module):
+    """
+    Register selected channels between two AXI interfaces.
+
+    Each sliced channel gets a two entry skid buffer, so valid, payload and
+    ready are registered in both directions without losing a cycle per
+    beat. The remaining channels are connected combinationally.
+
+    Parameters
+    ----------
+    master : Interface
+    slave : Interface
+    channels : str, optional
+        Whitespace separated names of the channels to slice.
+    """
+    def __init__(self, master, slave, channels="aw w b ar r"):
+        channels = set(channels.split())
+        unknown = channels - set(name for name, *_ in master.layout)
+        if unknown:
+            raise ValueError("unknown channels: {}".format(
+                ", ".join(sorted(unknown))))
+
+        ###
+
+        self.comb += master.connect(slave, omit=channels)
+        for name in sorted(channels):
+            m, s = getattr(master, name), getattr(slave, name)
+            if name in ("b", "r"):
+                m, s = s, m
+            self.submodules += _SkidBuffer(m, s)
+
 
-        # mux master->slave signals
-        for name in [name for name, _, direction in target.ar.layout
-                     if direction == DIR_M_TO_S]:
-            choices = Array(getattr(m.ar, name) for m in masters)
-            self.comb += getattr(target.ar, name).eq(choices[self.ar_rr.grant])
-        for name in [name for name, _, direction in target.aw.layout
-                     if direction == DIR_M_TO_S]:
-            choices = Array(getattr(m.aw, name) for m in masters)
-            self.comb += getattr(target.aw, name).eq(choices[self.aw_rr.grant])
-
-        # connect slave->master signal
+_burst_layout = [
+    ("pack", 1),
+    ("addr", "addr_width"),
+    ("len", 8),
+    ("size", 3),
+    ("burst", 2),
+]
+
+
+class _BurstBeat(Module):
+    # address and last flag of the current beat of the burst at the head of
+    # a transaction FIFO, next advances to the following beat
+    def __init__(self, burst, data_width):
+        self.addr = Signal(len(burst.addr))
+        self.last = Signal()
+        self.next = Signal()
+
+        ###
+
+        first = Signal(reset=1)
+        addr = Signal(len(burst.addr), reset_less=True)
+        cnt = Signal(8, reset_less=True)
+        remaining = Signal(8)
+        a = Record([("addr", len(burst.addr)), ("len", 8), ("size", 3),
+                    ("burst", 2)])
+        self.submodules.incr = Incr(a, data_width)
+        self.comb += [
+            self.addr.eq(Mux(first, burst.addr, addr)),
+            remaining.eq(Mux(first, burst.len, cnt)),
+            self.last.eq(remaining == 0),
+            a.addr.eq(self.addr),
+            a.len.eq(burst.len),
+            a.size.eq(burst.size),
+            a.burst.eq(burst.burst),
+        ]
+        self.sync += If(
+            self.next,
+            first.eq(self.last),
+            addr.eq(self.incr.addr),
+            cnt.eq(remaining - 1),
+        )
+
+
+def _check_ratio(narrow, wide):
+    ratio = wide.data_width // narrow.data_width
+    if ratio < 2 or wide.data_width % narrow.data_width or \
+            ratio & (ratio - 1):
+        raise ValueError(
+            "wide data_width shall be a power of 2 multiple of the narrow "
+            "data_width")
+    return ratio
+
+
+def _merge_resp(a, b):
+    # the worse of two responses, EXOKAY only if both are, EXOKAY is the
+    # identity of the merge
+    return Mux(a[1] | b[1], Mux(a > b, a, b), a & b)
+
+
+class Upsizer(Module):
+    """
+    Connect a narrow AXI master to a wide AXI slave.
+
+    INCR bursts of full narrow beats are packed, consecutive narrow beats
+    are merged into one wide beat and ``len``/``size`` are rewritten
+    accordingly; unaligned start addresses only enable the strobes of the
+    lanes transferred. All other bursts pass one narrow beat per wide beat
+    with the strobes shifted into the addressed lane. Reads with another
+    ID than the outstanding ones are held, so read data returns in request
+    order.
+
+    Parameters
+    ----------
+    narrow : Interface
+        Slave interface, connect the narrow master.
+    wide : Interface
+        Master interface, connect the wide slave.
+    npending : int, optional
+        Number of outstanding reads and writes.
+    """
+    def __init__(self, narrow, wide, npending=4):
+        ratio = _check_ratio(narrow, wide)
+        nsize = log2_int(narrow.data_width // 8)
+        wsize = log2_int(wide.data_width // 8)
+        layout = set_layout_parameters(
+            _burst_layout, addr_width=narrow.addr_width)
+        self.r_burst = stream.SyncFIFO(layout, npending)
+        self.w_burst = stream.SyncFIFO(layout, npending)
+
+        ###
+
+        self.submodules += self.r_burst, self.w_burst
+        nw = narrow.data_width
+        nb = nw // 8
+
+        # AR/AW, rewrite len and size of packed bursts
+        r_pending = Signal(max=npending + 1)
+        r_id = Signal(len(narrow.ar.id), reset_less=True)
+        ar_accept = Signal()
+        self.comb += ar_accept.eq(
+            (r_pending == 0) | (narrow.ar.id == r_id))
+        for name, fifo, accept in [("ar", self.r_burst, ar_accept),
+                                   ("aw", self.w_burst, C(1))]:
+            n, w = getattr(narrow, name), getattr(wide, name)
+            pack = Signal()
+            self.comb += [
+                pack.eq((n.burst == Burst.incr) & (n.size == nsize)),
+                n.connect(w, omit={"valid", "ready", "len", "size"}),
+                If(
+                    pack,
+                    w.len.eq((n.addr[nsize:wsize] + n.len) >> (wsize - nsize)),
+                    w.size.eq(wsize),
+                ).Else(
+                    w.len.eq(n.len),
+                    w.size.eq(n.size),
+                ),
+                w.valid.eq(n.valid & fifo.sink.ack & accept),
+                n.ready.eq(w.ready & fifo.sink.ack & accept),
+                fifo.sink.stb.eq(w.valid & w.ready),
+                fifo.sink.pack.eq(pack),
+                fifo.sink.addr.eq(n.addr),
+                fifo.sink.len.eq(n.len),
+                fifo.sink.size.eq(n.size),
+                fifo.sink.burst.eq(n.burst),
+            ]
+
+        # W, merge narrow beats
+        w_beat = _BurstBeat(self.w_burst.source, nw)
+        self.submodules += w_beat
+        w_lane = Signal(max=ratio)
+        data = Signal(wide.data_width, reset_less=True)
+        strb = Signal(len(wide.w.strb))
+        emit = Signal()
+        self.comb += [
+            w_lane.eq(w_beat.addr[nsize:wsize]),
+            emit.eq(~self.w_burst.source.pack | w_beat.last |
+                    (w_lane == ratio - 1)),
+            wide.w.id.eq(narrow.w.id),
+            wide.w.last.eq(w_beat.last),
+            wide.w.valid.eq(
+                self.w_burst.source.stb & narrow.w.valid & emit),
+            narrow.w.ready.eq(
+                self.w_burst.source.stb & (wide.w.ready | ~emit)),
+            w_beat.next.eq(narrow.w.valid & narrow.w.ready),
+            self.w_burst.source.ack.eq(w_beat.next & w_beat.last),
+        ]
+        for k in range(ratio):
+            d, s = slice(k * nw, (k + 1) * nw), slice(k * nb, (k + 1) * nb)
+            self.comb += [
+                wide.w.data[d].eq(Mux(w_lane == k, narrow.w.data, data[d])),
+                wide.w.strb[s].eq(Mux(w_lane == k, narrow.w.strb, strb[s])),
+            ]
+        self.sync += If(
+            w_beat.next,
+            If(
+                emit,
+                strb.eq(0),
+            ).Else(
+                data.eq(wide.w.data),
+                strb.eq(wide.w.strb),
+            )
+        )
+
+        # R, split wide beats
+        r_beat = _BurstBeat(self.r_burst.source, nw)
+        self.submodules += r_beat
+        r_lane = Signal(max=ratio)
+        self.comb += [
+            r_lane.eq(r_beat.addr[nsize:wsize]),
+            narrow.r.id.eq(wide.r.id),
+            narrow.r.resp.eq(wide.r.resp),
+            narrow.r.data.eq(Array(
+                wide.r.data[k * nw:(k + 1) * nw]
+                for k in range(ratio))[r_lane]),
+            narrow.r.last.eq(r_beat.last),
+            narrow.r.valid.eq(self.r_burst.source.stb & wide.r.valid),
+            wide.r.ready.eq(
+                self.r_burst.source.stb & narrow.r.ready &
+                (~self.r_burst.source.pack | r_beat.last |
+                 (r_lane == ratio - 1))),
+            r_beat.next.eq(narrow.r.valid & narrow.r.ready),
+            self.r_burst.source.ack.eq(r_beat.next & r_beat.last),
+        ]
+        self.sync += [
+            r_pending.eq(
+                r_pending + (wide.ar.valid & wide.ar.ready) -
+                self.r_burst.source.ack),
+            If(narrow.ar.valid & narrow.ar.ready, r_id.eq(narrow.ar.id)),
+        ]
+
+        # B
+        self.comb += narrow.b.connect(wide.b)
+
+
+class Downsizer(Module):
+    """
+    Connect a wide AXI master to a narrow AXI slave.
+
+    INCR bursts (and single beats) larger than the narrow data width are
+    split, every wide beat is issued as the narrow beats of the lanes it
+    addresses; lanes below an unaligned start address are skipped, so
+    no beats without strobes are generated for them. Read data is merged
+    back into wide beats w/ the worst response of their narrow beats,
+    ``last`` is preserved. Narrow bursts pass one beat per wide beat.
+    Reads with another ID than the outstanding ones are held, so read
+    data returns in request order.
+
+    Multi-beat FIXED and WRAP bursts larger than the narrow data width can
+    not be split w/o changing their address pattern. They do not reach
+    the narrow slave, they are answered w/ SLVERR once the outstanding
+    transactions of their direction completed. Split bursts shall not
+    exceed 256 narrow beats.
+
+    Parameters
+    ----------
+    wide : Interface
+        Slave interface, connect the wide master.
+    narrow : Interface
+        Master interface, connect the narrow slave.
+    npending : int, optional
+        Number of outstanding reads and writes.
+    """
+    def __init__(self, wide, narrow, npending=4):
+        ratio = _check_ratio(narrow, wide)
+        nsize = log2_int(narrow.data_width // 8)
+        wsize = log2_int(wide.data_width // 8)
+        layout = set_layout_parameters(
+            _burst_layout + [("mask", "mask_width")],
+            addr_width=wide.addr_width, mask_width=log2_int(ratio))
+        self.r_burst = stream.SyncFIFO(layout, npending)
+        self.w_burst = stream.SyncFIFO(layout, npending)
+
+        ###
+
+        self.submodules += self.r_burst, self.w_burst
+        nw = narrow.data_width
+        nb = nw // 8
+
+        # AR/AW, rewrite len and size of split bursts, reject the bursts
+        # that can not be split
+        r_pending = Signal(max=npending + 1)
+        w_pending = Signal(max=npending + 1)
+        r_id = Signal(len(wide.ar.id), reset_less=True)
+        # rejected read/write w/ its R beats, W beats or B left
+        r_error = Signal()
+        w_error = Signal()
+        b_error = Signal()
+        r_error_id = Signal(len(wide.ar.id), reset_less=True)
+        b_error_id = Signal(len(wide.aw.id), reset_less=True)
+        r_error_len = Signal(8, reset_less=True)
+        w_idle = Signal()
+        self.comb += w_idle.eq(~w_error & ~b_error)
+        rejected = dict()
+        for name, fifo, accept, reject in [
+                ("ar", self.r_burst,
+                 ~r_error & ((r_pending == 0) | (wide.ar.id == r_id)),
+                 ~r_error & (r_pending == 0)),
+                ("aw", self.w_burst, w_idle & (w_pending != npending),
+                 w_idle & (w_pending == 0))]:
+            w, n = getattr(wide, name), getattr(narrow, name)
+            pack = Signal()
+            illegal = Signal()
+            rejected[name] = Signal()
+            self.comb += [
+                pack.eq((w.size > nsize) &
+                        ((w.burst == Burst.incr) | (w.len == 0))),
+                illegal.eq((w.size > nsize) & ~pack),
+                rejected[name].eq(w.valid & w.ready & illegal),
+                w.connect(n, omit={"valid", "ready", "len", "size", "burst"}),
+                If(
+                    pack,
+                    Case(w.size, {
+                        s: [
+                            n.len.eq(
+                                ((w.len + 1) << (s - nsize)) -
+                                w.addr[nsize:s] - 1),
+                            fifo.sink.mask.eq((1 << (s - nsize)) - 1),
+                        ] for s in range(nsize + 1, wsize + 1)}),
+                    n.size.eq(nsize),
+                    n.burst.eq(Burst.incr),
+                ).Else(
+                    n.len.eq(w.len),
+                    n.size.eq(w.size),
+                    n.burst.eq(w.burst),
+                ),
+                n.valid.eq(w.valid & ~illegal & fifo.sink.ack & accept),
+                w.ready.eq(Mux(
+                    illegal, reject, n.ready & fifo.sink.ack & accept)),
+                fifo.sink.stb.eq(n.valid & n.ready),
+                fifo.sink.pack.eq(pack),
+                fifo.sink.addr.eq(n.addr),
+                fifo.sink.len.eq(n.len),
+                fifo.sink.size.eq(n.size),
+                fifo.sink.burst.eq(n.burst),
+            ]
+
+        # W, split wide beats
+        w_beat = _BurstBeat(self.w_burst.source, nw)
+        self.submodules += w_beat
+        w_lane = Signal(max=ratio)
+        self.comb += [
+            w_lane.eq(w_beat.addr[nsize:wsize]),
+            narrow.w.id.eq(wide.w.id),
+            narrow.w.data.eq(Array(
+                wide.w.data[k * nw:(k + 1) * nw]
+                for k in range(ratio))[w_lane]),
+            narrow.w.strb.eq(Array(
+                wide.w.strb[k * nb:(k + 1) * nb]
+                for k in range(ratio))[w_lane]),
+            narrow.w.last.eq(w_beat.last),
+            narrow.w.valid.eq(self.w_burst.source.stb & wide.w.valid),
+            wide.w.ready.eq(
+                self.w_burst.source.stb & narrow.w.ready &
+                (~self.w_burst.source.pack | w_beat.last |
+                 ((w_lane & self.w_burst.source.mask) ==
+                  self.w_burst.source.mask))),
+            w_beat.next.eq(narrow.w.valid & narrow.w.ready),
+            self.w_burst.source.ack.eq(w_beat.next & w_beat.last),
+        ]
+
+        # R, merge narrow beats
+        r_beat = _BurstBeat(self.r_burst.source, nw)
+        self.submodules += r_beat
+        r_lane = Signal(max=ratio)
+        data = Signal(wide.data_width, reset_less=True)
+        resp = Signal(len(wide.r.resp), reset=Response.exokay)
+        emit = Signal()
+        self.comb += [
+            r_lane.eq(r_beat.addr[nsize:wsize]),
+            emit.eq(~self.r_burst.source.pack | r_beat.last |
+                    ((r_lane & self.r_burst.source.mask) ==
+                     self.r_burst.source.mask)),
+            wide.r.id.eq(narrow.r.id),
+            wide.r.resp.eq(_merge_resp(resp, narrow.r.resp)),
+            wide.r.last.eq(r_beat.last),
+            wide.r.valid.eq(
+                self.r_burst.source.stb & narrow.r.valid & emit),
+            narrow.r.ready.eq(
+                self.r_burst.source.stb & (wide.r.ready | ~emit)),
+            r_beat.next.eq(narrow.r.valid & narrow.r.ready),
+            self.r_burst.source.ack.eq(r_beat.next & r_beat.last),
+        ]
+        for k in range(ratio):
+            d = slice(k * nw, (k + 1) * nw)
+            self.comb += wide.r.data[d].eq(
+                Mux(r_lane == k, narrow.r.data, data[d]))
+        self.sync += [
+            If(
+                r_beat.next,
+                If(
+                    emit,
+                    resp.eq(Response.exokay),
+                ).Else(
+                    data.eq(wide.r.data),
+                    resp.eq(wide.r.resp),
+                )
+            ),
+            r_pending.eq(
+                r_pending + (narrow.ar.valid & narrow.ar.ready) -
+                self.r_burst.source.ack),
+            If(wide.ar.valid & wide.ar.ready, r_id.eq(wide.ar.id)),
+        ]
+
+        # B
+        self.comb += wide.b.connect(narrow.b)
+        self.sync += w_pending.eq(
+            w_pending + (narrow.aw.valid & narrow.aw.ready) -
+            (narrow.b.valid & narrow.b.ready))
+
+        # rejected bursts, SLVERR R beats, W beats dropped and SLVERR B
+        self.comb += [
+            If(
+                r_error,
+                wide.r.id.eq(r_error_id),
+                wide.r.data.eq(0),
+                wide.r.resp.eq(Response.slverr),
+                wide.r.last.eq(r_error_len == 0),
+                wide.r.valid.eq(1),
+                narrow.r.ready.eq(0),
+            ),
+            If(
+                w_error,
+                narrow.w.valid.eq(0),
+                wide.w.ready.eq(1),
+            ),
+            If(
+                b_error,
+                wide.b.id.eq(b_error_id),
+                wide.b.resp.eq(Response.slverr),
+                wide.b.valid.eq(1),
+                narrow.b.ready.eq(0),
+            ),
+        ]
+        self.sync += [
+            If(
+                rejected["ar"],
+                r_error.eq(1),
+                r_error_id.eq(wide.ar.id),
+                r_error_len.eq(wide.ar.len),
+            ).Elif(
+                r_error & wide.r.ready,
+                If(r_error_len == 0, r_error.eq(0)),
+                r_error_len.eq(r_error_len - 1),
+            ),
+            If(
+                rejected["aw"],
+                w_error.eq(1),
+                b_error_id.eq(wide.aw.id),
+            ).Elif(
+                w_error & wide.w.valid & wide.w.last,
+                w_error.eq(0),
+                b_error.eq(1),
+            ).Elif(
+                b_error & wide.b.ready,
+                b_error.eq(0),
+            ),
+        ]
+
+
+class AsyncBridge(Module):
+    """
+    Cross an AXI interface between two clock domains.
+
+    Each channel passes an asynchronous FIFO, AW, W and AR are written in
+    the master and read in the slave clock domain, B and R the other way
+    round. Ordering is kept per channel and every FIFO moves one beat per
+    cycle of the slower domain.
+
+    Parameters
+    ----------
+    master : Interface
+        Connect the master, driven in ``master_cd``.
+    slave : Interface
+        Connect the slave, driven in ``slave_cd``.
+    master_cd : str, optional
+    slave_cd : str, optional
+    depth : int, optional
+        Depth of the channel FIFOs, a power of 2.
+    """
+    def __init__(self, master, slave, master_cd="sys", slave_cd="sys",
+                 depth=8):
+        log2_int(depth)
+
+        ###
+
+        for name, *_ in master.layout:
+            up, down = getattr(master, name), getattr(slave, name)
+            domains = {"write": master_cd, "read": slave_cd}
+            if name in ("b", "r"):
+                up, down = down, up
+                domains = {"write": slave_cd, "read": master_cd}
+            up_payload, down_payload = _payload(up), _payload(down)
+            fifo = ClockDomainsRenamer(domains)(
+                AsyncFIFO(len(up_payload), depth))
+            setattr(self.submodules, name + "_fifo", fifo)
+            self.comb += [
+                fifo.din.eq(up_payload),
+                fifo.we.eq(up.valid),
+                up.ready.eq(fifo.writable),
+                down_payload.eq(fifo.dout),
+                down.valid.eq(fifo.readable),
+                fifo.re.eq(down.ready),
+            ]
+
+
+class _BurstSplit(Module):
+    # register the request on master channel a and issue it as sub-bursts
+    # on slave channel a, final is set for the last sub-burst
+    def __init__(self, m_a, s_a, max_len, accept):
+        self.final = Signal()
+        self.len = Signal.like(s_a.len)
+
+        ###
+
+        busy = Signal()
+        req = Record(m_a.layout)
+        remaining = Signal(len(m_a.len) + 1)
+        beats = Signal.like(remaining)
+        boundary = Signal(13)
+        limit = Signal.like(remaining)
+        next_addr = Signal.like(m_a.addr)
+        sizes = range(2**len(m_a.size))
         self.comb += [
-            master.ar.ready.eq(
-                target.ar.ready &
-                # FIFO writable?
-                fifo.sink.ack &
-                (self.ar_rr.grant == i)) for i, (master, fifo) in
-            enumerate(zip(masters, self.r_transaction))]
-        w_transaction_ack = Signal()
-        self.comb += w_transaction_ack.eq(
-            reduce(
-                operator.or_,
-                Cat(*[fifo.sink.ack for fifo in self.w_transaction]) &
-                self.aw_dec.slave_sel_r))
+            # beats up to the next 4 KB boundary
+            Case(req.size, {
+                s: boundary.eq((1 << (12 - s)) - req.addr[s:12])
+                for s in sizes}),
+            limit.eq(max_len),
+            If((req.burst == Burst.incr) & (boundary < max_len),
+               limit.eq(boundary)),
+            beats.eq(remaining),
+            If((req.burst != Burst.wrap) & (remaining > limit),
+               beats.eq(limit)),
+            Case(req.size, {
+                s: next_addr.eq((req.addr[s:] + beats) << s)
+                for s in sizes}),
+            self.final.eq(beats == remaining),
+            self.len.eq(beats - 1),
+            req.connect(s_a, omit={"valid", "ready", "len"}),
+            s_a.len.eq(self.len),
+            s_a.valid.eq(busy & accept),
+            m_a.ready.eq(~busy | (s_a.ready & accept & self.final)),
+        ]
+        self.sync += [
+            If(
+                s_a.valid & s_a.ready,
+                busy.eq(~self.final),
+                If(req.burst == Burst.incr, req.addr.eq(next_addr)),
+                remaining.eq(remaining - beats),
+            ),
+            If(
+                m_a.valid & m_a.ready,
+                busy.eq(1),
+                m_a.connect(req, omit={"valid", "ready"}),
+                remaining.eq(m_a.len + 1),
+            ),
+        ]
+
+
+class BurstSplitter(Module):
+    """
+    Split bursts into AXI3 compliant sub-bursts.
+
+    FIXED and INCR bursts are issued as sub-bursts of at most ``max_len``
+    beats, INCR sub-bursts do not cross a 4 KB boundary. R ``last`` is
+    only passed on the final sub-burst, W ``last`` is inserted at every
+    sub-burst end, the B responses of the sub-bursts are merged into the
+    worst one.
+    Requests are registered before splitting. Sub-bursts w/ another ID
+    than the outstanding ones are held, so their responses return in
+    request order.
+
+    Parameters
+    ----------
+    master : Interface
+    slave : Interface
+    max_len : int, optional
+        Maximum number of beats of a sub-burst.
+    npending : int, optional
+        Number of outstanding sub-bursts per direction.
+    """
+    def __init__(self, master, slave, max_len=16, npending=4):
+        self.r_burst = stream.SyncFIFO([("final", 1)], npending)
+        self.w_burst = stream.SyncFIFO([("len", 8)], npending)
+        self.b_burst = stream.SyncFIFO([("final", 1)], npending)
+
+        ###
+
+        self.submodules += self.r_burst, self.w_burst, self.b_burst
+
+        # hold requests w/ another ID until the pending ones completed
+        accept = dict()
+        for name, done in [("ar", self.r_burst.source),
+                           ("aw", self.b_burst.source)]:
+            a = getattr(slave, name)
+            pending = Signal(max=npending + 1)
+            id_ = Signal(len(a.id), reset_less=True)
+            accept[name] = Signal()
+            self.comb += accept[name].eq(
+                (pending == 0) | (a.id == id_))
+            self.sync += [
+                pending.eq(
+                    pending + (a.valid & a.ready) - (done.stb & done.ack)),
+                If(a.valid & a.ready, id_.eq(a.id)),
+            ]
+
+        # AR, R
+        ar = _BurstSplit(
+            master.ar, slave.ar, max_len,
+            self.r_burst.sink.ack & accept["ar"])
+        self.submodules += ar
         self.comb += [
-            master.aw.ready.eq(
-                target.aw.ready &
-                # FIFO writable?
-                w_transaction_ack &
-                (self.aw_rr.grant == i)) for i, master in enumerate(masters)]
-
-        # connect bus requests to round-robin selector
-        ar_reqs = [
-            master.ar.valid & ~master.ar.ready for master in masters]
-        aw_reqs = [
-            master.aw.valid & ~master.aw.ready for master in masters]
+            self.r_burst.sink.stb.eq(slave.ar.valid & slave.ar.ready),
+            self.r_burst.sink.final.eq(ar.final),
+            master.r.connect(slave.r, omit={"valid", "ready", "last"}),
+            master.r.last.eq(slave.r.last & self.r_burst.source.final),
+            master.r.valid.eq(slave.r.valid & self.r_burst.source.stb),
+            slave.r.ready.eq(master.r.ready & self.r_burst.source.stb),
+            self.r_burst.source.ack.eq(
+                slave.r.valid & slave.r.ready & slave.r.last),
+        ]
+
+        # AW, W
+        aw = _BurstSplit(
+            master.aw, slave.aw, max_len,
+            self.w_burst.sink.ack & self.b_burst.sink.ack & accept["aw"])
+        self.submodules += aw
+        w_cnt = Signal(8)
         self.comb += [
-            self.ar_rr.request.eq(Cat(*ar_reqs)),
-            self.aw_rr.request.eq(Cat(*aw_reqs)),
+            self.w_burst.sink.stb.eq(slave.aw.valid & slave.aw.ready),
+            self.w_burst.sink.len.eq(aw.len),
+            self.b_burst.sink.stb.eq(slave.aw.valid & slave.aw.ready),
+            self.b_burst.sink.final.eq(aw.final),
+            master.w.connect(slave.w, omit={"valid", "ready", "last"}),
+            slave.w.last.eq(w_cnt == self.w_burst.source.len),
+            slave.w.valid.eq(master.w.valid & self.w_burst.source.stb),
+            master.w.ready.eq(slave.w.ready & self.w_burst.source.stb),
+            self.w_burst.source.ack.eq(
+                slave.w.valid & slave.w.ready & slave.w.last),
         ]
+        self.sync += If(
+            slave.w.valid & slave.w.ready,
+            w_cnt.eq(Mux(slave.w.last, 0, w_cnt + 1)),
+        )
 
-        # connect transaction sinks
-        aw_acked = Signal()
+        # B, merge the responses of the sub-bursts
+        resp = Signal(len(master.b.resp), reset=Response.exokay)
+        final = self.b_burst.source.final
         self.comb += [
-            Cat(*[fifo.sink.stb for fifo in self.r_transaction]).eq(
-                Cat(*[ar.valid & ar.ready for
-                      ar in [master.ar for master in masters]])),
-            aw_acked.eq(target.aw.valid & target.aw.ready),
-            Cat(*[fifo.sink.stb for fifo in self.w_transaction]).eq(
-                Replicate(aw_acked, len(slaves)) & self.aw_dec.slave_sel_r)
+            master.b.id.eq(slave.b.id),
+            master.b.resp.eq(_merge_resp(resp, slave.b.resp)),
+            master.b.valid.eq(slave.b.valid & self.b_burst.source.stb & final),
+            slave.b.ready.eq(
+                self.b_burst.source.stb & (master.b.ready | ~final)),
+            self.b_burst.source.ack.eq(slave.b.valid & slave.b.ready),
         ]
+        self.sync += If(
+            self.b_burst.source.ack,
+            resp.eq(Mux(final, Response.exokay, master.b.resp)),
+        )
+
+
+class _IdPool(Module):
+    # map the IDs of master channel a onto the slots of the pool, restore
+    # them on the response channel, a slot is freed w/ its last response.
+    # The slot of a stalled request is held until its handshake.
+    def __init__(self, m_a, s_a, m_resp, s_resp, done, nids, npending,
+                 accept=C(1)):
+        self.orig = [Signal(len(m_a.id)) for _ in range(nids)]
+        self.count = [Signal(max=npending + 1) for _ in range(nids)]
+        self.busy = Signal(nids)
+        self.slot = Signal(max=max(2, nids))
+
+        ###
+
+        hit = coding.PriorityEncoder(nids)
+        free = coding.PriorityEncoder(nids)
+        self.submodules += hit, free
+        slot = self.slot
+        avail = Signal()
+        held = Signal()
+        held_slot = Signal.like(slot)
+        resp_slot = Signal.like(slot)
         self.comb += [
-            fifo.sink.sel.eq(self.ar_dec.slave_sel_r) for
-            fifo in self.r_transaction]
-        self.submodules.decoder = coding.Decoder(len(masters))
-        self.comb += self.decoder.i.eq(self.aw_rr.grant)
+            self.busy.eq(Cat(*[count != 0 for count in self.count])),
+            hit.i.eq(self.busy & Cat(*[
+                orig == m_a.id for orig in self.orig])),
+            free.i.eq(~self.busy),
+            # outstanding IDs keep their slot, new IDs take a free one
+            If(
+                held,
+                slot.eq(held_slot),
+                avail.eq(1),
+            ).Elif(
+                hit.n,
+                slot.eq(free.o),
+                avail.eq(~free.n),
+            ).Else(
+                slot.eq(hit.o),
+                avail.eq(Array(self.count)[hit.o] != npending),
+            ),
+            m_a.connect(s_a, omit={"valid", "ready", "id"}),
+            s_a.id.eq(slot),
+            s_a.valid.eq(m_a.valid & avail & accept),
+            m_a.ready.eq(s_a.ready & avail & accept),
+            resp_slot.eq(s_resp.id),
+            m_resp.connect(s_resp, omit={"id"}),
+            m_resp.id.eq(Array(self.orig)[resp_slot]),
+        ]
+        take = Signal()
+        self.comb += take.eq(s_a.valid & s_a.ready)
+        self.sync += [
+            held.eq(s_a.valid & ~s_a.ready),
+            held_slot.eq(slot),
+        ]
+        for k, (orig, count) in enumerate(zip(self.orig, self.count)):
+            self.sync += [
+                If(take & (slot == k), orig.eq(m_a.id)),
+                count.eq(
+                    count + (take & (slot == k)) -
+                    (done & (resp_slot == k))),
+            ]
+
+
+class IdRemapper(Module):
+    """
+    Remap wide master IDs onto a small pool of slave IDs.
+
+    Reads and writes each allocate from a pool of ``nids`` slave IDs.
+    Transactions of an outstanding master ID reuse its slave ID, thus the
+    ordering per master ID is kept, new master IDs take a free slave ID or
+    are held until one is freed by the last R beat or the B response. The
+    slave ID of a request is held until its handshake. W bursts shall
+    follow the AW order, they take the slave ID of their AW. R and B get
+    the master ID restored.
+
+    Parameters
+    ----------
+    master : Interface
+    slave : Interface
+    nids : int, optional
+        Size of the ID pools, ``2**slave.id_width`` by default.
+    npending : int, optional
+        Number of outstanding transactions per master ID, and of write
+        bursts accepted on AW ahead of their W data.
+
+    Attributes
+    ----------
+    read, write : Module
+        Per slave ID ``orig`` master ID and ``count`` of outstanding
+        transactions.
+    w_transaction : misoc.interconnect.stream.SyncFIFO
+        Slave ID of the accepted write bursts, in AW order.
+    """
+    def __init__(self, master, slave, nids=None, npending=8):
+        nids = 2**slave.id_width if nids is None else nids
+        if not 0 < nids <= 2**slave.id_width:
+            raise ValueError(
+                "nids shall be in [1, 2**slave.id_width]")
+        self.w_transaction = stream.SyncFIFO(
+            set_layout_parameters(
+                _transaction_layout, n=bits_for(max(1, nids - 1))),
+            npending)
+
+        ###
+
+        self.submodules.read = _IdPool(
+            master.ar, slave.ar, master.r, slave.r,
+            slave.r.valid & slave.r.ready & slave.r.last, nids, npending)
+        self.submodules.write = _IdPool(
+            master.aw, slave.aw, master.b, slave.b,
+            slave.b.valid & slave.b.ready, nids, npending,
+            self.w_transaction.sink.ack)
+        self.submodules += self.w_transaction
+
+        # W bursts take the slave ID of their AW, in AW order
+        w_slot = self.w_transaction.source.sel
         self.comb += [
-            fifo.sink.sel.eq(self.decoder.o) for
-            fifo in self.w_transaction]
+            self.w_transaction.sink.stb.eq(slave.aw.valid & slave.aw.ready),
+            self.w_transaction.sink.sel.eq(self.write.slot),
+            master.w.connect(slave.w, omit={"valid", "ready", "id"}),
+            slave.w.id.eq(w_slot),
+            slave.w.valid.eq(master.w.valid & self.w_transaction.source.stb),
+            master.w.ready.eq(
+                slave.w.ready & self.w_transaction.source.stb),
+            self.w_transaction.source.ack.eq(
+                slave.w.valid & slave.w.ready & slave.w.last),
+        ]
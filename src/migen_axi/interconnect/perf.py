@@ -0,0 +1,265 @@
+from migen import *  # noqa
+from misoc.interconnect.csr import AutoCSR, CSR, CSRStatus, CSRStorage
+
+
+__all__ = ["AxiPerfMonitor", "LatencyHistogram"]
+
+
+class AxiPerfMonitor(Module, AutoCSR):
+    """
+    Passive AXI performance counters.
+
+    Counts the elapsed cycles, AR and AW handshakes, R and W beats and per
+    channel the cycles stalled by the receiver, i.e. valid high while ready
+    is low. The counters run freely, a snapshot copies them to the status
+    registers at once so a consistent set is read back.
+
+    Parameters
+    ----------
+    bus : Interface
+        Interface to tap, the monitor only reads its signals.
+    counter_width : int, optional
+
+    Attributes
+    ----------
+    _control : misoc.interconnect.csr.CSR
+        - [0] snapshot counters
+        - [1] clear counters, after the snapshot if both are set
+    _cycles, _ar_count, _aw_count, _r_count, _w_count : CSRStatus
+    _ar_stall, _aw_stall, _w_stall, _r_stall, _b_stall : CSRStatus
+    """
+    def __init__(self, bus, counter_width=32):
+        self._control = CSR(2)
+        events = [("cycles", C(1))]
+        events += [
+            ("{}_count".format(name), ch.valid & ch.ready)
+            for name, ch in [("ar", bus.ar), ("aw", bus.aw), ("r", bus.r),
+                             ("w", bus.w)]]
+        events += [
+            ("{}_stall".format(name), ch.valid & ~ch.ready)
+            for name, ch in [("ar", bus.ar), ("aw", bus.aw), ("w", bus.w),
+                             ("r", bus.r), ("b", bus.b)]]
+        for name, _ in events:
+            setattr(self, "_" + name, CSRStatus(counter_width, name=name))
+
+        ###
+
+        snapshot = Signal()
+        clear = Signal()
+        self.comb += [
+            snapshot.eq(self._control.re & self._control.r[0]),
+            clear.eq(self._control.re & self._control.r[1]),
+        ]
+        for name, event in events:
+            count = Signal(counter_width)
+            self.sync += [
+                If(
+                    clear,
+                    count.eq(event),
+                ).Elif(
+                    event,
+                    count.eq(count + 1),
+                ),
+                If(snapshot, getattr(self, "_" + name).status.eq(count)),
+            ]
+
+
+class _LatencyTracker(Module):
+    # timestamp requests on channel a by ID, emit the latency when the
+    # response is done. Responses of an ID come back in order, so each ID
+    # queues up to depth timestamps. A request issued while its queue is
+    # full is skipped, as are the later requests of that ID until the
+    # skipped ones are answered, which keeps the queue in order.
+    def __init__(self, a, resp, done, now, id_bits, depth):
+        self.stb = Signal()
+        self.latency = Signal(len(now))
+
+        ###
+
+        nids = 2**id_bits
+        self.mem = Memory(len(now), nids * depth)
+        wr = self.mem.get_port(write_capable=True)
+        rd = self.mem.get_port(async_read=True)
+        self.specials += self.mem, wr, rd
+
+        level = [Signal(max=depth + 1) for _ in range(nids)]
+        skipped = [Signal(8) for _ in range(nids)]
+        wp = [Signal(max=max(2, depth)) for _ in range(nids)]
+        rp = [Signal(max=max(2, depth)) for _ in range(nids)]
+        push = [Signal() for _ in range(nids)]
+        a_id = Signal(id_bits)
+        resp_id = Signal(id_bits)
+        request = Signal()
+        self.comb += [
+            a_id.eq(a.id),
+            resp_id.eq(resp.id),
+            request.eq(a.valid & a.ready),
+            wr.adr.eq(a_id * depth + Array(wp)[a_id]),
+            wr.dat_w.eq(now),
+            wr.we.eq(Array(push)[a_id]),
+            rd.adr.eq(resp_id * depth + Array(rp)[resp_id]),
+            self.stb.eq(done & (Array(level)[resp_id] != 0)),
+            self.latency.eq(now - rd.dat_r),
+        ]
+        for k in range(nids):
+            req = Signal()
+            rsp = Signal()
+            pop = Signal()
+            self.comb += [
+                req.eq(request & (a_id == k)),
+                rsp.eq(done & (resp_id == k)),
+                push[k].eq(req & (level[k] != depth) & (skipped[k] == 0)),
+                pop.eq(rsp & (level[k] != 0)),
+            ]
+            self.sync += [
+                level[k].eq(level[k] + push[k] - pop),
+                skipped[k].eq(
+                    skipped[k] + (req & ~push[k]) -
+                    (rsp & ~pop & (skipped[k] != 0))),
+                If(push[k], If(wp[k] == depth - 1, wp[k].eq(0)).Else(
+                    wp[k].eq(wp[k] + 1))),
+                If(pop, If(rp[k] == depth - 1, rp[k].eq(0)).Else(
+                    rp[k].eq(rp[k] + 1))),
+            ]
+
+
+class _LatencyBins(Module):
+    # histogram in a memory, read-modify-write w/ forwarding of the last
+    # write, cleared by a sweep. The read port serves the readout while
+    # binning is disabled.
+    def __init__(self, nbins, shift, counter_width, latency_width):
+        self.stb = Signal()
+        self.latency = Signal(latency_width)
+        self.enable = Signal()
+        self.clear = Signal()
+        self.index = Signal(max=max(2, nbins))
+        self.count = Signal(counter_width)
+        self.mem = Memory(counter_width, nbins)
+
+        ###
+
+        rd = self.mem.get_port()
+        wr = self.mem.get_port(write_capable=True)
+        self.specials += self.mem, rd, wr
+
+        bin_ = Signal(max=max(2, nbins))
+        scaled = Signal(latency_width - shift)
+        self.comb += [
+            scaled.eq(self.latency[shift:]),
+            bin_.eq(Mux(scaled >= nbins - 1, nbins - 1, scaled)),
+            rd.adr.eq(Mux(self.enable, bin_, self.index)),
+            self.count.eq(rd.dat_r),
+        ]
+
+        valid = Signal()
+        bin_r = Signal.like(bin_)
+        last_we = Signal()
+        last_adr = Signal.like(bin_)
+        last_dat = Signal(counter_width)
+        value = Signal(counter_width)
+        clearing = Signal()
+        clear_adr = Signal.like(bin_)
+        self.comb += [
+            value.eq(Mux(
+                last_we & (last_adr == bin_r), last_dat, rd.dat_r)),
+            If(
+                clearing,
+                wr.adr.eq(clear_adr),
+                wr.dat_w.eq(0),
+                wr.we.eq(1),
+            ).Else(
+                wr.adr.eq(bin_r),
+                wr.dat_w.eq(value + 1),
+                wr.we.eq(valid),
+            ),
+        ]
+        self.sync += [
+            valid.eq(self.stb & self.enable & ~clearing),
+            bin_r.eq(bin_),
+            last_we.eq(wr.we),
+            last_adr.eq(wr.adr),
+            last_dat.eq(wr.dat_w),
+            If(
+                self.clear,
+                clearing.eq(1),
+                clear_adr.eq(0),
+            ).Elif(
+                clearing,
+                clear_adr.eq(clear_adr + 1),
+                If(clear_adr == nbins - 1, clearing.eq(0)),
+            ),
+        ]
+
+
+class LatencyHistogram(Module, AutoCSR):
+    """
+    Per transaction latency histograms.
+
+    Reads are timed from the AR handshake to the last R beat, writes from
+    the AW handshake to the B response. Latencies are binned into
+    ``nbins`` bins of ``bin_width`` cycles, the last bin collects all
+    longer latencies. Requests are tracked by the lower ``id_bits`` of
+    their ID, each ID queues the timestamps of up to ``depth`` outstanding
+    requests, requests beyond are not sampled. The histograms are read
+    back through ``_index`` and the count CSRs while binning is disabled.
+
+    Parameters
+    ----------
+    bus : Interface
+        Interface to tap, the histogram only reads its signals.
+    nbins : int, optional
+    bin_width : int, optional
+        Cycles per bin, a power of 2.
+    id_bits : int, optional
+        ID bits tracked, ``min(bus.id_width, 4)`` by default.
+    depth : int, optional
+        Outstanding requests timed per ID.
+    counter_width : int, optional
+    timestamp_width : int, optional
+        Latencies shall be less than ``2**timestamp_width`` cycles.
+
+    Attributes
+    ----------
+    _enable : misoc.interconnect.csr.CSRStorage
+        Enable binning, disable for readout.
+    _clear : misoc.interconnect.csr.CSR
+        Clear the histograms, takes ``nbins`` cycles.
+    _index : misoc.interconnect.csr.CSRStorage
+        Bin to read back.
+    _read_count, _write_count : misoc.interconnect.csr.CSRStatus
+        Count of the bin selected by ``_index``.
+    """
+    def __init__(self, bus, nbins=64, bin_width=1, id_bits=None, depth=8,
+                 counter_width=32, timestamp_width=16):
+        shift = log2_int(bin_width)
+        if nbins * bin_width > 2**timestamp_width:
+            raise ValueError(
+                "nbins * bin_width shall be le 2**timestamp_width")
+        id_bits = min(bus.id_width, 4) if id_bits is None else id_bits
+        self._enable = CSRStorage(reset=1)
+        self._clear = CSR()
+        self._index = CSRStorage(bits_for(nbins - 1))
+        self._read_count = CSRStatus(counter_width)
+        self._write_count = CSRStatus(counter_width)
+
+        ###
+
+        now = Signal(timestamp_width)
+        self.sync += now.eq(now + 1)
+        r_done = bus.r.valid & bus.r.ready & bus.r.last
+        b_done = bus.b.valid & bus.b.ready
+        for name, a, resp, done in [("read", bus.ar, bus.r, r_done),
+                                    ("write", bus.aw, bus.b, b_done)]:
+            tracker = _LatencyTracker(
+                a, resp, done, now, id_bits, depth)
+            bins = _LatencyBins(nbins, shift, counter_width, timestamp_width)
+            setattr(self.submodules, name + "_tracker", tracker)
+            setattr(self.submodules, name + "_bins", bins)
+            self.comb += [
+                bins.stb.eq(tracker.stb),
+                bins.latency.eq(tracker.latency),
+                bins.enable.eq(self._enable.storage),
+                bins.clear.eq(self._clear.re),
+                bins.index.eq(self._index.storage),
+                getattr(self, "_{}_count".format(name)).status.eq(bins.count),
+            ]
@@ -1,170 +1,467 @@
-from operator import attrgetter
+from functools import reduce
+from operator import add, attrgetter, or_
 from migen import *  # noqa
+from migen.genlib.fifo import SyncFIFO
 from . import axi
 
-__all__ = ["SRAM"]
+__all__ = ["SRAM", "BankedSRAM"]
 
 
-class SRAM(Module):
-    def __init__(self, mem_or_size, read_only=False, init=None, bus=None):
+def _burst_layout(a_chan):
+    # bursts, the address of the current beat and the next one
+    return [("addr", len(a_chan.addr)), ("len", 8), ("size", 3),
+            ("burst", 2)]
 
-        # SRAM initialisation
 
-        if bus is None:
-            bus = axi.Interface()
-        self.bus = bus
-        bus_data_width = len(self.bus.r.data)
-        if isinstance(mem_or_size, Memory):
-            assert(mem_or_size.width <= bus_data_width)
-            self.mem = mem_or_size
-        else:
-            self.mem = Memory(bus_data_width,
-                              mem_or_size // (bus_data_width // 8),
-                              init=init
-                              )
+class _BurstReader(Module):
+    """
+    Read path of the SRAMs, a pipeline: the issue stage reads one beat per
+    cycle it is granted, taking the first beat of a burst straight from AR,
+    the data returns ``latency`` cycles later along w/ its tags. Beats the
+    master doesn't take at once go to a FIFO, reads are only requested
+    while the FIFO has room for all beats in flight.
 
-        # memory
-        port = self.mem.get_port(write_capable=not read_only, we_granularity=8)
-        self.port = port
-        self.specials += self.mem, port
+    ``tag`` is carried from the issue of a beat to ``tag_out``, the stage
+    ``dat_r`` is taken at.
+    """
+    def __init__(self, ar, r, data_width, adr_width, latency=1,
+                 tag_layout=None):
+        tag_layout = tag_layout or []
+        self.request = Signal()
+        self.grant = Signal()
+        self.issue = Signal()
+        self.busy = Signal()
+        self.adr = Signal(adr_width)
+        self.dat_r = Signal(data_width)
+        self.tag = Record(tag_layout)
 
         # # #
 
-        ar, aw, w, r, b = attrgetter("ar", "aw", "w", "r", "b")(bus)
+        depth = latency + 1
+        adr_lsb = log2_int(data_width // 8)
 
-        id_ = Signal(len(ar.id), reset_less=True)
+        r_burst = Record(_burst_layout(ar))
+        r_remaining = Signal.like(ar.len)
+        r_id = Signal(len(ar.id), reset_less=True)
+        ar_stb = Signal()
+        issue_last = Signal()
+        remaining = Signal.like(ar.len)
+        current = Record(_burst_layout(ar))
+        self.submodules.addr_incr = axi.Incr(current, data_width)
 
-        writing = Signal()
+        tags_layout = [("id", len(ar.id)), ("last", 1)]
+        tags = [Record(tags_layout + tag_layout + [("valid", 1)])
+                for _ in range(latency)]
+        self.tag_out = out = tags[-1]
+        self.submodules.fifo = fifo = SyncFIFO(
+            data_width + len(ar.id) + 1, depth)
+        inflight = Signal(max=depth + 1)
+        room = Signal()
+        fifo_out = Record([("data", data_width)] + tags_layout)
 
-        dout_index = Signal.like(ar.len)
+        self.comb += [
+            inflight.eq(reduce(add, [t.valid for t in tags])),
+            room.eq(fifo.level + inflight < depth),
+            # the burst of the beat issued, the current or a new one
+            If(
+                self.busy,
+                current.eq(r_burst),
+                remaining.eq(r_remaining),
+            ).Else(
+                current.addr.eq(ar.addr),
+                current.len.eq(ar.len),
+                current.size.eq(ar.size),
+                current.burst.eq(ar.burst),
+                remaining.eq(ar.len),
+            ),
+            self.request.eq(room & (self.busy | ar.valid)),
+            self.issue.eq(self.request & self.grant),
+            ar.ready.eq(ar.valid & ~self.busy & self.issue),
+            ar_stb.eq(ar.valid & ar.ready),
+            issue_last.eq(remaining == 0),
+            self.adr.eq(current.addr[adr_lsb:]),
+        ]
+        self.sync += [
+            If(
+                ar_stb,
+                r_burst.len.eq(ar.len),
+                r_burst.size.eq(ar.size),
+                r_burst.burst.eq(ar.burst),
+                r_id.eq(ar.id),
+            ),
+            If(
+                self.issue,
+                self.busy.eq(~issue_last),
+                r_burst.addr.eq(self.addr_incr.addr),
+                r_remaining.eq(remaining - 1),
+            ),
+            tags[0].valid.eq(self.issue),
+            tags[0].id.eq(Mux(ar_stb, ar.id, r_id)),
+            tags[0].last.eq(issue_last),
+        ]
+        self.sync += [getattr(tags[0], name).eq(getattr(self.tag, name))
+                      for name, *_ in tag_layout]
+        self.sync += [t.eq(t_prev) for t_prev, t in zip(tags, tags[1:])]
 
-        # todo: add support for bursts
-        # self.r_addr_incr = axi.Incr(ar)
-        # self.w_addr_incr = axi.Incr(aw)
+        # returned beats bypass the FIFO while it is empty
+        self.comb += [
+            fifo_out.raw_bits().eq(fifo.dout),
+            fifo.din.eq(Cat(self.dat_r, out.id, out.last)),
+            fifo.we.eq(out.valid & (fifo.readable | ~r.ready)),
+            fifo.re.eq(r.ready),
+            r.valid.eq(fifo.readable | out.valid),
+            If(
+                fifo.readable,
+                r.data.eq(fifo_out.data),
+                r.id.eq(fifo_out.id),
+                r.last.eq(fifo_out.last),
+            ).Else(
+                r.data.eq(self.dat_r),
+                r.id.eq(out.id),
+                r.last.eq(out.last),
+            ),
+            r.resp.eq(axi.Response.okay),
+        ]
 
-        # # # Read
 
+class _BurstWriter(Module):
+    """
+    Write path of the SRAMs: takes an AW burst while ``accept``, writes a W
+    beat per cycle it is granted and answers on B.
+    """
+    def __init__(self, aw, w, b, data_width, adr_width):
+        self.accept = Signal()
+        self.request = Signal()
+        self.grant = Signal()
+        self.busy = Signal()
+        self.adr = Signal(adr_width)
+        self.we = Signal(data_width // 8)
+        self.dat_w = Signal(data_width)
+
+        # # #
+
+        adr_lsb = log2_int(data_width // 8)
+
+        w_burst = Record(_burst_layout(aw))
+        w_id = Signal(len(aw.id), reset_less=True)
+        aw_ready = Signal()
+        aw_stb = Signal()
+        self.submodules.addr_incr = axi.Incr(w_burst, data_width)
         self.comb += [
-            r.data.eq(port.dat_r),
-            r.id.eq(id_),
-            r.resp.eq(axi.Response.okay),
+            self.dat_w.eq(w.data),
+            self.adr.eq(w_burst.addr[adr_lsb:]),
+            b.id.eq(w_id),
+            b.resp.eq(axi.Response.okay),
+            aw_ready.eq(aw.valid & self.accept),
+            aw_stb.eq(aw.valid & aw.ready),
         ]
 
-        # read control
-        self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
-        read_fsm.act(
+        def start():
+            return [
+                NextValue(w_burst.addr, aw.addr),
+                NextValue(w_burst.len, aw.len),
+                NextValue(w_burst.size, aw.size),
+                NextValue(w_burst.burst, aw.burst),
+                NextValue(w_id, aw.id),
+            ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act(
             "IDLE",
-            r.valid.eq(0),
+            aw.ready.eq(aw_ready),
             If(
-                ar.valid & ~writing,
-                NextValue(port.adr, ar.addr[2:]),
-                NextValue(dout_index, 0),
-                NextValue(ar.ready, 1),
-                NextValue(id_, ar.id),
-                NextState("READ_WAIT"),
+                aw_stb,
+                start(),
+                NextState("WRITE"),
             )
         )
 
-        read_fsm.act(
-            "READ_WAIT",  # need this state to wait one cycle for data
-            NextValue(ar.ready, 0),
-            NextState("READ")
+        fsm.act(
+            "WRITE",
+            self.busy.eq(1),
+            self.request.eq(w.valid),
+            w.ready.eq(self.grant),
+            If(
+                w.valid & self.grant,
+                self.we.eq(w.strb),
+                NextValue(w_burst.addr, self.addr_incr.addr),
+                If(
+                    w.last,
+                    NextState("WRITE_RESP"),
+                )
+            )
         )
 
-        read_fsm.act(
-            "READ",
-            r.valid.eq(1),
-            r.last.eq(r.valid & dout_index == ar.len),
+        fsm.act(
+            "WRITE_RESP",
+            self.busy.eq(1),
+            b.valid.eq(1),
             If(
-                r.last & r.ready,
-                If(  # ar valid? go straight to the next read
-                    ar.valid & ~writing,
-                    NextValue(port.adr, ar.addr[2:]),
-                    NextValue(dout_index, 0),
-                    NextValue(ar.ready, 1),
-                    NextValue(id_, ar.id),
-                    NextState("READ_WAIT"),
+                b.ready,
+                # go straight for the next write
+                aw.ready.eq(aw_ready),
+                If(
+                    aw_stb,
+                    start(),
+                    NextState("WRITE"),
                 ).Else(
-                    NextState("IDLE")
+                    NextState("IDLE"),
                 )
             )
         )
 
-        self.sync += [
-            If(
-                r.ready & r.valid,
-                dout_index.eq(dout_index + 1),
-            )
-        ]
+
+def _output_register(module, dat_r, pipeline_read):
+    # the memory output, registered for pipeline_read
+    if not pipeline_read:
+        return dat_r
+    dat_r_reg = Signal.like(dat_r, reset_less=True)
+    module.sync += dat_r_reg.eq(dat_r)
+    return dat_r_reg
+
+
+class SRAM(Module):
+    """
+    AXI slave SRAM.
+
+    Parameters
+    ----------
+    mem_or_size : Memory or int
+        Memory to use or its size in bytes.
+    read_only : bool, optional
+    init : list of int, optional
+        Initial content of a Memory created.
+    bus : Interface, optional
+    dual_port : bool, optional
+        Read through a port of its own, reads and writes proceed
+        concurrently instead of taking turns. A read issued in the cycle a
+        write hits the same word returns the bytes written.
+    pipeline_read : bool, optional
+        Register the memory output, reads return a cycle later and bursts
+        still stream one beat per cycle.
+    """
+    def __init__(self, mem_or_size, read_only=False, init=None, bus=None,
+                 dual_port=False, pipeline_read=False):
+
+        # SRAM initialisation
+
+        if bus is None:
+            bus = axi.Interface()
+        self.bus = bus
+        bus_data_width = len(self.bus.r.data)
+        if isinstance(mem_or_size, Memory):
+            assert(mem_or_size.width <= bus_data_width)
+            self.mem = mem_or_size
+        else:
+            self.mem = Memory(bus_data_width,
+                              mem_or_size // (bus_data_width // 8),
+                              init=init
+                              )
+
+        # memory
+        port = self.mem.get_port(write_capable=not read_only, we_granularity=8)
+        self.port = port
+        self.specials += self.mem, port
+        dual_port = dual_port and not read_only
+        if dual_port:
+            r_port = self.mem.get_port(mode=READ_FIRST)
+            self.specials += r_port
+        else:
+            r_port = port
+        self.r_port = r_port
+
+        # # #
+
+        ar, aw, w, r, b = attrgetter("ar", "aw", "w", "r", "b")(bus)
+
+        # # # Read
+
+        # bytes written by a colliding write, forwarded to the beat read
+        fwd_layout = [("mask", len(r_port.dat_r)), ("data", len(r_port.dat_r))]
+        self.submodules.reader = reader = _BurstReader(
+            ar, r, bus_data_width, len(r_port.adr),
+            latency=2 if pipeline_read else 1,
+            tag_layout=fwd_layout if dual_port else [])
+        dat_r = _output_register(self, r_port.dat_r, pipeline_read)
+        if dual_port:
+            out = reader.tag_out
+            self.comb += reader.dat_r.eq(
+                (dat_r & ~out.mask) | (out.data & out.mask))
+        else:
+            self.comb += reader.dat_r.eq(dat_r)
 
         # # # Write
 
         if not read_only:
+            self.submodules.writer = writer = _BurstWriter(
+                aw, w, b, bus_data_width, len(port.adr))
             self.comb += [
-                port.dat_w.eq(w.data),
-                b.id.eq(id_),
-                b.resp.eq(axi.Response.okay),
+                writer.grant.eq(1),
+                port.we.eq(writer.we),
+                port.dat_w.eq(writer.dat_w),
             ]
 
-            self.submodules.write_fsm = write_fsm = FSM(reset_state="IDLE")
-            write_fsm.act(
-                "IDLE",
-                w.ready.eq(0),
+        if read_only:
+            self.comb += [
+                reader.grant.eq(1),
+                port.adr.eq(reader.adr),
+            ]
+        elif dual_port:
+            self.comb += [
+                reader.grant.eq(1),
+                writer.accept.eq(1),
+                port.adr.eq(writer.adr),
+                r_port.adr.eq(reader.adr),
+                # a read of the word written in the same cycle returns the
+                # new bytes, whatever the memory returns on the collision
                 If(
-                    aw.valid,
-                    NextValue(aw.ready, 1),
-                    NextValue(id_, aw.id),
-                    NextValue(writing, 1),
-                    If(
-                        w.valid,  # skip a state if data is ready already
-                        NextValue(port.adr, aw.addr[2:]),
-                        NextState("WRITE"),
-                    ).Else(
-                        NextState("AW_VALID_WAIT")
-                    )
-                )
+                    reader.adr == writer.adr,
+                    reader.tag.mask.eq(Cat(*[
+                        Replicate(port.we[k], 8)
+                        for k in range(len(port.we))])),
+                    reader.tag.data.eq(port.dat_w),
+                ),
+            ]
+        else:
+            # read and write take turns on the port when both are requested
+            write_turn = Signal()
+            self.sync += If(
+                ar.valid & ar.ready,
+                write_turn.eq(1),
+            ).Elif(
+                aw.valid & aw.ready,
+                write_turn.eq(0),
             )
+            self.comb += [
+                reader.grant.eq(reader.busy | ~(
+                    writer.busy | (aw.valid & write_turn))),
+                writer.accept.eq(~(
+                    reader.busy | (ar.valid & ~write_turn))),
+                port.adr.eq(Mux(writer.busy, writer.adr, reader.adr)),
+            ]
 
-            write_fsm.act(
-                "AW_VALID_WAIT",  # wait for data, if not available yet
-                If(
-                    w.valid,
-                    NextValue(port.adr, aw.addr[2:]),
-                    NextState("WRITE"),
-                )
-            )
 
-            write_fsm.act(
-                "WRITE",
-                NextValue(aw.ready, 0),
-                w.ready.eq(1),
-                port.we.eq(w.strb),
-                If(
-                    w.ready & w.last,
-                    NextValue(writing, 0),
-                    NextState("WRITE_RESP")
-                )
-            )
+class _RoundRobin(Module):
+    # round-robin w/ the grant following the requests in the same cycle,
+    # starting after the last one granted
+    def __init__(self, n):
+        self.request = Signal(n)
+        self.grant = Signal(max=max(2, n))
+        self.granted = Signal()
 
-            write_fsm.act(
-                "WRITE_RESP",
-                b.valid.eq(1),
-                If(
-                    b.ready,
-                    If(  # aw valid? go straight for the next write
-                        aw.valid,
-                        NextValue(aw.ready, 1),
-                        NextValue(id_, aw.id),
-                        NextValue(writing, 1),
-                        If(
-                            w.valid,
-                            NextValue(port.adr, aw.addr[2:]),
-                            NextState("WRITE"),
-                        ).Else(
-                            NextState("AW_VALID_WAIT")
-                        )
+        # # #
+
+        last = Signal.like(self.grant)
+        cases = {}
+        for i in range(n):
+            switch = []
+            for j in reversed(range(i + 1, i + n + 1)):
+                t = j % n
+                switch = [
+                    If(
+                        self.request[t],
+                        self.grant.eq(t),
                     ).Else(
-                        NextState("IDLE")
+                        *switch
                     )
-                )
-            )
+                ]
+            cases[i] = switch
+        self.comb += [
+            Case(last, cases),
+            self.granted.eq(self.request != 0),
+        ]
+        self.sync += If(self.granted, last.eq(self.grant))
+
+
+class BankedSRAM(Module):
+    """
+    AXI slave SRAM shared by several masters, words interleaved across
+    banks.
+
+    Word ``k`` is in bank ``k % nbanks``, each bank is a Memory of its own
+    w/ a single port. Every cycle each bank serves one beat of the read and
+    write bursts of the masters, granted round-robin, so masters and bursts
+    hitting different banks proceed in parallel. The beats of a burst
+    follow each other across the banks.
+
+    Parameters
+    ----------
+    size : int
+        Size in bytes.
+    nbanks : int, optional
+        Banks, a power of 2.
+    nmasters : int, optional
+        Masters, the number of ``buses`` created when they aren't given.
+    data_width : int, optional
+    init : list of int, optional
+        Initial content, in words.
+    buses : list of Interface, optional
+    read_only : bool, optional
+    pipeline_read : bool, optional
+        Register the bank outputs, as for ``SRAM``.
+    """
+    def __init__(self, size, nbanks=4, nmasters=2, data_width=32, init=None,
+                 buses=None, read_only=False, pipeline_read=False):
+        if buses is None:
+            buses = [axi.Interface(data_width=data_width)
+                     for _ in range(nmasters)]
+        self.buses = buses
+        data_width = len(buses[0].r.data)
+        nwords = size // (data_width // 8)
+        bank_bits = log2_int(nbanks)
+        if nwords % nbanks:
+            raise ValueError("{} words over {} banks".format(nwords, nbanks))
+        init = list(init or [])
+        self.banks = [Memory(data_width, nwords // nbanks,
+                             init=init[k::nbanks] or None)
+                      for k in range(nbanks)]
+        ports = [mem.get_port(write_capable=not read_only, we_granularity=8)
+                 for mem in self.banks]
+        self.specials += self.banks + ports
+        dat_rs = [_output_register(self, port.dat_r, pipeline_read)
+                  for port in ports]
+
+        # # #
+
+        # the requesters of each bank, per master a reader and a writer
+        requesters = []
+        for bus in buses:
+            ar, aw, w, r, b = attrgetter("ar", "aw", "w", "r", "b")(bus)
+            reader = _BurstReader(
+                ar, r, data_width, bits_for(nwords - 1),
+                latency=2 if pipeline_read else 1,
+                tag_layout=[("bank", max(bank_bits, 1))])
+            self.submodules += reader
+            self.comb += [
+                reader.tag.bank.eq(reader.adr[:bank_bits]),
+                reader.dat_r.eq(Array(dat_rs)[
+                    reader.tag_out.bank]),
+            ]
+            requesters.append((reader, None))
+            if not read_only:
+                writer = _BurstWriter(
+                    aw, w, b, data_width, bits_for(nwords - 1))
+                self.submodules += writer
+                self.comb += writer.accept.eq(1)
+                requesters.append((writer, writer.we))
+
+        # per bank arbitration
+        grants = [[] for _ in requesters]
+        for k, port in enumerate(ports):
+            arbiter = _RoundRobin(len(requesters))
+            self.submodules += arbiter
+            cases = {}
+            for i, (requester, we) in enumerate(requesters):
+                self.comb += arbiter.request[i].eq(
+                    requester.request &
+                    (requester.adr[:bank_bits] == k))
+                grants[i].append(arbiter.granted & (arbiter.grant == i))
+                cases[i] = [port.adr.eq(requester.adr[bank_bits:])]
+                if we is not None:
+                    cases[i] += [
+                        If(arbiter.granted, port.we.eq(we)),
+                        port.dat_w.eq(requester.dat_w),
+                    ]
+            self.comb += Case(arbiter.grant, cases)
+        for (requester, _), granted in zip(requesters, grants):
+            self.comb += requester.grant.eq(reduce(or_, granted))
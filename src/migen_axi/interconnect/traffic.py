@@ -0,0 +1,233 @@
+from functools import reduce
+from operator import and_
+from migen import *  # noqa
+from misoc.interconnect.csr import AutoCSR, CSR, CSRStatus, CSRStorage
+from .axi import Burst, Response, burst_size
+
+
+__all__ = ["TrafficGenerator"]
+
+
+class _Offsets(Module):
+    # byte offsets of consecutive bursts of step bytes, wrapping to 0 when
+    # the next burst would not fit into range
+    def __init__(self, width, step, range_):
+        self.restart = Signal()
+        self.advance = Signal()
+        self.offset = Signal(width)
+
+        ###
+
+        self.sync += If(
+            self.restart,
+            self.offset.eq(0),
+        ).Elif(
+            self.advance,
+            If(
+                self.offset + (step << 1) > range_,
+                self.offset.eq(0),
+            ).Else(
+                self.offset.eq(self.offset + step),
+            ),
+        )
+
+
+class TrafficGenerator(Module, AutoCSR):
+    """
+    AXI master issuing bursts at full rate for bandwidth characterization.
+
+    A start issues ``_reads`` read and ``_writes`` write bursts of
+    ``_len + 1`` beats, reads and writes run concurrently with up to
+    ``_outstanding`` bursts in flight each, clamped to
+    ``1..max_outstanding``. Bursts walk through
+    ``[_base, _base + _range)`` and wrap around, keep ``_base`` aligned
+    to the burst size and bursts within 4 KB. Each 32 bit word of a beat
+    carries the beat address XOR ``_pattern``, R data is checked against it
+    if ``_check`` is set, i.e. when reading back what was written.
+
+    The bandwidth achieved is ``(_read_beats + _write_beats) * bytes per
+    beat / _cycles`` per clock cycle.
+
+    Parameters
+    ----------
+    bus : Interface
+        Interface driven, e.g. ``PS7.s_axi_hp0``, at least 32 bit wide.
+    max_outstanding : int, optional
+    counter_width : int, optional
+
+    Attributes
+    ----------
+    _start : misoc.interconnect.csr.CSR
+        Reset the counters and start, ignored while a test is running.
+    _base, _range, _len, _reads, _writes : CSRStorage
+    _outstanding, _pattern, _check : CSRStorage
+    _busy, _cycles, _read_beats, _write_beats : CSRStatus
+        Busy while bursts are pending, cycles elapsed since the start.
+    _resp_errors, _data_errors : CSRStatus
+        Count of responses other than OKAY and of R beats w/ unexpected
+        data.
+    """
+    def __init__(self, bus, max_outstanding=8, counter_width=32):
+        dw = bus.data_width
+        if dw < 32:
+            raise ValueError("data_width shall be ge 32")
+        addr_width = bus.addr_width
+        self._start = CSR()
+        self._base = CSRStorage(addr_width)
+        self._range = CSRStorage(addr_width)
+        self._len = CSRStorage(8)
+        self._reads = CSRStorage(counter_width)
+        self._writes = CSRStorage(counter_width)
+        self._outstanding = CSRStorage(
+            bits_for(max_outstanding), reset=max_outstanding)
+        self._pattern = CSRStorage(32)
+        self._check = CSRStorage()
+        self._busy = CSRStatus()
+        self._cycles = CSRStatus(counter_width)
+        self._read_beats = CSRStatus(counter_width)
+        self._write_beats = CSRStatus(counter_width)
+        self._resp_errors = CSRStatus(counter_width)
+        self._data_errors = CSRStatus(counter_width)
+
+        ###
+
+        ar, aw, w, r, b = bus.ar, bus.aw, bus.w, bus.r, bus.b
+        size = burst_size(dw // 8)
+        start = Signal()
+        base = self._base.storage
+        len_ = self._len.storage
+        pattern = self._pattern.storage
+        running = Signal()
+        step = Signal(addr_width + 1)
+        outstanding = Signal(max=max_outstanding + 1)
+        self.comb += [
+            # a running test completes its bursts in flight first
+            start.eq(self._start.re & ~running),
+            If(
+                self._outstanding.storage > max_outstanding,
+                outstanding.eq(max_outstanding),
+            ).Elif(
+                self._outstanding.storage == 0,
+                outstanding.eq(1),
+            ).Else(
+                outstanding.eq(self._outstanding.storage),
+            ),
+            step.eq((len_ + 1) << size),
+            self._busy.status.eq(running),
+            w.strb.eq(2**len(w.strb) - 1),
+            r.ready.eq(1),
+            b.ready.eq(1),
+        ]
+
+        def offsets(name):
+            offsets = _Offsets(addr_width, step, self._range.storage)
+            setattr(self.submodules, name + "_offsets", offsets)
+            self.comb += offsets.restart.eq(start)
+            return offsets
+
+        def data(addr):
+            word = Signal(32)
+            self.comb += word.eq(addr ^ pattern)
+            return Cat(*[word] * (dw // 32))
+
+        # requests
+        finished = []
+        issued = {}
+        for name, a, done, target in [
+                ("read", ar, r.valid & r.last, self._reads.storage),
+                ("write", aw, b.valid, self._writes.storage)]:
+            a_offsets = offsets(name)
+            count = Signal(counter_width)
+            completed = Signal(counter_width)
+            pending = Signal(max=max_outstanding + 1)
+            request = Signal()
+            self.comb += [
+                a.addr.eq(base + a_offsets.offset),
+                a.len.eq(len_),
+                a.size.eq(size),
+                a.burst.eq(Burst.incr),
+                a.valid.eq(
+                    running & (count != target) &
+                    (pending < outstanding)),
+                request.eq(a.valid & a.ready),
+                a_offsets.advance.eq(request),
+            ]
+            self.sync += If(
+                start,
+                count.eq(0),
+                completed.eq(0),
+                pending.eq(0),
+            ).Else(
+                count.eq(count + request),
+                completed.eq(completed + done),
+                pending.eq(pending + request - done),
+            )
+            finished.append(completed == target)
+            issued[name] = count
+
+        self.sync += If(
+            start,
+            running.eq(1),
+            self._cycles.status.eq(0),
+        ).Elif(
+            running,
+            self._cycles.status.eq(self._cycles.status + 1),
+            If(reduce(and_, finished), running.eq(0)),
+        )
+
+        # write data, W bursts follow their AW
+        w_offsets = offsets("w")
+        w_beat = Signal(8)
+        w_bursts = Signal(counter_width)
+        w_addr = Signal(addr_width)
+        w_beat_stb = Signal()
+        self.comb += [
+            w_addr.eq(base + w_offsets.offset + (w_beat << size)),
+            w.data.eq(data(w_addr)),
+            w.last.eq(w_beat == len_),
+            w.valid.eq(running & (w_bursts != issued["write"])),
+            w_beat_stb.eq(w.valid & w.ready),
+            w_offsets.advance.eq(w_beat_stb & w.last),
+        ]
+        self.sync += If(
+            start,
+            w_beat.eq(0),
+            w_bursts.eq(0),
+            self._write_beats.status.eq(0),
+        ).Elif(
+            w_beat_stb,
+            w_beat.eq(Mux(w.last, 0, w_beat + 1)),
+            w_bursts.eq(w_bursts + w.last),
+            self._write_beats.status.eq(self._write_beats.status + 1),
+        )
+
+        # read data check, R bursts return in order w/ the ID fixed
+        r_offsets = offsets("r")
+        r_beat = Signal(8)
+        r_addr = Signal(addr_width)
+        r_expected = Signal(dw)
+        self.comb += [
+            r_addr.eq(base + r_offsets.offset + (r_beat << size)),
+            r_expected.eq(data(r_addr)),
+            r_offsets.advance.eq(r.valid & r.last),
+        ]
+        self.sync += If(
+            start,
+            r_beat.eq(0),
+            self._read_beats.status.eq(0),
+            self._resp_errors.status.eq(0),
+            self._data_errors.status.eq(0),
+        ).Else(
+            If(
+                r.valid,
+                r_beat.eq(Mux(r.last, 0, r_beat + 1)),
+                self._read_beats.status.eq(self._read_beats.status + 1),
+            ),
+            self._resp_errors.status.eq(
+                self._resp_errors.status +
+                (r.valid & (r.resp != Response.okay)) +
+                (b.valid & (b.resp != Response.okay))),
+            self._data_errors.status.eq(
+                self._data_errors.status +
+                (r.valid & self._check.storage & (r.data != r_expected))),
+        )
@@ -0,0 +1,6 @@
+from .trace import *  # noqa
+from .master import *  # noqa
+from .memory import *  # noqa
+from .checker import *  # noqa
+from .stall import *  # noqa
+from .profile import *  # noqa
@@ -0,0 +1,164 @@
+"""
+AXI3 protocol checker for simulation.
+
+Add the passive monitor to the generators of a simulation, the first
+violation raises :class:`ProtocolError`::
+
+    checker = ProtocolChecker(dut.bus)
+    run_simulation(dut, [testbench(), checker.monitor()])
+"""
+from collections import defaultdict, deque
+from migen.sim import passive
+from migen_axi.interconnect.axi import Burst
+
+
+__all__ = ["ProtocolError", "ProtocolChecker"]
+
+
+CHANNELS = ("aw", "w", "b", "ar", "r")
+
+
+class ProtocolError(AssertionError):
+    pass
+
+
+class ProtocolChecker:
+    """
+    Check the handshakes and bursts on an Interface cycle by cycle.
+
+    Checked are: valid held until ready, payload stable while valid, bursts
+    within 4 KB, AXI3 burst lengths, WRAP bursts of 2, 4, 8 or 16 aligned
+    beats, ``last`` on beat ``len + 1`` of W and R bursts, B and R IDs
+    w/ an outstanding request and W data w/o a preceding AW.
+
+    Parameters
+    ----------
+    bus : Interface
+    strict : bool, optional
+        Raise on the first violation, otherwise collect them in ``errors``.
+    allow_early_w : bool, optional
+        Accept W data ahead of its AW as AXI allows, the W bursts aren't
+        checked then.
+
+    Attributes
+    ----------
+    errors : list of (int, str, str)
+        Cycle, channel and description of the violations.
+    """
+    def __init__(self, bus, strict=True, allow_early_w=False):
+        self.bus = bus
+        self.strict = strict
+        self.allow_early_w = allow_early_w
+        self.errors = []
+
+    def _error(self, cycle, channel, msg):
+        self.errors.append((cycle, channel, msg))
+        if self.strict:
+            raise ProtocolError(
+                "cycle {} {}: {}".format(cycle, channel, msg))
+
+    def _check_a(self, cycle, channel, a):
+        nbytes = 2**a["size"]
+        if nbytes > self.bus.data_width // 8:
+            self._error(cycle, channel, "size {} wider than the bus".format(
+                a["size"]))
+        if a["len"] > 15:
+            self._error(cycle, channel, "burst of {} beats".format(
+                a["len"] + 1))
+        if a["burst"] == Burst.incr:
+            first = a["addr"]
+            last = a["addr"] // nbytes * nbytes + a["len"] * nbytes
+            if first >> 12 != last >> 12:
+                self._error(cycle, channel, "burst {:#x}..{:#x} crosses "
+                            "4 KB".format(first, last + nbytes - 1))
+        elif a["burst"] == Burst.wrap:
+            if a["len"] not in (1, 3, 7, 15):
+                self._error(cycle, channel, "WRAP burst of {} beats".format(
+                    a["len"] + 1))
+            if a["addr"] % nbytes:
+                self._error(cycle, channel, "unaligned WRAP burst")
+        elif a["burst"] == Burst.reserved:
+            self._error(cycle, channel, "reserved burst type")
+
+    def _check_last(self, cycle, channel, beat, len_, last):
+        if last != (beat == len_):
+            self._error(cycle, channel, "last {} on beat {} of {}".format(
+                last, beat + 1, len_ + 1))
+
+    @passive
+    def monitor(self):
+        bus = self.bus
+        previous = dict()
+        writes = defaultdict(deque)  # per ID, [len, beats] of AWs
+        responses = defaultdict(int)  # per ID, W bursts done w/o B
+        reads = defaultdict(deque)  # per ID, [len, beats] of ARs
+        cycle = 0
+        while True:
+            for name in CHANNELS:
+                ch = getattr(bus, name)
+                valid, ready = (yield ch.valid), (yield ch.ready)
+                payload = dict()
+                for field, *_ in ch.layout:
+                    if field not in ("valid", "ready"):
+                        payload[field] = (yield getattr(ch, field))
+
+                # handshake rules
+                if name in previous:
+                    prev_payload = previous[name]
+                    if not valid:
+                        self._error(cycle, name, "valid dropped w/o ready")
+                    elif payload != prev_payload:
+                        changed = sorted(
+                            field for field in payload
+                            if payload[field] != prev_payload[field])
+                        self._error(cycle, name, "{} changed while "
+                                    "valid".format(", ".join(changed)))
+                previous.pop(name, None)
+                if valid and not ready:
+                    previous[name] = payload
+                if not (valid and ready):
+                    continue
+
+                # transfer rules
+                id_ = payload["id"]
+                if name in ("aw", "ar"):
+                    self._check_a(cycle, name, payload)
+                    if name == "ar":
+                        reads[id_].append([payload["len"], 0])
+                    elif self.allow_early_w:
+                        responses[id_] += 1
+                    else:
+                        writes[id_].append([payload["len"], 0])
+                elif name == "w":
+                    if self.allow_early_w:
+                        continue
+                    if not writes[id_]:
+                        self._error(cycle, name, "W data w/o AW of ID "
+                                    "{:#x}".format(id_))
+                        continue
+                    burst = writes[id_][0]
+                    self._check_last(
+                        cycle, name, burst[1], burst[0], payload["last"])
+                    burst[1] += 1
+                    if payload["last"] or burst[1] > burst[0]:
+                        writes[id_].popleft()
+                        responses[id_] += 1
+                elif name == "b":
+                    if responses[id_]:
+                        responses[id_] -= 1
+                    else:
+                        self._error(cycle, name, "B of ID {:#x} w/o write "
+                                    "pending".format(id_))
+                else:
+                    if not reads[id_]:
+                        self._error(cycle, name, "R of ID {:#x} w/o read "
+                                    "pending".format(id_))
+                        continue
+                    burst = reads[id_][0]
+                    self._check_last(
+                        cycle, name, burst[1], burst[0], payload["last"])
+                    burst[1] += 1
+                    if payload["last"] or burst[1] > burst[0]:
+                        reads[id_].popleft()
+            cycle += 1
+            yield
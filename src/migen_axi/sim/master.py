@@ -0,0 +1,216 @@
+"""
+Transaction level AXI master for simulation.
+
+Transactions are queued and driven at one beat per cycle, up to
+``max_outstanding`` of them in flight::
+
+    master = AxiMaster(bus)
+
+    def testbench():
+        write = master.write(0x1000, [1, 2, 3, 4])
+        read = master.read(0x1000, 4)
+        yield from master.wait(write, read)
+        assert read.data == [1, 2, 3, 4]
+
+    run_simulation(dut, [testbench(), master.run()])
+
+``requester`` drives bare AR or AW requests, e.g. to load an arbiter.
+"""
+from collections import deque
+from migen.sim import passive
+from migen_axi.interconnect.axi import Burst, Response, burst_size
+
+
+__all__ = ["Transaction", "AxiMaster", "requester"]
+
+
+class Transaction:
+    """
+    Future of a queued read or write.
+
+    Attributes
+    ----------
+    done : bool
+        Set once the last R beat or the B response is through.
+    data : list of int
+        Data beats, filled by the R beats of reads.
+    resp : Response
+        B response of writes, the worst R response of reads.
+    issued, completed : int
+        Cycle the address is first valid and cycle of the completion.
+    """
+    def __init__(self, id_, addr, len_, size, burst, data=None, strb=None):
+        self.id = id_
+        self.addr = addr
+        self.len = len_
+        self.size = size
+        self.burst = burst
+        self.data = [] if data is None else data
+        self.strb = strb
+        self.resp = Response.okay
+        self.done = False
+        self.issued = None
+        self.completed = None
+
+    @property
+    def latency(self):
+        return self.completed - self.issued
+
+
+class AxiMaster:
+    """
+    Pipelined master driving an Interface.
+
+    ``write`` and ``read`` queue a transaction and return its
+    :class:`Transaction`, ``run`` is the passive generator driving the bus.
+    AW, W and AR are driven back-to-back, B and R are ready unless stalled
+    by e.g. ``stall_channels(bus, "r b")``.
+    Transactions with the same ID complete in order, the W beats of a write
+    are driven from its AW onwards.
+
+    Parameters
+    ----------
+    bus : Interface
+    max_outstanding : int, optional
+        Transactions in flight per direction.
+    """
+    def __init__(self, bus, max_outstanding=8):
+        self.bus = bus
+        self.max_outstanding = max_outstanding
+        self.cycle = 0
+        self._aw = deque()
+        self._ar = deque()
+        self._w = deque()
+        self._writes = {}
+        self._reads = {}
+        self._outstanding = dict(write=0, read=0)
+
+    def _transaction(self, addr, len_, id_, size, burst, **kwargs):
+        if not 0 <= len_ < 256:
+            raise ValueError("burst of {} beats".format(len_ + 1))
+        size = burst_size(self.bus.data_width // 8) if size is None else size
+        return Transaction(id_, addr, len_, size, burst, **kwargs)
+
+    def write(self, addr, data, strb=None, id_=0, size=None,
+              burst=Burst.incr):
+        """Queue a write of the beats ``data``, ``strb`` per beat."""
+        strb = [2**(self.bus.data_width // 8) - 1] * len(data) if (
+            strb is None) else strb
+        txn = self._transaction(
+            addr, len(data) - 1, id_, size, burst, data=list(data),
+            strb=list(strb))
+        self._aw.append(txn)
+        return txn
+
+    def read(self, addr, n, id_=0, size=None, burst=Burst.incr):
+        """Queue a read of ``n`` beats."""
+        txn = self._transaction(addr, n - 1, id_, size, burst)
+        self._ar.append(txn)
+        return txn
+
+    @property
+    def idle(self):
+        return not (self._aw or self._ar or self._w or
+                    any(self._outstanding.values()))
+
+    def wait(self, *txns):
+        """Generator waiting for ``txns``, for all queued if none given."""
+        while not (all(txn.done for txn in txns) if txns else self.idle):
+            yield
+
+    def _finish(self, txn, direction):
+        txn.done = True
+        txn.completed = self.cycle
+        self._outstanding[direction] -= 1
+
+    @passive
+    def run(self):
+        bus = self.bus
+        aw = ar = w = None
+        yield bus.b.ready.eq(1)
+        yield bus.r.ready.eq(1)
+        while True:
+            # handshakes of this cycle
+            if aw is not None and (yield bus.aw.ready):
+                aw = None
+            if ar is not None and (yield bus.ar.ready):
+                ar = None
+            if w is not None and (yield bus.w.ready):
+                w = None
+            if (yield bus.b.valid) and (yield bus.b.ready):
+                txn = self._writes[(yield bus.b.id)].popleft()
+                txn.resp = Response((yield bus.b.resp))
+                self._finish(txn, "write")
+            if (yield bus.r.valid) and (yield bus.r.ready):
+                txn = self._reads[(yield bus.r.id)][0]
+                txn.data.append((yield bus.r.data))
+                txn.resp = max(txn.resp, Response((yield bus.r.resp)))
+                if (yield bus.r.last):
+                    self._reads[txn.id].popleft()
+                    self._finish(txn, "read")
+
+            # drive the next beats
+            if aw is None and self._aw and (
+                    self._outstanding["write"] < self.max_outstanding):
+                aw = self._aw.popleft()
+                aw.issued = self.cycle + 1
+                self._outstanding["write"] += 1
+                self._writes.setdefault(aw.id, deque()).append(aw)
+                self._w.extend(
+                    (aw.id, data, strb, k == aw.len)
+                    for k, (data, strb) in enumerate(zip(aw.data, aw.strb)))
+                yield from self._drive_a(bus.aw, aw)
+            elif aw is None:
+                yield bus.aw.valid.eq(0)
+            if ar is None and self._ar and (
+                    self._outstanding["read"] < self.max_outstanding):
+                ar = self._ar.popleft()
+                ar.issued = self.cycle + 1
+                self._outstanding["read"] += 1
+                self._reads.setdefault(ar.id, deque()).append(ar)
+                yield from self._drive_a(bus.ar, ar)
+            elif ar is None:
+                yield bus.ar.valid.eq(0)
+            if w is None and self._w:
+                w = self._w.popleft()
+                id_, data, strb, last = w
+                yield bus.w.id.eq(id_)
+                yield bus.w.data.eq(data)
+                yield bus.w.strb.eq(strb)
+                yield bus.w.last.eq(last)
+                yield bus.w.valid.eq(1)
+            elif w is None:
+                yield bus.w.valid.eq(0)
+
+            self.cycle += 1
+            yield
+
+    @staticmethod
+    def _drive_a(ch, txn):
+        yield ch.id.eq(txn.id)
+        yield ch.addr.eq(txn.addr)
+        yield ch.len.eq(txn.len)
+        yield ch.size.eq(txn.size)
+        yield ch.burst.eq(txn.burst)
+        yield ch.valid.eq(1)
+
+
+def requester(ch, n, gap, qos, latency):
+    """
+    Generator issuing ``n`` requests w/ ``qos`` on the AR or AW channel
+    ``ch``, ``gap`` cycles apart. The cycles each request waited for ready
+    are appended to ``latency``.
+    """
+    for k in range(n):
+        yield ch.qos.eq(qos)
+        yield ch.addr.eq(k)
+        yield ch.valid.eq(1)
+        yield
+        wait = 0
+        while not (yield ch.ready):
+            wait += 1
+            yield
+        latency.append(wait)
+        yield ch.valid.eq(0)
+        for _ in range(gap):
+            yield
@@ -0,0 +1,201 @@
+"""
+AXI slave backed by a sparse memory for simulation.
+
+Stands in for a DDR controller: latency, backpressure and response order
+are configurable, only the pages touched are allocated::
+
+    memory = AxiMemory(bus, read_latency=20, stall=0.25, reorder=True)
+    memory.memory.write(0x1000, bytes(range(256)))
+    run_simulation(dut, [testbench(), memory.run()])
+"""
+import random
+from migen.sim import passive
+from migen_axi.interconnect.axi import Burst, Response
+
+
+__all__ = ["SparseMemory", "AxiMemory"]
+
+
+class SparseMemory:
+    """
+    Byte addressed memory of ``bytearray`` pages, zero when never written.
+
+    Parameters
+    ----------
+    page_size : int, optional
+        Bytes per page, a power of 2.
+    """
+    def __init__(self, page_size=4096):
+        self.page_size = page_size
+        self.pages = {}
+
+    def _chunks(self, addr, n):
+        # page, offset and length of the pieces of [addr, addr + n)
+        while n:
+            offset = addr % self.page_size
+            length = min(n, self.page_size - offset)
+            yield addr // self.page_size, offset, length
+            addr += length
+            n -= length
+
+    def read(self, addr, n):
+        data = bytearray()
+        for page, offset, length in self._chunks(addr, n):
+            if page in self.pages:
+                data += self.pages[page][offset:offset + length]
+            else:
+                data += bytes(length)
+        return bytes(data)
+
+    def write(self, addr, data, mask=None):
+        """Write ``data``, where given only the bytes set in ``mask``."""
+        k = 0
+        for page, offset, length in self._chunks(addr, len(data)):
+            buf = self.pages.setdefault(page, bytearray(self.page_size))
+            if mask is None:
+                buf[offset:offset + length] = data[k:k + length]
+            else:
+                for j in range(length):
+                    if mask >> (k + j) & 1:
+                        buf[offset + j] = data[k + j]
+            k += length
+
+
+def burst_addrs(addr, len_, size, burst):
+    """Addresses of the beats of a burst."""
+    nbytes = 2**size
+    if burst == Burst.fixed:
+        return [addr] * (len_ + 1)
+    aligned = addr // nbytes * nbytes
+    if burst == Burst.wrap:
+        boundary = nbytes * (len_ + 1)
+        lower = addr // boundary * boundary
+        return [lower + (aligned - lower + k * nbytes) % boundary
+                for k in range(len_ + 1)]
+    return [addr] + [aligned + k * nbytes for k in range(1, len_ + 1)]
+
+
+class AxiMemory:
+    """
+    Slave answering an Interface from a :class:`SparseMemory`.
+
+    Supports FIXED, INCR and WRAP bursts and write strobes. Beats carry the
+    bus wide word the beat address falls into, narrow transfers rely on
+    the strobes. ``run`` is the passive generator serving the bus.
+
+    Parameters
+    ----------
+    bus : Interface
+    read_latency : int, optional
+        Cycles from the AR handshake to the first R beat.
+    write_latency : int, optional
+        Cycles from the last W beat to the B response.
+    stall : float, optional
+        Probability of AW, W and AR ready being low in a cycle.
+    reorder : bool, optional
+        Serve due responses of different IDs in random order, responses
+        of an ID stay in order.
+    seed : int, optional
+        Seed of the backpressure and reordering.
+    memory : SparseMemory, optional
+    """
+    def __init__(self, bus, read_latency=1, write_latency=1, stall=0.,
+                 reorder=False, seed=0, memory=None):
+        self.bus = bus
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.stall = stall
+        self.reorder = reorder
+        self.prng = random.Random(seed)
+        self.memory = SparseMemory() if memory is None else memory
+        self.nbytes = bus.data_width // 8
+
+    def _word(self, addr):
+        aligned = addr // self.nbytes * self.nbytes
+        return int.from_bytes(self.memory.read(aligned, self.nbytes), "little")
+
+    def _write(self, addr, data, strb):
+        aligned = addr // self.nbytes * self.nbytes
+        self.memory.write(
+            aligned, data.to_bytes(self.nbytes, "little"), strb)
+
+    def _pick(self, due, cycle):
+        # oldest due response, any ID's oldest one when reordering
+        if not self.reorder:
+            return due.pop(0) if due and due[0][0] <= cycle else None
+        ids = set()
+        heads = []
+        for k, (when, id_, _) in enumerate(due):
+            if id_ not in ids and when <= cycle:
+                heads.append(k)
+            ids.add(id_)
+        return due.pop(self.prng.choice(heads)) if heads else None
+
+    def _ready(self):
+        return int(self.prng.random() >= self.stall)
+
+    @passive
+    def run(self):
+        bus = self.bus
+        cycle = 0
+        writes = []  # AW accepted, W beats pending: [id, addrs]
+        b_due = []  # (cycle, id, resp)
+        r_due = []  # (cycle, id, addrs)
+        b = r = None
+        r_data = None  # data of the R beat presented
+        aw_ready = w_ready = ar_ready = 0
+        while True:
+            # handshakes of this cycle
+            if aw_ready and (yield bus.aw.valid):
+                writes.append([(yield bus.aw.id), burst_addrs(
+                    (yield bus.aw.addr), (yield bus.aw.len),
+                    (yield bus.aw.size), (yield bus.aw.burst))])
+            if w_ready and (yield bus.w.valid):
+                id_ = (yield bus.w.id)
+                write = next(w for w in writes if w[0] == id_)
+                self._write(write[1].pop(0), (yield bus.w.data),
+                            (yield bus.w.strb))
+                if (yield bus.w.last):
+                    writes.remove(write)
+                    b_due.append((
+                        cycle + self.write_latency, id_, Response.okay))
+            if ar_ready and (yield bus.ar.valid):
+                r_due.append((
+                    cycle + self.read_latency, (yield bus.ar.id),
+                    burst_addrs(
+                        (yield bus.ar.addr), (yield bus.ar.len),
+                        (yield bus.ar.size), (yield bus.ar.burst))))
+            if b is not None and (yield bus.b.ready):
+                b = None
+            if r is not None and (yield bus.r.ready):
+                r[2].pop(0)
+                r_data = None
+                if not r[2]:
+                    r = None
+
+            # drive the next beats
+            aw_ready, ar_ready = self._ready(), self._ready()
+            w_ready = self._ready() if writes else 0
+            yield bus.aw.ready.eq(aw_ready)
+            yield bus.w.ready.eq(w_ready)
+            yield bus.ar.ready.eq(ar_ready)
+            if b is None:
+                b = self._pick(b_due, cycle + 1)
+                if b is not None:
+                    yield bus.b.id.eq(b[1])
+                    yield bus.b.resp.eq(b[2])
+            yield bus.b.valid.eq(int(b is not None))
+            if r is None:
+                r = self._pick(r_due, cycle + 1)
+            if r is not None:
+                yield bus.r.id.eq(r[1])
+                if r_data is None:
+                    # read once, writes don't change a beat presented
+                    r_data = self._word(r[2][0])
+                yield bus.r.data.eq(r_data)
+                yield bus.r.resp.eq(Response.okay)
+                yield bus.r.last.eq(len(r[2]) == 1)
+            yield bus.r.valid.eq(int(r is not None))
+
+            cycle += 1
+            yield
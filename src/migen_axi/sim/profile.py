@@ -0,0 +1,148 @@
+"""
+Profiled drop-in for ``migen.sim.run_simulation``.
+
+Reports the signals of the elaborated design, the cycles simulated per
+clock domain, the wall time of elaboration and simulation and per
+generator the cycles it was active in and the wall time spent in it::
+
+    profile = profile_simulation(dut, [testbench(), monitor()])
+    print(profile.report())
+"""
+from collections import namedtuple
+import time
+from migen.fhdl.tools import list_signals
+from migen.sim.core import Simulator
+
+
+__all__ = ["GeneratorProfile", "SimProfile", "profile_simulation"]
+
+
+GeneratorProfile = namedtuple(
+    "GeneratorProfile", "name domain cycles active_cycles seconds")
+
+
+class _GeneratorStats:
+    def __init__(self, name, domain):
+        self.name = name
+        self.domain = domain
+        self.cycles = 0
+        self.active_cycles = 0
+        self.seconds = 0.
+
+    def wrap(self, generator):
+        # forward the requests of generator, time it and count the cycles
+        # it issued requests in. Evaluating its requests is on its account.
+        reply = None
+        active = False
+        start = time.perf_counter()
+        while True:
+            try:
+                request = generator.send(reply)
+            except StopIteration:
+                self.seconds += time.perf_counter() - start
+                self.cycles += 1
+                self.active_cycles += active
+                return
+            if request is None:
+                self.seconds += time.perf_counter() - start
+                self.cycles += 1
+                self.active_cycles += active
+                active = False
+                reply = yield
+                start = time.perf_counter()
+            else:
+                active |= not isinstance(request, str)
+                reply = yield request
+
+    def freeze(self):
+        return GeneratorProfile(self.name, self.domain, self.cycles,
+                                self.active_cycles, self.seconds)
+
+
+class SimProfile:
+    """
+    Profile of a simulation.
+
+    Attributes
+    ----------
+    name : str
+        Class name of the design simulated.
+    signals : int
+        Signals of the elaborated design, memories lowered to arrays.
+    cycles : dict
+        Cycles simulated per clock domain.
+    elaborate_seconds, run_seconds : float
+    generators : list of GeneratorProfile
+    """
+    def __init__(self, name, signals, cycles, elaborate_seconds, run_seconds,
+                 generators):
+        self.name = name
+        self.signals = signals
+        self.cycles = cycles
+        self.elaborate_seconds = elaborate_seconds
+        self.run_seconds = run_seconds
+        self.generators = generators
+
+    @property
+    def cycles_per_second(self):
+        """Cycles of the fastest clock domain simulated per second."""
+        return max(self.cycles.values(), default=0) / max(
+            self.run_seconds, 1e-9)
+
+    def report(self):
+        lines = [
+            "{}: {} signals, {} cycles, {:.0f} cycles/s, elaborated in "
+            "{:.3f} s, simulated in {:.3f} s".format(
+                self.name, self.signals,
+                ", ".join("{} {}".format(n, cd)
+                          for cd, n in sorted(self.cycles.items())),
+                self.cycles_per_second, self.elaborate_seconds,
+                self.run_seconds),
+            "{:32} {:8} {:>10} {:>10} {:>9}".format(
+                "generator", "domain", "cycles", "active", "seconds"),
+        ]
+        for g in sorted(self.generators, key=lambda g: -g.seconds):
+            lines.append("{:32} {:8} {:10} {:10} {:9.3f}".format(
+                g.name[:32], g.domain, g.cycles, g.active_cycles,
+                g.seconds))
+        return "\n".join(lines)
+
+
+class _ProfilingSimulator(Simulator):
+    def __init__(self, fragment_or_module, generators, **kwargs):
+        if not isinstance(generators, dict):
+            generators = {"sys": generators}
+        self.stats = []
+        wrapped = dict()
+        for cd, gens in generators.items():
+            gens = [gens] if hasattr(gens, "send") else list(gens)
+            wrapped[cd] = []
+            for generator in gens:
+                stats = _GeneratorStats(
+                    getattr(generator, "__qualname__", repr(generator)), cd)
+                self.stats.append(stats)
+                wrapped[cd].append(stats.wrap(generator))
+        self.cycles = {cd: 0 for cd in generators}
+        super().__init__(fragment_or_module, wrapped, **kwargs)
+
+    def _process_generators(self, cd):
+        self.cycles[cd] += 1
+        super()._process_generators(cd)
+
+
+def profile_simulation(fragment_or_module, generators, **kwargs):
+    """
+    Run a simulation like ``run_simulation`` and return its
+    :class:`SimProfile`.
+    """
+    start = time.perf_counter()
+    sim = _ProfilingSimulator(fragment_or_module, generators, **kwargs)
+    signals = len(list_signals(sim.fragment) | set().union(
+        *sim.evaluator.replaced_memories.values()))
+    elaborated = time.perf_counter()
+    with sim:
+        sim.run()
+    return SimProfile(
+        type(fragment_or_module).__name__, signals, sim.cycles,
+        elaborated - start, time.perf_counter() - elaborated,
+        [stats.freeze() for stats in sim.stats])
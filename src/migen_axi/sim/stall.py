@@ -0,0 +1,79 @@
+"""
+Seeded stall injection for simulation.
+
+A :class:`Stall` is a reproducible 0/1 pattern, stalls start with a given
+probability and last 1 to ``max_stall`` cycles. The generators drive the
+``ready`` of AXI channels and the ``ack`` of stream endpoints with it::
+
+    run_simulation(dut, [testbench()] + stall_channels(
+        dut.bus, "r b", seed=3, probability=0.2, max_stall=8))
+"""
+import random
+from migen.sim import passive
+
+
+__all__ = ["Stall", "stall_ready", "stall_channels", "stall_endpoint"]
+
+
+class Stall:
+    """
+    Endless pattern of cycles, 1 to transfer and 0 to stall.
+
+    Parameters
+    ----------
+    seed : int, optional
+    probability : float, optional
+        Probability of a stall starting in a cycle.
+    max_stall : int, optional
+        Longest stall, the length of each is uniform in 1..max_stall.
+    """
+    def __init__(self, seed=0, probability=0.25, max_stall=1):
+        if not 0 <= probability < 1:
+            raise ValueError("probability shall be in [0, 1)")
+        if max_stall < 1:
+            raise ValueError("max_stall shall be ge 1")
+        self.seed = seed
+        self.probability = probability
+        self.max_stall = max_stall
+        self._pattern = iter(self)
+
+    def __iter__(self):
+        prng = random.Random(self.seed)
+        while True:
+            if prng.random() < self.probability:
+                for _ in range(prng.randint(1, self.max_stall)):
+                    yield 0
+            yield 1
+
+    def __repr__(self):
+        return "Stall(seed={}, probability={}, max_stall={})".format(
+            self.seed, self.probability, self.max_stall)
+
+    def wait(self):
+        """
+        Generator stalling a source, ``yield from stall.wait()`` before
+        asserting valid. Successive calls continue the pattern.
+        """
+        while not next(self._pattern):
+            yield
+
+
+@passive
+def stall_ready(ready, stall):
+    for value in stall:
+        yield ready.eq(value)
+        yield
+
+
+def stall_channels(bus, channels="aw w ar r b", seed=0, **kwargs):
+    """
+    Generators stalling the ``ready`` of ``channels`` of ``bus``, the
+    channel k is seeded w/ ``seed + k``.
+    """
+    return [stall_ready(getattr(bus, name).ready, Stall(seed + k, **kwargs))
+            for k, name in enumerate(channels.split())]
+
+
+def stall_endpoint(ep, seed=0, **kwargs):
+    """Generator stalling the ``ack`` of a stream endpoint."""
+    return stall_ready(ep.ack, Stall(seed, **kwargs))
@@ -0,0 +1,141 @@
+"""
+Transaction level trace of an AXI interface in simulation.
+
+The recorder logs every completed handshake as a fixed size little-endian
+record, a fraction of the size of a VCD and fast to write::
+
+    with TraceRecorder(bus, "dma.trace") as recorder:
+        run_simulation(dut, [testbench(), recorder.monitor()])
+    events = load_trace("dma.trace")
+"""
+from collections import namedtuple
+import struct
+from migen.sim import passive
+
+
+__all__ = ["TraceEvent", "TraceRecorder", "iter_trace", "load_trace"]
+
+
+MAGIC = b"AXTR"
+VERSION = 1
+CHANNELS = ("ar", "aw", "w", "r", "b")
+
+_header = struct.Struct("<4sBBBx")
+
+TraceEvent = namedtuple(
+    "TraceEvent",
+    "cycle channel id addr len size burst data strb resp last")
+
+
+def _record(value_bytes, strb_bytes):
+    # cycle, channel, len, size, burst, resp, last, id, addr/data, strb
+    return struct.Struct("<QBBBBBBI{}s{}s".format(value_bytes, strb_bytes))
+
+
+class TraceRecorder:
+    """
+    Record the handshakes of an Interface to a binary log.
+
+    Parameters
+    ----------
+    bus : Interface
+    path : str
+        Log file, truncated when opened.
+    buffer_size : int, optional
+        Bytes buffered before they are written out.
+    """
+    def __init__(self, bus, path, buffer_size=1 << 16):
+        self.bus = bus
+        self.path = path
+        self.buffer_size = buffer_size
+        self.value_bytes = (max(bus.data_width, len(bus.ar.addr)) + 7) // 8
+        self.strb_bytes = (bus.data_width // 8 + 7) // 8
+        self._record = _record(self.value_bytes, self.strb_bytes)
+        self._buffer = bytearray()
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(_header.pack(
+            MAGIC, VERSION, self.value_bytes, self.strb_bytes))
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def _append(self, cycle, channel, id_=0, value=0, len_=0, size=0,
+                burst=0, strb=0, resp=0, last=0):
+        self._buffer += self._record.pack(
+            cycle, channel, len_, size, burst, resp, last, id_,
+            value.to_bytes(self.value_bytes, "little"),
+            strb.to_bytes(self.strb_bytes, "little"))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    @passive
+    def monitor(self):
+        """Passive generator recording the handshakes, one per channel."""
+        bus = self.bus
+        cycle = 0
+        while True:
+            for channel, name in enumerate(CHANNELS):
+                ch = getattr(bus, name)
+                if not ((yield ch.valid) and (yield ch.ready)):
+                    continue
+                id_ = (yield ch.id)
+                if name in ("ar", "aw"):
+                    self._append(
+                        cycle, channel, id_, (yield ch.addr),
+                        len_=(yield ch.len), size=(yield ch.size),
+                        burst=(yield ch.burst))
+                elif name == "w":
+                    self._append(
+                        cycle, channel, id_, (yield ch.data),
+                        strb=(yield ch.strb), last=(yield ch.last))
+                elif name == "r":
+                    self._append(
+                        cycle, channel, id_, (yield ch.data),
+                        resp=(yield ch.resp), last=(yield ch.last))
+                else:
+                    self._append(cycle, channel, id_, resp=(yield ch.resp))
+            cycle += 1
+            yield
+
+
+def iter_trace(path):
+    """Iterate the TraceEvent of a log written by TraceRecorder."""
+    with open(path, "rb") as f:
+        magic, version, value_bytes, strb_bytes = _header.unpack(
+            f.read(_header.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a trace log".format(path))
+        record = _record(value_bytes, strb_bytes)
+        while True:
+            chunk = f.read(record.size * 4096)
+            if not chunk:
+                break
+            for (cycle, channel, len_, size, burst, resp, last, id_, value,
+                 strb) in record.iter_unpack(chunk):
+                name = CHANNELS[channel]
+                value = int.from_bytes(value, "little")
+                addr, data = (value, 0) if name in ("ar", "aw") else (
+                    0, value)
+                yield TraceEvent(
+                    cycle, name, id_, addr, len_, size, burst, data,
+                    int.from_bytes(strb, "little"), resp, last)
+
+
+def load_trace(path):
+    """Load all TraceEvent of a log written by TraceRecorder."""
+    return list(iter_trace(path))
@@ -1,12 +1,17 @@
+from collections import defaultdict
 from operator import attrgetter
+import random
 import types
 from toolz.curried import *  # noqa
 from migen import *  # noqa
-from migen.sim import run_simulation
+from migen.sim import run_simulation, passive
 from misoc.interconnect import csr_bus
 import pytest
 from migen_axi.interconnect import *  # noqa
 from migen_axi.interconnect import dmac_bus, stream2axi, sram
+from migen_axi.sim import (
+    AxiMaster, AxiMemory, ProtocolChecker, requester, stall_channels)
+from migen_axi.sim.memory import burst_addrs
 from .common import write_ack, wait_stb, ack, csr_w_mon, file_tmp_folder
 
 
@@ -23,6 +28,9 @@ attrgetter_aw = attrgetter("addr", "len", "burst")
 attrgetter_ar = attrgetter("addr", "len", "burst")
 
 okay = Response.okay
+exokay = Response.exokay
+slverr = Response.slverr
+decerr = Response.decerr
 
 
 @pytest.mark.parametrize(
@@ -325,6 +333,216 @@ def test_sram():
                    vcd_name=file_tmp_folder("test_sram.vcd"))
 
 
+@pytest.mark.parametrize("data_width", [32, 64])
+@pytest.mark.parametrize("burst, addr, len_", [
+    (Burst.incr, 0x40, 7),
+    (Burst.incr, 0x48, 15),
+    (Burst.wrap, 0x58, 3),
+    (Burst.wrap, 0x50, 15),
+    (Burst.fixed, 0x60, 3),
+])
+def test_sram_burst(data_width, burst, addr, len_):
+    bus = axi.Interface(data_width=data_width)
+    dut = sram.SRAM(0x400, bus=bus)
+    master = AxiMaster(bus)
+    nbytes = data_width // 8
+    prng = random.Random(len_)
+    fill = [prng.getrandbits(data_width) for _ in range(0x400 // nbytes)]
+    data = [prng.getrandbits(data_width) for _ in range(len_ + 1)]
+    expected = list(fill)
+    for beat_addr, value in zip(
+            burst_addrs(addr, len_, log2_int(nbytes), burst), data):
+        expected[beat_addr // nbytes] = value
+    r_beats = []
+
+    def testbench_sram_burst():
+        # fill w/ INCR bursts, write and read back the burst under test
+        for k in range(0, len(fill), 16):
+            master.write(k * nbytes, fill[k:k + 16])
+        yield from master.wait()
+        yield from master.wait(master.write(addr, data, burst=burst))
+        read = master.read(addr, len_ + 1, burst=burst)
+        yield from master.wait(read)
+        assert read.data == [expected[beat_addr // nbytes] for beat_addr in
+                             burst_addrs(addr, len_, log2_int(nbytes), burst)]
+        for k in range(0, len(fill), 16):
+            master.read(k * nbytes, 16)
+        yield from master.wait()
+
+    @passive
+    def r_monitor():
+        cycle = 0
+        while True:
+            if (yield bus.r.valid) and (yield bus.r.ready):
+                r_beats.append((cycle, (yield bus.r.data)))
+            cycle += 1
+            yield
+
+    run_simulation(dut, [
+        testbench_sram_burst(), master.run(), r_monitor(),
+        ProtocolChecker(bus).monitor()])
+    assert [data for _, data in r_beats[len_ + 1:]] == expected
+    # bursts stream one beat per cycle
+    cycles = [cycle for cycle, _ in r_beats[len_ + 1:len_ + 17]]
+    assert cycles == list(range(cycles[0], cycles[0] + 16))
+
+
+@pytest.mark.parametrize("pipeline_read", [False, True])
+@pytest.mark.parametrize("stall", [False, True])
+def test_sram_back_to_back(stall, pipeline_read):
+    bus = axi.Interface()
+    dut = sram.SRAM(0x400, bus=bus, pipeline_read=pipeline_read)
+    master = AxiMaster(bus)
+    prng = random.Random(22)
+    fill = [prng.getrandbits(32) for _ in range(0x100)]
+    reads = []
+    r_cycles = []
+
+    def testbench_sram_back_to_back():
+        for k in range(0, len(fill), 16):
+            master.write(k * 4, fill[k:k + 16])
+        yield from master.wait()
+        # single beat reads, w/ IDs changing, and short bursts in between
+        for k in range(64):
+            addr = prng.randrange(0, 0x400, 4)
+            n = 1 if k % 8 else 3
+            n = min(n, (0x400 - addr) // 4)
+            reads.append((addr, master.read(addr, n, id_=k % 4)))
+        yield from master.wait()
+
+    @passive
+    def r_monitor():
+        cycle = 0
+        while True:
+            if (yield bus.r.valid) and (yield bus.r.ready):
+                r_cycles.append(cycle)
+            cycle += 1
+            yield
+
+    generators = [testbench_sram_back_to_back(), master.run(), r_monitor(),
+                  ProtocolChecker(bus).monitor()]
+    if stall:
+        generators += stall_channels(
+            bus, "r", seed=3, probability=0.3, max_stall=4)
+    run_simulation(dut, generators)
+    for addr, read in reads:
+        assert read.data == fill[addr // 4:addr // 4 + len(read.data)]
+    if not stall:
+        # reads stream one beat per cycle
+        cycles = r_cycles[len(fill) // 16:]
+        assert cycles == list(range(cycles[0], cycles[0] + len(cycles)))
+
+
+@pytest.mark.parametrize("pipeline_read", [False, True])
+def test_sram_dual_port(pipeline_read):
+    bus = axi.Interface()
+    dut = sram.SRAM(0x400, bus=bus, dual_port=True,
+                    pipeline_read=pipeline_read)
+    master = AxiMaster(bus)
+    prng = random.Random(23)
+    fill = [prng.getrandbits(32) for _ in range(0x100)]
+    data = [prng.getrandbits(32) for _ in range(0x80)]
+    beats = dict(r=[], w=[])
+
+    def testbench_sram_dual_port():
+        for k in range(0, len(fill), 16):
+            master.write(k * 4, fill[k:k + 16])
+        yield from master.wait()
+        # reads of the words written a cycle ahead get the new bytes
+        write = master.write(0x20, data[:4], strb=[0b0101] * 4)
+        yield
+        read = master.read(0x20, 4)
+        yield from master.wait(write, read)
+        mask = 0x00ff00ff
+        fill[8:12] = [(old & ~mask) | (new & mask)
+                      for old, new in zip(fill[8:12], data[:4])]
+        assert read.data == fill[8:12]
+        # reads of the lower half while the upper half is written
+        start = len(beats["w"])
+        writes = [master.write(0x200 + k * 4, data[k:k + 16])
+                  for k in range(0, len(data), 16)]
+        reads = [master.read(k * 4, 16) for k in range(0, 0x80, 16)]
+        yield from master.wait(*writes, *reads)
+        assert [d for read in reads for d in read.data] == fill[:0x80]
+        reads = [master.read(0x200 + k * 4, 16)
+                 for k in range(0, len(data), 16)]
+        yield from master.wait(*reads)
+        assert [d for read in reads for d in read.data] == data
+        # both directions move a beat in most cycles
+        both = set(beats["r"]) & set(beats["w"][start:])
+        assert len(both) > 0x60
+
+    @passive
+    def monitor():
+        cycle = 0
+        while True:
+            for name in beats:
+                ch = getattr(bus, name)
+                if (yield ch.valid) and (yield ch.ready):
+                    beats[name].append(cycle)
+            cycle += 1
+            yield
+
+    run_simulation(dut, [
+        testbench_sram_dual_port(), master.run(), monitor(),
+        ProtocolChecker(bus).monitor()])
+
+
+@pytest.mark.parametrize("nbanks, nmasters, pipeline_read", [
+    (1, 1, False), (4, 2, False), (8, 3, False), (4, 2, True)])
+def test_banked_sram(nbanks, nmasters, pipeline_read):
+    prng = random.Random(nbanks * nmasters)
+    init = [prng.getrandbits(32) for _ in range(0x100)]
+    dut = sram.BankedSRAM(0x400, nbanks=nbanks, nmasters=nmasters,
+                          init=init, pipeline_read=pipeline_read)
+    masters = [AxiMaster(bus) for bus in dut.buses]
+    expected = list(init)
+    r_beats = [[] for _ in masters]
+
+    def testbench_banked_sram():
+        # each master reads the initial content then overwrites its own
+        # region w/ bursts, reads back all regions when done
+        nwords = len(init) // nmasters // 16 * 16
+        reads = [[m.read(k * 4, 16) for k in range(0, len(init), 16)]
+                 for m in masters]
+        yield from masters[0].wait(*sum(reads, []))
+        for txns in reads:
+            assert [d for txn in txns for d in txn.data] == init
+        r_beats_start = [len(beats) for beats in r_beats]
+
+        writes = []
+        for j, m in enumerate(masters):
+            for k in range(j * nwords, (j + 1) * nwords, 16):
+                data = [prng.getrandbits(32) for _ in range(16)]
+                expected[k:k + 16] = data
+                writes.append(m.write(k * 4, data, id_=j))
+        yield from masters[0].wait(*writes)
+        reads = [[m.read(k * 4, 16) for k in range(0, len(init), 16)]
+                 for m in masters]
+        yield from masters[0].wait(*sum(reads, []))
+        for txns in reads:
+            assert [d for txn in txns for d in txn.data] == expected
+        # masters reading concurrently stream in parallel
+        if nmasters > 1 and nbanks >= nmasters:
+            both = set.intersection(*[set(beats[start:]) for beats, start
+                                      in zip(r_beats, r_beats_start)])
+            assert len(both) > len(init) * 3 // 4
+
+    @passive
+    def r_monitor(bus, beats):
+        cycle = 0
+        while True:
+            if (yield bus.r.valid) and (yield bus.r.ready):
+                beats.append(cycle)
+            cycle += 1
+            yield
+
+    run_simulation(dut, [testbench_banked_sram()] + [
+        m.run() for m in masters] + [
+        r_monitor(bus, beats) for bus, beats in zip(dut.buses, r_beats)] + [
+        ProtocolChecker(bus).monitor() for bus in dut.buses])
+
+
 def test_read_requester():
     bus = dmac_bus.Interface()
     dut = stream2axi._ReadRequester(bus)
@@ -788,3 +1006,1191 @@ def test_incr():
     run_simulation(
         dut, testbench_incr(),
         vcd_name=file_tmp_folder("test_incr.vcd"))
+
+
+def drive(ch, payloads):
+    # one beat per cycle, valid held as long as there is data to send
+    for payload in payloads:
+        for name, value in payload.items():
+            yield getattr(ch, name).eq(value)
+        yield ch.valid.eq(1)
+        yield
+        while (yield ch.ready) == 0:
+            yield
+    yield ch.valid.eq(0)
+
+
+@passive
+def monitor(ch, log, names):
+    # record (cycle, payload) of every handshake, keep ready high
+    yield ch.ready.eq(1)
+    cycle = 0
+    while True:
+        if (yield ch.valid) & (yield ch.ready):
+            payload = []
+            for name in names:
+                payload.append((yield getattr(ch, name)))
+            log.append((cycle, tuple(payload)))
+        cycle += 1
+        yield
+
+
+@passive
+def respond(ch, requests, data=False):
+    # answer the logged (id, addr) requests in order, single beat each
+    idx = 0
+    while True:
+        if idx == len(requests):
+            yield
+            continue
+        _, (id_, addr) = requests[idx]
+        idx += 1
+        yield ch.id.eq(id_)
+        if data:
+            yield ch.data.eq(addr)
+            yield ch.last.eq(1)
+        yield from axi.write_ack(ch)
+
+
+def test_interconnect_shared():
+    m = [axi.Interface(), axi.Interface()]
+    s = axi.Interface(id_width=13)
+    dut = InterconnectShared(m, s)
+    n = 8
+    s_ar, s_aw, s_w = [], [], []
+    m_r = [[], []]
+    m_b = [[], []]
+
+    def testbench_interconnect_shared():
+        for i, master in enumerate(m):
+            # back-to-back requests, both masters compete
+            yield drive(master.ar, [
+                dict(id=k, addr=(i << 8) | (k << 2)) for k in range(n)])
+            yield drive(master.aw, [
+                dict(id=k, addr=(i << 8) | (k << 2), len=1)
+                for k in range(n)])
+            yield drive(master.w, [
+                dict(data=(i << 8) | k, last=k & 1) for k in range(2 * n)])
+            yield monitor(master.r, m_r[i], ["id", "data"])
+            yield monitor(master.b, m_b[i], ["id"])
+        yield monitor(s.ar, s_ar, ["id", "addr"])
+        yield monitor(s.aw, s_aw, ["id", "addr"])
+        yield monitor(s.w, s_w, ["id", "data", "last"])
+        yield respond(s.r, s_ar, data=True)
+        yield respond(s.b, s_aw)
+
+    def wait_responses():
+        while len(m_r[0] + m_r[1] + m_b[0] + m_b[1]) < 4 * n:
+            yield
+
+    run_simulation(
+        dut, list(testbench_interconnect_shared()) + [wait_responses()],
+        vcd_name=file_tmp_folder("test_interconnect_shared.vcd"))
+    # AR and W of both masters reach the slave at one per cycle
+    for log, beats in [(s_ar, 2 * n), (s_w, 4 * n)]:
+        assert len(log) == beats
+        assert log[-1][0] - log[0][0] == beats - 1
+    # W bursts are forwarded in AW order
+    assert [data >> 8 for _, (_, data, last) in s_w if last] == [
+        addr >> 8 for _, (_, addr) in s_aw]
+    # responses are routed to the originating master w/ its own ID
+    for i in range(2):
+        assert [payload for _, payload in m_r[i]] == [
+            (k, (i << 8) | (k << 2)) for k in range(n)]
+        assert [id_ for _, (id_, ) in m_b[i]] == list(range(n))
+
+
+def test_interconnect_shared_ids():
+    # the full master IDs make it to the slave and back
+    m = [axi.Interface(), axi.Interface()]
+    with pytest.raises(ValueError):
+        InterconnectShared(m, axi.Interface())
+    s = axi.Interface(id_width=13)
+    dut = InterconnectShared(m, s)
+    masters = [AxiMaster(bus) for bus in m]
+    memory = AxiMemory(s, reorder=True)
+    s_ar = []
+    ids = [0x800 | (k << 4) for k in range(4)] + [0xfff]
+
+    def testbench_interconnect_shared_ids():
+        writes = [master.write((i << 8) | (k << 4), [(i << 12) | id_],
+                               id_=id_)
+                  for i, master in enumerate(masters)
+                  for k, id_ in enumerate(ids)]
+        yield from masters[0].wait(*writes)
+        reads = [master.read((i << 8) | (k << 4), 1, id_=id_)
+                 for i, master in enumerate(masters)
+                 for k, id_ in enumerate(ids)]
+        yield from masters[0].wait(*reads)
+        assert [read.data for read in reads] == [
+            write.data for write in writes]
+
+    @passive
+    def ar_monitor():
+        while True:
+            if (yield s.ar.valid) and (yield s.ar.ready):
+                s_ar.append((yield s.ar.id))
+            yield
+
+    run_simulation(dut, [
+        testbench_interconnect_shared_ids(), memory.run(), ar_monitor()] +
+        [master.run() for master in masters])
+    assert sorted(s_ar) == sorted(
+        (i << 12) | id_ for i in range(2) for id_ in ids)
+
+
+def burst_slave(bus, latency=0):
+    # full-rate in-order slave, R data is the address of the beat, the
+    # first beat follows the request after latency cycles (pipelined)
+    ar_queue, aw_queue, w_done = [], [], []
+    now = [0]
+    step = bus.data_width // 8
+
+    @passive
+    def accept(ch, queue):
+        yield ch.ready.eq(1)
+        while True:
+            if (yield ch.valid):
+                queue.append((now[0], (yield ch.id), (yield ch.addr),
+                              (yield ch.len)))
+            if ch is bus.ar:
+                now[0] += 1
+            yield
+
+    @passive
+    def w_channel():
+        yield bus.w.ready.eq(1)
+        while True:
+            if (yield bus.w.valid) & (yield bus.w.last):
+                w_done.append(True)
+            yield
+
+    @passive
+    def r_channel():
+        while True:
+            if not ar_queue or now[0] <= ar_queue[0][0] + latency:
+                yield
+                continue
+            _, id_, addr, len_ = ar_queue.pop(0)
+            for k in range(len_ + 1):
+                yield bus.r.id.eq(id_)
+                yield bus.r.data.eq(addr + k * step)
+                yield bus.r.last.eq(k == len_)
+                yield from axi.write_ack(bus.r)
+
+    @passive
+    def b_channel():
+        while True:
+            if not (aw_queue and w_done):
+                yield
+                continue
+            _, id_, *_ = aw_queue.pop(0)
+            w_done.pop(0)
+            yield bus.b.id.eq(id_)
+            yield from axi.write_ack(bus.b)
+
+    return [accept(bus.ar, ar_queue), accept(bus.aw, aw_queue),
+            w_channel(), r_channel(), b_channel()]
+
+
+def test_crossbar():
+    mem_map = [0x10000000, 0x20000000]
+    m = [axi.Interface(), axi.Interface()]
+    s = [axi.Interface(id_width=13), axi.Interface(id_width=13)]
+    dut = Crossbar(
+        m, [(mem_decoder(addr), i) for addr, i in zip(mem_map, s)])
+    n, len_ = 4, 8
+    m_r = [[], []]
+    m_b = [[], []]
+
+    def requests(j, id_):
+        return [dict(id=id_, addr=mem_map[j] + k * len_ * 4, len=len_ - 1)
+                for k in range(n)]
+
+    def testbench_crossbar():
+        for i, master in enumerate(m):
+            # m_0 -> s_0, m_1 -> s_1 concurrently, then crossed
+            yield drive(master.ar, requests(i, 1) + requests(1 - i, 2))
+            yield drive(master.aw, requests(1 - i, 3))
+            yield drive(master.w, [dict(data=k, last=k % len_ == len_ - 1)
+                                   for k in range(n * len_)])
+            yield monitor(master.r, m_r[i], ["id", "data", "last"])
+            yield monitor(master.b, m_b[i], ["id"])
+        for slave in s:
+            yield from burst_slave(slave)
+
+    def wait_responses():
+        while len(m_r[0] + m_r[1]) < 4 * n * len_ or \
+                len(m_b[0] + m_b[1]) < 2 * n:
+            yield
+
+    run_simulation(
+        dut, list(testbench_crossbar()) + [wait_responses()],
+        vcd_name=file_tmp_folder("test_crossbar.vcd"))
+    for i in range(2):
+        assert [payload for _, payload in m_r[i]] == [
+            (id_, mem_map[j] + k * 4, k % len_ == len_ - 1)
+            for id_, j in [(1, i), (2, 1 - i)] for k in range(n * len_)]
+        assert [id_ for _, (id_, ) in m_b[i]] == [3] * n
+    # both master/slave pairs stream concurrently
+    beats = [cycle for log in m_r for cycle, _ in log[:n * len_]]
+    assert len(beats) / (max(beats) - min(beats) + 1) > 1.8
+
+
+def test_crossbar_ids():
+    # full width master IDs are routed back through the crossbar
+    mem_map = [0x10000000, 0x20000000]
+    m = [axi.Interface(), axi.Interface()]
+    with pytest.raises(ValueError):
+        Crossbar(m, [(mem_decoder(addr), axi.Interface())
+                     for addr in mem_map])
+    s = [axi.Interface(id_width=13), axi.Interface(id_width=13)]
+    dut = Crossbar(
+        m, [(mem_decoder(addr), i) for addr, i in zip(mem_map, s)])
+    masters = [AxiMaster(bus) for bus in m]
+    memories = [AxiMemory(bus, reorder=True, seed=k)
+                for k, bus in enumerate(s)]
+    ids = [0xfff, 0x800, 0x001]
+
+    def testbench_crossbar_ids():
+        for j, base in enumerate(mem_map):
+            writes = [master.write(base + (i << 8) + (k << 4),
+                                   [(j << 16) | (i << 12) | id_], id_=id_)
+                      for i, master in enumerate(masters)
+                      for k, id_ in enumerate(ids)]
+            for master in masters:
+                yield from master.wait()
+            reads = [master.read(base + (i << 8) + (k << 4), 1, id_=id_)
+                     for i, master in enumerate(masters)
+                     for k, id_ in enumerate(ids)]
+            for master in masters:
+                yield from master.wait()
+            assert [read.id for read in reads] == [
+                write.id for write in writes]
+            assert [read.data for read in reads] == [
+                write.data for write in writes]
+
+    run_simulation(dut, [testbench_crossbar_ids()] + [
+        master.run() for master in masters] + [
+        memory.run() for memory in memories])
+
+
+@pytest.mark.parametrize(
+    "len_, latency", [
+        (8, 0),  # bursts
+        (1, 3),  # single beats, latency hidden by pending transactions
+    ])
+def test_transaction_arbiter_throughput(len_, latency):
+    mem_map = [0x10000000, 0x20000000]
+    m = [axi.Interface(), axi.Interface()]
+    s = [axi.Interface(), axi.Interface()]
+    dut = axi.TransactionArbiter(
+        m, [(mem_decoder(addr), i) for addr, i in zip(mem_map, s)],
+        npending=8)
+    n = 32 // len_
+    m_r = [[], []]
+    m_b = [[], []]
+    s_w = [[], []]
+
+    def requests(j, id_):
+        return [dict(id=id_, addr=mem_map[j] + k * len_ * 4, len=len_ - 1)
+                for k in range(n)]
+
+    def testbench_transaction_arbiter_throughput():
+        for i, master in enumerate(m):
+            # m_0 -> s_0, m_1 -> s_1, then crossed
+            yield drive(master.ar, requests(i, 1) + requests(1 - i, 2))
+            yield drive(master.aw, requests(1 - i, 3) + requests(i, 4))
+            yield drive(master.w, [
+                dict(data=(i << 16) | k, last=k % len_ == len_ - 1)
+                for k in range(2 * n * len_)])
+            yield monitor(master.r, m_r[i], ["id", "data", "last"])
+            yield monitor(master.b, m_b[i], ["id"])
+        for j, slave in enumerate(s):
+            yield from burst_slave(slave, latency)
+            yield monitor(slave.w, s_w[j], ["data"])
+
+    def wait_responses():
+        while len(m_r[0] + m_r[1]) < 4 * n * len_ or \
+                len(m_b[0] + m_b[1]) < 4 * n:
+            yield
+
+    run_simulation(
+        dut, list(testbench_transaction_arbiter_throughput()) +
+        [wait_responses()],
+        vcd_name=file_tmp_folder("test_transaction_arbiter_throughput.vcd"))
+    for i in range(2):
+        assert [payload for _, payload in m_r[i]] == [
+            (id_, mem_map[j] + k * 4, k % len_ == len_ - 1)
+            for id_, j in [(1, i), (2, 1 - i)] for k in range(n * len_)]
+        assert [id_ for _, (id_, ) in m_b[i]] == [3] * n + [4] * n
+        # W bursts reach the addressed slave
+        assert sorted([data for _, (data, ) in s_w[i]]) == sorted(
+            [((1 - i) << 16) | k for k in range(n * len_)] +
+            [(i << 16) | k for k in range(n * len_, 2 * n * len_)])
+    # sustained beats per cycle of the concurrent phase
+    beats = [cycle for log in m_r for cycle, _ in log[:n * len_]]
+    assert len(beats) / (max(beats) - min(beats) + 1) > (
+        1.8 if len_ > 1 else 0.9)
+
+
+@passive
+def ready_pattern(ch, pattern):
+    # drive ready from a repeating 0/1 pattern
+    while True:
+        for ready in pattern:
+            yield ch.ready.eq(ready)
+            yield
+
+
+@pytest.mark.parametrize(
+    "pattern", [
+        [1],
+        [1, 1, 0, 1, 0, 0, 1],
+    ])
+def test_register_slice(pattern):
+    m = axi.Interface()
+    s = axi.Interface()
+    dut = RegisterSlice(m, s, channels="ar w r")
+    n = 16
+    s_ar, s_w, m_r, s_aw = [], [], [], []
+
+    def testbench_register_slice():
+        yield drive(m.ar, [dict(id=k, addr=k << 2) for k in range(n)])
+        yield drive(m.w, [dict(data=k, last=k & 1) for k in range(n)])
+        yield drive(s.r, [dict(id=k, data=k, last=1) for k in range(n)])
+        yield monitor(s.ar, s_ar, ["id", "addr"])
+        yield monitor(s.w, s_w, ["data", "last"])
+        yield monitor(m.r, m_r, ["id", "data"])
+        # not sliced, combinational
+        yield monitor(s.aw, s_aw, ["addr"])
+        yield drive(m.aw, [dict(addr=0x100)])
+        for ch in [s.ar, s.w, m.r]:
+            yield ready_pattern(ch, pattern)
+
+    def wait_beats():
+        while min(len(s_ar), len(s_w), len(m_r)) < n:
+            yield
+
+    run_simulation(
+        dut, list(testbench_register_slice()) + [wait_beats()],
+        vcd_name=file_tmp_folder("test_register_slice.vcd"))
+    assert [payload for _, payload in s_ar] == [
+        (k, k << 2) for k in range(n)]
+    assert [payload for _, payload in s_w] == [(k, k & 1) for k in range(n)]
+    assert [payload for _, payload in m_r] == [(k, k) for k in range(n)]
+    assert s_aw == [(1, (0x100, ))]
+    if pattern == [1]:
+        # full throughput, one cycle latency
+        for log in [s_ar, s_w, m_r]:
+            assert [cycle for cycle, _ in log] == list(range(2, n + 2))
+
+
+def burst_addresses(addr, len_, size, burst):
+    n = 1 << size
+    if burst == Burst.fixed:
+        return [addr] * (len_ + 1)
+    if burst == Burst.wrap:
+        total = n * (len_ + 1)
+        lower = addr & ~(total - 1)
+        return [lower + (addr - lower + k * n) % total
+                for k in range(len_ + 1)]
+    return [addr] + [(addr & ~(n - 1)) + k * n for k in range(1, len_ + 1)]
+
+
+def beat_bytes(addr, size):
+    n = 1 << size
+    return range(addr, (addr & ~(n - 1)) + n)
+
+
+def mem_slave(bus, mem, log):
+    # in-order byte addressed memory slave, full-rate data channels,
+    # log records the requests (name, len, size)
+    nb = bus.data_width // 8
+
+    @passive
+    def write():
+        while True:
+            aw = yield from bus.read_aw()
+            log.append(("aw", aw.len, aw.size))
+            yield bus.w.ready.eq(1)
+            for addr in burst_addresses(aw.addr, aw.len, aw.size, aw.burst):
+                while not ((yield bus.w.valid) & (yield bus.w.ready)):
+                    yield
+                data, strb = (yield bus.w.data), (yield bus.w.strb)
+                for b in beat_bytes(addr, aw.size):
+                    if strb & (1 << (b % nb)):
+                        mem[b] = (data >> (8 * (b % nb))) & 0xff
+                yield
+            yield bus.w.ready.eq(0)
+            yield from bus.write_b(aw.id)
+
+    @passive
+    def read():
+        while True:
+            ar = yield from bus.read_ar()
+            log.append(("ar", ar.len, ar.size))
+            addrs = burst_addresses(ar.addr, ar.len, ar.size, ar.burst)
+            for k, addr in enumerate(addrs):
+                yield bus.r.data.eq(sum(
+                    mem.get(b, 0) << (8 * (b % nb))
+                    for b in beat_bytes(addr, ar.size)))
+                yield bus.r.id.eq(ar.id)
+                yield bus.r.last.eq(k == len(addrs) - 1)
+                yield from axi.write_ack(bus.r)
+
+    return [write(), read()]
+
+
+@pytest.mark.parametrize(
+    "addr, len_, size, burst, wide_len, wide_size", [
+        (0x100, 7, 2, Burst.incr, 3, 3),
+        (0x104, 7, 2, Burst.incr, 4, 3),  # unaligned start
+        (0x106, 2, 2, Burst.incr, 1, 3),
+        (0x10c, 3, 2, Burst.fixed, 3, 2),
+        (0x101, 5, 0, Burst.incr, 5, 0),  # narrow beats
+    ])
+def test_upsizer(addr, len_, size, burst, wide_len, wide_size):
+    narrow = axi.Interface()
+    wide = axi.Interface(data_width=64)
+    dut = Upsizer(narrow, wide)
+    mem, log, r = dict(), [], []
+    n = 1 << size
+    addrs = burst_addresses(addr, len_, size, burst)
+    data = [0x11111111 * (k + 1) for k in range(len_ + 1)]
+
+    def lane_data(addr, value):
+        return value & (((1 << (8 * n)) - 1) << (8 * (addr % 4)))
+
+    def testbench_upsizer():
+        yield from mem_slave(wide, mem, log)
+        yield monitor(narrow.r, r, ["data", "last"])
+
+        def master():
+            yield from narrow.write_aw(1, addr, len_, size, burst)
+            yield from drive(narrow.w, [
+                dict(data=value, strb=0xf, last=k == len_)
+                for k, value in enumerate(data)])
+            yield from narrow.read_b()
+            yield from narrow.write_ar(2, addr, len_, size, burst)
+            while len(r) < len_ + 1:
+                yield
+
+        yield master()
+
+    run_simulation(
+        dut, list(testbench_upsizer()),
+        vcd_name=file_tmp_folder("test_upsizer.vcd"))
+    assert log == [("aw", wide_len, wide_size), ("ar", wide_len, wide_size)]
+    expected = dict()
+    for a, value in zip(addrs, data):
+        for b in beat_bytes(a, size):
+            expected[b] = (value >> (8 * (b % 4))) & 0xff
+    assert mem == expected
+    assert [lane_data(a, d) for a, (_, (d, _)) in zip(addrs, r)] == [
+        lane_data(a, sum(expected[b] << (8 * (b % 4))
+                         for b in beat_bytes(a, size))) for a in addrs]
+    assert [last for _, (_, last) in r] == [0] * len_ + [1]
+
+
+@pytest.mark.parametrize(
+    "addr, len_, size, burst, narrow_len, narrow_size", [
+        (0x100, 3, 3, Burst.incr, 7, 2),
+        (0x104, 1, 3, Burst.incr, 2, 2),  # unaligned start, lane skipped
+        (0x108, 0, 3, Burst.fixed, 1, 2),
+        (0x104, 3, 2, Burst.incr, 3, 2),  # narrow beats pass
+        (0x103, 2, 0, Burst.incr, 2, 0),
+    ])
+def test_downsizer(addr, len_, size, burst, narrow_len, narrow_size):
+    wide = axi.Interface(data_width=64)
+    narrow = axi.Interface()
+    dut = Downsizer(wide, narrow)
+    mem, log, r = dict(), [], []
+    addrs = burst_addresses(addr, len_, size, burst)
+    data = [0x1111111111111111 * (k + 1) for k in range(len_ + 1)]
+
+    def testbench_downsizer():
+        yield from mem_slave(narrow, mem, log)
+        yield monitor(wide.r, r, ["data", "last"])
+
+        def master():
+            yield from wide.write_aw(1, addr, len_, size, burst)
+            yield from drive(wide.w, [
+                dict(data=value, strb=0xff, last=k == len_)
+                for k, value in enumerate(data)])
+            yield from wide.read_b()
+            yield from wide.write_ar(2, addr, len_, size, burst)
+            while len(r) < len_ + 1:
+                yield
+
+        yield master()
+
+    run_simulation(
+        dut, list(testbench_downsizer()),
+        vcd_name=file_tmp_folder("test_downsizer.vcd"))
+    assert log == [
+        ("aw", narrow_len, narrow_size), ("ar", narrow_len, narrow_size)]
+    expected = dict()
+    for a, value in zip(addrs, data):
+        for b in beat_bytes(a, size):
+            expected[b] = (value >> (8 * (b % 8))) & 0xff
+    assert mem == expected
+    for a, (_, (value, last)) in zip(addrs, r):
+        for b in beat_bytes(a, size):
+            assert (value >> (8 * (b % 8))) & 0xff == expected[b]
+    assert [last for _, (_, last) in r] == [0] * len_ + [1]
+
+
+@pytest.mark.parametrize("burst", [Burst.fixed, Burst.wrap])
+def test_downsizer_reject(burst):
+    # wide multi-beat FIXED/WRAP bursts get SLVERR, the next burst passes
+    wide = axi.Interface(data_width=64)
+    narrow = axi.Interface()
+    dut = Downsizer(wide, narrow)
+    mem, log, r, b = dict(), [], [], []
+
+    def testbench_downsizer_reject():
+        yield from mem_slave(narrow, mem, log)
+        yield monitor(wide.r, r, ["id", "resp", "last"])
+        yield monitor(wide.b, b, ["id", "resp"])
+
+        def master():
+            yield from wide.write_aw(1, 0x100, 3, 3, burst)
+            yield from drive(wide.w, [
+                dict(data=k + 1, strb=0xff, last=k == 3) for k in range(4)])
+            yield from wide.write_aw(2, 0x100, 0, 3, Burst.incr)
+            yield from drive(wide.w, [dict(data=5, strb=0xff, last=1)])
+            yield from wide.write_ar(3, 0x100, 3, 3, burst)
+            yield from wide.write_ar(4, 0x100, 0, 3, Burst.incr)
+            while len(r) < 5 or len(b) < 2:
+                yield
+
+        yield master()
+
+    run_simulation(
+        dut, list(testbench_downsizer_reject()),
+        vcd_name=file_tmp_folder("test_downsizer_reject.vcd"))
+    assert log == [("aw", 1, 2), ("ar", 1, 2)]
+    assert mem == {k: 5 if k == 0x100 else 0 for k in range(0x100, 0x108)}
+    assert [payload for _, payload in b] == [(1, slverr), (2, okay)]
+    assert [payload for _, payload in r] == [(3, slverr, 0)] * 3 + [
+        (3, slverr, 1), (4, okay, 1)]
+
+
+@pytest.mark.parametrize("resps, resp", [
+    ([okay, exokay], okay),
+    ([exokay, exokay], exokay),
+    ([exokay, slverr], slverr),
+    ([decerr, exokay], decerr),
+])
+def test_downsizer_resp(resps, resp):
+    # a wide beat carries the worst response of its narrow beats
+    wide = axi.Interface(data_width=64)
+    narrow = axi.Interface()
+    dut = Downsizer(wide, narrow)
+    r = []
+
+    @passive
+    def narrow_slave():
+        yield from narrow.read_ar()
+        for k in range(4):
+            yield from narrow.write_r(1, k, resps[k % 2], last=k == 3)
+
+    def testbench_downsizer_resp():
+        yield from wide.write_ar(1, 0x100, 1, 3, Burst.incr)
+        while len(r) < 2:
+            yield
+
+    run_simulation(
+        dut, [testbench_downsizer_resp(), narrow_slave(),
+              monitor(wide.r, r, ["resp"])],
+        vcd_name=file_tmp_folder("test_downsizer_resp.vcd"))
+    assert [payload for _, payload in r] == [(resp,)] * 2
+
+
+def test_async_bridge():
+    m = axi.Interface()
+    s = axi.Interface()
+    dut = AsyncBridge(m, s, master_cd="m", slave_cd="s")
+    dut.clock_domains.cd_m = ClockDomain()
+    dut.clock_domains.cd_s = ClockDomain()
+    n = 64
+    s_ar, m_r = [], []
+
+    @passive
+    def respond():
+        # return the request address as R data, full rate
+        idx = 0
+        while True:
+            if idx == len(s_ar):
+                yield
+                continue
+            _, (id_, addr) = s_ar[idx]
+            idx += 1
+            yield from drive(s.r, [dict(id=id_, data=addr, last=1)])
+
+    def wait_responses():
+        while len(m_r) < n:
+            yield
+
+    run_simulation(
+        dut, {
+            "m": [drive(m.ar, [dict(id=k, addr=k << 2) for k in range(n)]),
+                  monitor(m.r, m_r, ["id", "data"]), wait_responses()],
+            "s": [monitor(s.ar, s_ar, ["id", "addr"]), respond()],
+        }, clocks={"m": 14, "s": 10},
+        vcd_name=file_tmp_folder("test_async_bridge.vcd"))
+    assert [payload for _, payload in s_ar] == [
+        (k, k << 2) for k in range(n)]
+    assert [payload for _, payload in m_r] == [
+        (k, k << 2) for k in range(n)]
+    # AR beats pass at the rate of the slower master clock
+    cycles = [cycle for cycle, _ in s_ar]
+    assert n / (cycles[-1] - cycles[0] + 1) > 0.9 * 10 / 14
+
+
+@pytest.mark.parametrize(
+    "addr, len_, size, burst, sub_lens", [
+        (0xfe0, 63, 2, Burst.incr, [7, 15, 15, 15, 7]),  # crosses 4 KB
+        (0x100, 3, 2, Burst.incr, [3]),
+        (0x104, 19, 2, Burst.fixed, [15, 3]),
+        (0xffe, 5, 0, Burst.incr, [1, 3]),
+        (0x1f0, 7, 2, Burst.wrap, [7]),
+    ])
+def test_burst_splitter(addr, len_, size, burst, sub_lens):
+    m = axi.Interface()
+    s = axi.Interface()
+    dut = BurstSplitter(m, s)
+    mem, log, r, b = dict(), [], [], []
+    addrs = burst_addresses(addr, len_, size, burst)
+    data = [0x01010101 * (k + 1) for k in range(len_ + 1)]
+
+    def testbench_burst_splitter():
+        yield from mem_slave(s, mem, log)
+        yield monitor(m.r, r, ["data", "last"])
+        yield monitor(m.b, b, ["id", "resp"])
+
+        def master():
+            yield from m.write_aw(1, addr, len_, size, burst)
+            yield from drive(m.w, [
+                dict(data=value, strb=0xf, last=k == len_)
+                for k, value in enumerate(data)])
+            while not b:
+                yield
+            yield from m.write_ar(2, addr, len_, size, burst)
+            while len(r) < len_ + 1:
+                yield
+
+        yield master()
+
+    run_simulation(
+        dut, list(testbench_burst_splitter()),
+        vcd_name=file_tmp_folder("test_burst_splitter.vcd"))
+    assert log == [("aw", n, size) for n in sub_lens] + [
+        ("ar", n, size) for n in sub_lens]
+    expected = dict()
+    for a, value in zip(addrs, data):
+        for k in beat_bytes(a, size):
+            expected[k] = (value >> (8 * (k % 4))) & 0xff
+    assert mem == expected
+    for a, (_, (value, last)) in zip(addrs, r):
+        for k in beat_bytes(a, size):
+            assert (value >> (8 * (k % 4))) & 0xff == expected[k]
+    assert [last for _, (_, last) in r] == [0] * len_ + [1]
+    assert [payload for _, payload in b] == [(1, okay)]
+
+
+@pytest.mark.parametrize("resps, resp", [
+    ([okay, exokay], okay),
+    ([exokay, exokay], exokay),
+    ([exokay, slverr], slverr),
+    ([decerr, exokay], decerr),
+])
+def test_burst_splitter_resp(resps, resp):
+    # the B of a split write is the worst B of its sub-bursts
+    m = axi.Interface()
+    s = axi.Interface()
+    dut = BurstSplitter(m, s)
+    b = []
+
+    @passive
+    def slave():
+        yield s.w.ready.eq(1)
+        for sub_resp in resps:
+            aw = yield from s.read_aw()
+            for _ in range(aw.len + 1):
+                while not (yield s.w.valid):
+                    yield
+                yield
+            yield from s.write_b(aw.id, sub_resp)
+
+    def testbench_burst_splitter_resp():
+        yield from m.write_aw(1, 0x100, 31, 2, Burst.incr)
+        yield from drive(m.w, [
+            dict(data=k, strb=0xf, last=k == 31) for k in range(32)])
+        while not b:
+            yield
+
+    run_simulation(
+        dut, [testbench_burst_splitter_resp(), slave(),
+              monitor(m.b, b, ["id", "resp"])],
+        vcd_name=file_tmp_folder("test_burst_splitter_resp.vcd"))
+    assert [payload for _, payload in b] == [(1, resp)]
+
+
+@pytest.mark.parametrize("weights", [None, [2, 1, 1, 1]])
+@pytest.mark.parametrize("stall", [0., 0.5])
+def test_qos_arbiter_latency(weights, stall):
+    masters = [axi.Interface() for _ in range(4)]
+    slave = axi.Interface(id_width=14)
+    dut = InterconnectShared(masters, slave, weights=weights)
+    latency = [[] for _ in masters]
+    s_ar = []
+
+    def testbench_qos_arbiter():
+        if stall:
+            # the granted AR shall hold while the slave stalls
+            yield AxiMemory(slave, stall=stall).run()
+            yield ProtocolChecker(slave).monitor()
+            for master in masters:
+                yield monitor(master.r, [], [])
+        else:
+            yield monitor(slave.ar, s_ar, ["id"])
+        yield requester(masters[0].ar, 16, 3, 15, latency[0])
+        for master, lat in zip(masters[1:], latency[1:]):
+            yield passive(requester)(master.ar, 1000, 0, 0, lat)
+
+    run_simulation(
+        dut, list(testbench_qos_arbiter()),
+        vcd_name=file_tmp_folder("test_qos_arbiter_latency.vcd"))
+    # bulk masters are not starved, get at least a share per weight
+    weight = 1 if weights is None else weights[0]
+    assert all(
+        len(lat) * weight >= len(latency[0]) for lat in latency[1:])
+    if stall:
+        return
+    if weights is None:
+        assert max(latency[0]) == 3
+    else:
+        # control master wins the next grant, bulk masters keep moving
+        assert max(latency[0]) == 1
+    # one AR per cycle while any master requests
+    assert s_ar[-1][0] - s_ar[0][0] + 1 == len(s_ar)
+
+
+@pytest.mark.parametrize("qos", [(0, 0), (0, 15)])
+def test_qos_arbiter_weights(qos):
+    dut = QosArbiter(2, [3, 1])
+    grants = []
+
+    def testbench_qos_arbiter():
+        yield dut.request.eq(0b11)
+        yield dut.ce.eq(1)
+        for q, value in zip(dut.qos, qos):
+            yield q.eq(value)
+        for _ in range(40):
+            yield
+            grants.append((yield dut.grant))
+
+    run_simulation(dut, testbench_qos_arbiter())
+    assert grants[4:].count(0) == 3 * grants[4:].count(1)
+
+
+def test_id_remapper_read():
+    m = axi.Interface()
+    s = axi.Interface(id_width=2)
+    dut = IdRemapper(m, s)
+    ids = [0x123, 0x456, 0x123, 0x789, 0xabc, 0xdef, 0x456]
+    requests = [dict(id=id_, addr=k << 4) for k, id_ in enumerate(ids)]
+    s_ar, m_r = [], []
+
+    @passive
+    def respond_out_of_order():
+        # newest first, in order per slave ID
+        answered = set()
+        while len(s_ar) < 5:
+            yield
+        while True:
+            pending = [(k, req) for k, (_, req) in enumerate(s_ar)
+                       if k not in answered]
+            if not pending:
+                yield
+                continue
+            heads = [(k, req) for k, req in pending if req[0] not in {
+                other[0] for j, other in pending if j < k}]
+            k, (id_, addr) = heads[-1]
+            answered.add(k)
+            yield from drive(s.r, [dict(id=id_, data=addr, last=1)])
+
+    def wait_responses():
+        while len(m_r) < len(ids):
+            yield
+
+    run_simulation(
+        dut, [drive(m.ar, requests), monitor(s.ar, s_ar, ["id", "addr"]),
+              respond_out_of_order(), monitor(m.r, m_r, ["id", "data"]),
+              wait_responses()],
+        vcd_name=file_tmp_folder("test_id_remapper_read.vcd"))
+    slave_id = {addr: id_ for _, (id_, addr) in s_ar}
+    # outstanding master IDs share a slave ID, 0xdef waits for a free one
+    assert [slave_id[k << 4] for k in range(5)] == [0, 1, 0, 2, 3]
+    assert s_ar[5][0] > m_r[0][0]
+    assert sorted(payload for _, payload in m_r) == sorted(
+        (req["id"], req["addr"]) for req in requests)
+    for id_ in set(ids):
+        assert [data for _, (i, data) in m_r if i == id_] == [
+            req["addr"] for req in requests if req["id"] == id_]
+
+
+def test_id_remapper_write():
+    m = axi.Interface()
+    s = axi.Interface(id_width=1)
+    dut = IdRemapper(m, s)
+    ids = [0x111, 0x222, 0x111, 0x333]
+    s_aw, s_w, m_b = [], [], []
+
+    def testbench_id_remapper():
+        yield drive(m.aw, [
+            dict(id=id_, addr=k << 4) for k, id_ in enumerate(ids)])
+        yield drive(m.w, [
+            dict(id=id_, data=k, last=1) for k, id_ in enumerate(ids)])
+        yield monitor(s.aw, s_aw, ["id", "addr"])
+        yield monitor(s.w, s_w, ["id", "data"])
+        yield respond(s.b, s_aw)
+        yield monitor(m.b, m_b, ["id"])
+
+        def wait_responses():
+            while len(m_b) < len(ids):
+                yield
+
+        yield wait_responses()
+
+    run_simulation(
+        dut, list(testbench_id_remapper()),
+        vcd_name=file_tmp_folder("test_id_remapper_write.vcd"))
+    slave_id = [id_ for _, (id_, _) in s_aw]
+    assert slave_id == [0, 1, 0, slave_id[3]]
+    assert [id_ for _, (id_, _) in s_w] == slave_id
+    assert [id_ for _, (id_,) in m_b] == ids
+
+
+@pytest.mark.parametrize("seed", [0, 1, 13])
+@pytest.mark.parametrize("nids", [None, 1])
+def test_id_remapper_stall(seed, nids):
+    # a stalling and reordering slave sees stable, protocol clean requests
+    m = axi.Interface()
+    s = axi.Interface(id_width=2)
+    dut = IdRemapper(m, s, nids=nids)
+    master = AxiMaster(m)
+    memory = AxiMemory(s, read_latency=3, stall=0.4, reorder=True, seed=seed)
+    prng = random.Random(seed)
+    ids = [0x123, 0x456, 0x789]
+    fill = [prng.getrandbits(32) for _ in range(0x40)]
+    memory.memory.write(0x1000, b"".join(
+        value.to_bytes(4, "little") for value in fill))
+    writes, reads = [], []
+
+    def testbench_id_remapper_stall():
+        for k in range(32):
+            data = [prng.getrandbits(32) for _ in range(prng.randint(1, 2))]
+            writes.append((k << 4, data, master.write(
+                k << 4, data, id_=prng.choice(ids))))
+            addr = prng.randrange(0x40 - 4) * 4
+            n = prng.randint(1, 4)
+            reads.append((addr, n, master.read(
+                0x1000 + addr, n, id_=prng.choice(ids))))
+        yield from master.wait()
+
+    run_simulation(
+        dut, [testbench_id_remapper_stall(), master.run(), memory.run(),
+              ProtocolChecker(s).monitor(), ProtocolChecker(m).monitor()],
+        vcd_name=file_tmp_folder("test_id_remapper_stall.vcd"))
+    for addr, n, read in reads:
+        assert read.data == fill[addr // 4:addr // 4 + n]
+    for addr, data, _ in writes:
+        assert memory.memory.read(addr, 4 * len(data)) == b"".join(
+            value.to_bytes(4, "little") for value in data)
+
+
+def test_axi_perf_monitor():
+    bus = axi.Interface()
+    dut = AxiPerfMonitor(bus)
+    channels = ["ar", "aw", "w", "r", "b"]
+    n = 64
+    prng = random.Random(7)
+    pattern = {ch: [(prng.randrange(2), prng.randrange(2)) for _ in range(n)]
+               for ch in channels}
+    counts = []
+
+    def control(value):
+        yield dut._control.r.eq(value)
+        yield dut._control.re.eq(1)
+        yield
+        yield dut._control.re.eq(0)
+        yield
+
+    def read_counters():
+        values = dict()
+        for name in ["cycles", "ar_count", "aw_count", "r_count", "w_count",
+                     "ar_stall", "aw_stall", "w_stall", "r_stall", "b_stall"]:
+            values[name] = (yield getattr(dut, "_" + name).status)
+        return values
+
+    def testbench_axi_perf_monitor():
+        for k in range(n):
+            for ch in channels:
+                valid, ready = pattern[ch][k]
+                yield getattr(bus, ch).valid.eq(valid)
+                yield getattr(bus, ch).ready.eq(ready)
+            yield
+        for ch in channels:
+            yield getattr(bus, ch).valid.eq(0)
+        yield from control(0b11)  # snapshot and clear
+        counts.append((yield from read_counters()))
+        for _ in range(8):
+            yield
+        yield from control(0b01)
+        counts.append((yield from read_counters()))
+
+    run_simulation(dut, testbench_axi_perf_monitor())
+    expected = dict(cycles=n + 1)
+    for ch in channels:
+        expected["{}_stall".format(ch)] = pattern[ch].count((1, 0))
+        if ch != "b":
+            expected["{}_count".format(ch)] = pattern[ch].count((1, 1))
+    assert counts[0] == expected
+    # cleared counters restart, only cycles advance w/o traffic
+    assert counts[1] == dict(
+        {name: 0 for name in expected}, cycles=10)
+
+
+@pytest.mark.parametrize("bin_width", [1, 4])
+def test_latency_histogram(bin_width):
+    bus = axi.Interface()
+    nbins = 8
+    dut = LatencyHistogram(bus, nbins=nbins, bin_width=bin_width)
+    delays = [0, 3, 1, 7, 2, 12, 5, 30, 0, 4]
+    n = len(delays)
+    ar, r, aw, b = [], [], [], []
+    histograms = dict()
+
+    @passive
+    def slave_r():
+        # answer the k-th read delays[k] cycles after AR, in order
+        idx = 0
+        while True:
+            if idx == len(ar) or ar[idx][0] + delays[idx] >= cycle[0]:
+                yield
+                continue
+            _, (id_, addr) = ar[idx]
+            idx += 1
+            yield from drive(bus.r, [dict(id=id_, data=addr, last=1)])
+
+    cycle = [0]
+
+    @passive
+    def clock():
+        while True:
+            yield
+            cycle[0] += 1
+
+    def testbench_latency_histogram():
+        yield from drive(bus.ar, [
+            dict(id=k, addr=k) for k in range(n)])
+        while len(r) < n:
+            yield
+        yield from bus.write_aw(1, 0, 0, 2, Burst.incr)
+        for _ in range(6):
+            yield
+        yield from bus.write_b(1)
+        yield
+        yield dut._enable.storage.eq(0)
+        for name in ["read", "write"]:
+            histograms[name] = []
+            for k in range(nbins):
+                yield dut._index.storage.eq(k)
+                yield
+                yield
+                histograms[name].append(
+                    (yield getattr(dut, "_{}_count".format(name)).status))
+        yield dut._enable.storage.eq(1)
+        yield dut._clear.re.eq(1)
+        yield
+        yield dut._clear.re.eq(0)
+        for _ in range(nbins + 1):
+            yield
+        yield dut._enable.storage.eq(0)
+        histograms["cleared"] = []
+        for k in range(nbins):
+            yield dut._index.storage.eq(k)
+            yield
+            yield
+            histograms["cleared"].append((yield dut._read_count.status))
+
+    run_simulation(
+        dut, [testbench_latency_histogram(), clock(), slave_r(),
+              monitor(bus.ar, ar, ["id", "addr"]),
+              monitor(bus.r, r, ["data"]), monitor(bus.aw, aw, ["id"]),
+              monitor(bus.b, b, ["id"])],
+        vcd_name=file_tmp_folder("test_latency_histogram.vcd"))
+    requested = {addr: c for c, (_, addr) in ar}
+    expected = [0] * nbins
+    for c, (addr,) in r:
+        expected[min((c - requested[addr]) // bin_width, nbins - 1)] += 1
+    assert histograms["read"] == expected
+    write = [0] * nbins
+    write[min((b[0][0] - aw[0][0]) // bin_width, nbins - 1)] = 1
+    assert histograms["write"] == write
+    assert histograms["cleared"] == [0] * nbins
+
+
+@pytest.mark.parametrize("outstanding", [8, 12])
+def test_latency_histogram_pipelined(outstanding):
+    bus = axi.Interface()
+    nbins, bin_width, depth = 16, 2, 8
+    dut = LatencyHistogram(
+        bus, nbins=nbins, bin_width=bin_width, depth=depth)
+    n = 64
+    delays = [6 + k % 5 for k in range(n)]
+    ar, r = [], []
+    histogram = []
+    cycle = [0]
+
+    @passive
+    def clock():
+        while True:
+            yield
+            cycle[0] += 1
+
+    @passive
+    def slave_r():
+        # answer the k-th read delays[k] cycles after AR, in order
+        idx = 0
+        while True:
+            if idx == len(ar) or ar[idx][0] + delays[idx] >= cycle[0]:
+                yield
+                continue
+            _, (id_, addr) = ar[idx]
+            idx += 1
+            yield from drive(bus.r, [dict(id=id_, data=addr, last=1)])
+
+    def testbench_latency_histogram_pipelined():
+        # mostly a single ID, pipelined up to outstanding reads
+        for k in range(n):
+            while k - len(r) >= outstanding:
+                yield
+            yield from drive(bus.ar, [dict(id=5 if k % 4 == 0 else 3,
+                                           addr=k)])
+        while len(r) < n:
+            yield
+        yield
+        yield dut._enable.storage.eq(0)
+        for k in range(nbins):
+            yield dut._index.storage.eq(k)
+            yield
+            yield
+            histogram.append((yield dut._read_count.status))
+
+    run_simulation(
+        dut, [testbench_latency_histogram_pipelined(), clock(), slave_r(),
+              monitor(bus.ar, ar, ["id", "addr"]),
+              monitor(bus.r, r, ["id", "data"])],
+        vcd_name=file_tmp_folder("test_latency_histogram_pipelined.vcd"))
+    # model the per ID timestamp queues, a full queue skips requests.
+    # Requests sort first, both see the queues as of the cycle start.
+    events = sorted(
+        [(c, 0, id_, addr) for c, (id_, addr) in ar] +
+        [(c, 1, id_, addr) for c, (id_, addr) in r])
+    requested = {addr: c for c, (_, addr) in ar}
+    level, skipped = defaultdict(int), defaultdict(int)
+    expected = [0] * nbins
+    for c, is_response, id_, addr in events:
+        if not is_response:
+            if level[id_] < depth and skipped[id_] == 0:
+                level[id_] += 1
+            else:
+                skipped[id_] += 1
+        elif level[id_]:
+            level[id_] -= 1
+            latency = c - requested[addr]
+            expected[min(latency // bin_width, nbins - 1)] += 1
+        else:
+            skipped[id_] -= 1
+    assert histogram == expected
+    if outstanding <= depth:
+        assert sum(histogram) == n
+    else:
+        assert 0 < sum(histogram) < n
+
+
+def test_traffic_generator():
+    bus = axi.Interface(data_width=64)
+    dut = TrafficGenerator(bus, max_outstanding=4)
+    memory = AxiMemory(bus, read_latency=4, stall=0.2)
+    results = []
+    in_flight = []
+
+    def run(reads, writes, restart=None):
+        yield dut._reads.storage.eq(reads)
+        yield dut._writes.storage.eq(writes)
+        yield dut._start.re.eq(1)
+        yield
+        yield dut._start.re.eq(0)
+        yield
+        cycle = 0
+        while (yield dut._busy.status):
+            # a start while running is ignored
+            yield dut._start.re.eq(cycle == restart)
+            cycle += 1
+            yield
+        yield dut._start.re.eq(0)
+        result = dict()
+        for name in ["cycles", "read_beats", "write_beats", "resp_errors",
+                     "data_errors"]:
+            result[name] = (yield getattr(dut, "_" + name).status)
+        results.append(result)
+
+    def testbench_traffic_generator():
+        yield dut._base.storage.eq(0x1000)
+        yield dut._range.storage.eq(0x300)
+        yield dut._len.storage.eq(7)
+        yield dut._pattern.storage.eq(0xa5a5a5a5)
+        yield dut._check.storage.eq(1)
+        yield from run(0, 16)
+        yield from run(16, 0)
+        yield from run(12, 12)
+        memory.memory.write(0x1008, bytes(8))
+        yield from run(4, 0)
+        # more outstanding than supported, restarted while running
+        yield dut._outstanding.storage.eq(15)
+        yield from run(12, 12, restart=20)
+
+    @passive
+    def in_flight_monitor():
+        reads = 0
+        while True:
+            reads += (yield bus.ar.valid) & (yield bus.ar.ready)
+            reads -= (yield bus.r.valid) & (yield bus.r.ready) & (
+                yield bus.r.last)
+            in_flight.append(reads)
+            yield
+
+    run_simulation(dut, [
+        testbench_traffic_generator(), memory.run(), in_flight_monitor(),
+        ProtocolChecker(bus).monitor()])
+    write, read, mixed, corrupted, restarted = results
+    assert restarted == dict(mixed, cycles=restarted["cycles"])
+    assert max(in_flight) == 4
+    assert write["write_beats"] == read["read_beats"] == 16 * 8
+    assert (write["read_beats"], read["write_beats"]) == (0, 0)
+    assert mixed["read_beats"] == mixed["write_beats"] == 12 * 8
+    assert read["data_errors"] == mixed["data_errors"] == 0
+    assert corrupted["data_errors"] == 1
+    assert all(result["resp_errors"] == 0 for result in results)
+    # bursts of 64 bytes wrap within the range of 0x300 bytes
+    for addr in range(0x1010, 0x1300, 8):
+        word = int.from_bytes(memory.memory.read(addr, 4), "little")
+        assert word == addr ^ 0xa5a5a5a5
+    assert memory.memory.read(0x1300, 8) == bytes(8)
+    # 4 bursts in flight cover most of the read latency
+    assert read["cycles"] < 2 * 16 * 8
@@ -0,0 +1,344 @@
+import itertools
+import random
+from migen import *  # noqa
+from migen.sim import run_simulation, passive
+from misoc.interconnect import stream
+import pytest
+from migen_axi.interconnect import (
+    axi, sram, Burst, Response, InterconnectPointToPoint)
+from migen_axi.sim import (
+    TraceRecorder, TraceEvent, load_trace, AxiMaster, AxiMemory,
+    SparseMemory, ProtocolChecker, ProtocolError, Stall, stall_channels,
+    stall_endpoint, profile_simulation)
+from migen_axi.sim.memory import burst_addrs
+from .common import file_tmp_folder
+
+
+def test_trace_recorder():
+    bus = axi.Interface(data_width=128)
+    slave = axi.Interface.like(bus)
+    dut = InterconnectPointToPoint(bus, slave)
+    path = file_tmp_folder("test_trace_recorder.trace")
+    data = 0x0123456789abcdef_fedcba9876543210
+
+    def testbench_trace_recorder():
+        yield from bus.write_aw(3, 0x1000, 1, 4, Burst.incr)
+        yield from bus.write_w(3, data, strb=0x00ff, last=0)
+        yield from bus.write_w(3, data + 1, last=1)
+        yield bus.b.ready.eq(1)
+        yield from slave.write_b(3, Response.slverr)
+        yield from bus.write_ar(5, 0x2000, 0, 2, Burst.fixed)
+        yield bus.r.ready.eq(1)
+        yield from slave.write_r(5, 0xaa55, last=1)
+
+    @passive
+    def ready(ch):
+        yield ch.ready.eq(1)
+        while True:
+            yield
+
+    recorder = TraceRecorder(bus, path, buffer_size=64)
+    with recorder:
+        run_simulation(dut, [
+            testbench_trace_recorder(), recorder.monitor(),
+            ready(slave.aw), ready(slave.w), ready(slave.ar)])
+    events = load_trace(path)
+    assert [event.channel for event in events] == [
+        "aw", "w", "w", "b", "ar", "r"]
+    assert events == sorted(events, key=lambda event: event.cycle)
+    aw, w0, w1, b, ar, r = events
+    assert aw._replace(cycle=0) == TraceEvent(
+        0, "aw", 3, 0x1000, 1, 4, Burst.incr, 0, 0, 0, 0)
+    assert (w0.data, w0.strb, w0.last) == (data, 0x00ff, 0)
+    assert (w1.data, w1.strb, w1.last) == (data + 1, 0xffff, 1)
+    assert (b.id, b.resp) == (3, Response.slverr)
+    assert (ar.id, ar.addr, ar.len, ar.size, ar.burst) == (
+        5, 0x2000, 0, 2, Burst.fixed)
+    assert (r.id, r.data, r.resp, r.last) == (5, 0xaa55, Response.okay, 1)
+
+
+def test_axi_master_sram():
+    bus = axi.Interface()
+    dut = sram.SRAM(1024, bus=bus)
+    master = AxiMaster(bus)
+
+    def testbench_axi_master_sram():
+        writes = [master.write(4 * k, [k + 1]) for k in range(8)]
+        yield from master.wait(*writes)
+        assert all(txn.resp == Response.okay for txn in writes)
+        reads = [master.read(4 * k, 1) for k in range(8)]
+        yield from master.wait()
+        assert [txn.data for txn in reads] == [[k + 1] for k in range(8)]
+        assert all(txn.latency > 0 for txn in reads)
+
+    run_simulation(dut, [
+        testbench_axi_master_sram(), master.run(),
+        ProtocolChecker(bus).monitor()])
+
+
+def test_axi_master_outstanding():
+    bus = axi.Interface()
+    dut = Module()
+    master = AxiMaster(bus, max_outstanding=4)
+    latency = 8
+    ar_cycles = []
+
+    @passive
+    def slave():
+        # accept every request, answer each after a fixed latency
+        due = []
+        beats = []
+        cycle = 0
+        yield bus.ar.ready.eq(1)
+        while True:
+            if (yield bus.ar.valid):
+                ar_cycles.append(cycle)
+                id_, addr, len_ = ((yield bus.ar.id), (yield bus.ar.addr),
+                                   (yield bus.ar.len))
+                due.append((cycle + latency, [
+                    (id_, addr + j, j == len_) for j in range(len_ + 1)]))
+            if not beats and due and due[0][0] <= cycle:
+                beats = due.pop(0)[1]
+            if beats:
+                id_, data, last = beats.pop(0)
+                yield bus.r.id.eq(id_)
+                yield bus.r.data.eq(data)
+                yield bus.r.last.eq(last)
+                yield bus.r.valid.eq(1)
+            else:
+                yield bus.r.valid.eq(0)
+            yield
+            cycle += 1
+
+    def testbench_axi_master_outstanding():
+        reads = [master.read(0x100 * k, 2, id_=k % 2) for k in range(8)]
+        yield from master.wait()
+        assert [txn.data for txn in reads] == [
+            [0x100 * k, 0x100 * k + 1] for k in range(8)]
+
+    run_simulation(dut, [
+        testbench_axi_master_outstanding(), master.run(), slave()])
+    # the first requests go back-to-back, then the in-flight limit holds
+    assert ar_cycles[:4] == list(range(ar_cycles[0], ar_cycles[0] + 4))
+    assert ar_cycles[4] >= ar_cycles[0] + latency
+
+
+def test_sparse_memory():
+    memory = SparseMemory(page_size=16)
+    memory.write(12, bytes(range(1, 9)))
+    assert sorted(memory.pages) == [0, 1]
+    assert memory.read(8, 16) == bytes(4) + bytes(range(1, 9)) + bytes(4)
+    memory.write(10, b"\xff" * 4, mask=0b1010)
+    assert memory.read(10, 6) == bytes([0, 0xff, 1, 0xff, 3, 4])
+    assert memory.read(1 << 40, 2) == bytes(2)
+
+
+@pytest.mark.parametrize("burst, addr, len_, expected", [
+    (Burst.incr, 0x104, 3, [0x104, 0x108, 0x10c, 0x110]),
+    (Burst.incr, 0x105, 1, [0x105, 0x108]),
+    (Burst.fixed, 0x104, 2, [0x104] * 3),
+    (Burst.wrap, 0x108, 3, [0x108, 0x10c, 0x100, 0x104]),
+])
+def test_burst_addrs(burst, addr, len_, expected):
+    assert burst_addrs(addr, len_, 2, burst) == expected
+
+
+@pytest.mark.parametrize("reorder", [False, True])
+def test_axi_memory(reorder):
+    bus = axi.Interface(data_width=64, id_width=4)
+    dut = Module()
+    master = AxiMaster(bus)
+    memory = AxiMemory(bus, read_latency=6, write_latency=3, stall=0.3,
+                       reorder=reorder, seed=1,
+                       memory=SparseMemory(page_size=256))
+    prng = random.Random(0)
+    expected = {}
+    completed = []
+
+    def testbench_axi_memory():
+        for k in range(16):
+            data = [prng.getrandbits(64) for _ in range(prng.randrange(1, 9))]
+            expected[k] = data
+            master.write(0x1000 * k + 0xe0, data, id_=k % 4)
+        yield from master.wait()
+        reads = [master.read(0x1000 * k + 0xe0, len(expected[k]),
+                             id_=k % 4) for k in range(16)]
+        while not master.idle:
+            completed.extend(
+                k for k, txn in enumerate(reads)
+                if txn.done and k not in completed)
+            yield
+        assert [txn.data for txn in reads] == [
+            expected[k] for k in range(16)]
+        # strobes and a wrapping burst
+        master.write(0x40, [2**64 - 1], strb=[0x0f])
+        read = master.read(0x48, 2, burst=Burst.wrap)
+        yield from master.wait(read)
+        assert read.data == [0, 0xffffffff]
+
+    run_simulation(dut, [
+        testbench_axi_memory(), master.run(), memory.run(),
+        ProtocolChecker(bus).monitor()])
+    assert memory.memory.read(0xe0, 8) == expected[0][0].to_bytes(
+        8, "little")
+    in_order = completed == sorted(completed)
+    assert in_order != reorder
+
+
+def test_axi_memory_r_stable():
+    # writes landing while an R beat is stalled don't change its data
+    bus = axi.Interface()
+    dut = Module()
+    master = AxiMaster(bus)
+    memory = AxiMemory(bus)
+
+    def testbench_axi_memory_r_stable():
+        yield from master.wait(master.write(0x0, list(range(16))))
+        read = master.read(0x0, 16)
+        for _ in range(4):
+            yield
+        writes = [master.write(k * 4, [0x100 + k]) for k in range(16)]
+        yield from master.wait(read, *writes)
+        assert all(value in (k, 0x100 + k)
+                   for k, value in enumerate(read.data))
+        assert read.data != list(range(16))
+
+    run_simulation(dut, [
+        testbench_axi_memory_r_stable(), master.run(), memory.run(),
+        ProtocolChecker(bus).monitor()] + stall_channels(
+        bus, "r", seed=2, probability=0.5, max_stall=8))
+
+
+def test_protocol_checker():
+    bus = axi.Interface()
+    dut = Module()
+    checker = ProtocolChecker(bus, strict=False)
+
+    def cycle(ch, **fields):
+        for name, value in fields.items():
+            yield getattr(ch, name).eq(value)
+        yield
+
+    def testbench_protocol_checker():
+        # AR dropped w/o ready, then changed while valid
+        yield from cycle(bus.ar, valid=1, addr=0x100)
+        yield from cycle(bus.ar, valid=0)
+        yield from cycle(bus.ar, valid=1)
+        yield from cycle(bus.ar, addr=0x104)
+        yield from cycle(bus.ar, valid=0)
+        # INCR burst of 16 words crossing 4 KB
+        yield from cycle(bus.ar, valid=1, ready=1, addr=0xfc4, len=15,
+                         size=2, burst=Burst.incr)
+        yield from cycle(bus.ar, valid=0, ready=0)
+        # R last early, R w/o read
+        yield from cycle(bus.r, valid=1, ready=1, last=0)
+        yield from cycle(bus.r, last=1)
+        yield from cycle(bus.r, last=1)
+        yield from cycle(bus.r, valid=0)
+        # W before AW, B w/o write
+        yield from cycle(bus.w, valid=1, ready=1, last=1, id=2)
+        yield from cycle(bus.w, valid=0)
+        yield from cycle(bus.b, valid=1, ready=1, id=3)
+        yield from cycle(bus.b, valid=0)
+        yield
+
+    run_simulation(dut, [testbench_protocol_checker(), checker.monitor()])
+    assert [(channel, msg) for _, channel, msg in checker.errors] == [
+        ("ar", "valid dropped w/o ready"),
+        ("ar", "addr changed while valid"),
+        ("ar", "valid dropped w/o ready"),
+        ("ar", "burst 0xfc4..0x1003 crosses 4 KB"),
+        ("r", "last 1 on beat 2 of 16"),
+        ("r", "R of ID 0x0 w/o read pending"),
+        ("w", "W data w/o AW of ID 0x2"),
+        ("b", "B of ID 0x3 w/o write pending"),
+    ]
+
+    checker = ProtocolChecker(bus)
+    with pytest.raises(ProtocolError):
+        run_simulation(Module(), [
+            testbench_protocol_checker(), checker.monitor()])
+    assert len(checker.errors) == 1
+
+
+def test_stall():
+    stall = Stall(seed=5, probability=0.3, max_stall=4)
+    pattern = list(itertools.islice(stall, 4096))
+    assert pattern == list(itertools.islice(stall, 4096))
+    assert pattern != list(itertools.islice(Stall(6, 0.3, 4), 4096))
+    runs = [len(run) for run in "".join(map(str, pattern)).split("1") if run]
+    assert max(runs) == 4
+    assert 0.4 < sum(pattern) / len(pattern) < 0.7
+    assert all(itertools.islice(Stall(probability=0), 64))
+
+
+def test_stall_endpoint():
+    dut = stream.SyncFIFO([("data", 8)], 4)
+    stall = Stall(seed=1, probability=0.5, max_stall=3)
+    received = []
+
+    def source():
+        for k in range(64):
+            yield from stall.wait()
+            yield dut.sink.data.eq(k)
+            yield dut.sink.stb.eq(1)
+            yield
+            while not (yield dut.sink.ack):
+                yield
+            yield dut.sink.stb.eq(0)
+
+    def sink():
+        while len(received) < 64:
+            if (yield dut.source.stb) and (yield dut.source.ack):
+                received.append((yield dut.source.data))
+            yield
+
+    run_simulation(dut, [
+        source(), sink(), stall_endpoint(dut.source, seed=2, max_stall=5)])
+    assert received == list(range(64))
+
+
+def test_stall_channels():
+    bus = axi.Interface()
+    dut = sram.SRAM(1024, bus=bus)
+    master = AxiMaster(bus)
+
+    def testbench_stall_channels():
+        writes = [master.write(4 * k, [k]) for k in range(16)]
+        yield from master.wait(*writes)
+        reads = [master.read(4 * k, 1) for k in range(16)]
+        yield from master.wait(*reads)
+        assert [txn.data for txn in reads] == [[k] for k in range(16)]
+
+    run_simulation(dut, [
+        testbench_stall_channels(), master.run(),
+        ProtocolChecker(bus).monitor()] + stall_channels(
+            bus, "r b", seed=4, probability=0.5, max_stall=3))
+
+
+def test_profile_simulation():
+    bus = axi.Interface()
+    dut = sram.SRAM(1024, bus=bus)
+    master = AxiMaster(bus)
+
+    def testbench_profile_simulation():
+        yield from master.wait(*[master.write(4 * k, [k]) for k in range(8)])
+        for _ in range(16):
+            yield
+
+    profile = profile_simulation(
+        dut, [testbench_profile_simulation(), master.run()])
+    assert profile.name == "SRAM"
+    assert profile.signals > len(bus.flatten())
+    cycles = profile.cycles["sys"]
+    assert cycles > 16 + 8
+    assert profile.cycles_per_second > 0
+    testbench, run = profile.generators
+    assert testbench.name == "test_profile_simulation.<locals>." \
+        "testbench_profile_simulation"
+    assert run.name == "AxiMaster.run"
+    assert testbench.cycles == cycles
+    # the testbench only queues and waits, the master drives every cycle
+    assert testbench.active_cycles == 0
+    assert run.active_cycles == run.cycles == cycles
+    assert "AxiMaster.run" in profile.report()